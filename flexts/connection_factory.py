@@ -0,0 +1,146 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts
+# File: connection_factory.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 10:05 PM
+
+import warnings
+from typing import Iterable
+
+import sqlite3 as sqlite
+
+
+class PragmaProfileError(Exception):
+    pass
+
+
+class SQLiteConnectionFactory:
+    """
+        Opens connections and applies named pragma profiles to them.
+
+        Profiles:
+            'write' - connection that updates index (triggers, changelog consumer). WAL lets readers work
+                while writer commits, synchronous=NORMAL is durable enough in WAL mode.
+            'read' - read-only connection of match queries (see BlogFTSIndex.open_read_pools).
+                journal_mode is not changed (it is persistent and is set by writer).
+            'bulk' - rebuild or bulk load of index. Durability is not required because index can be rebuilt again.
+
+        profiles - overrides {profile: {pragma: value}}, they are merged into default profiles,
+            value None removes pragma from profile.
+
+        After applying, effective values are read back and compared (see verify). For example, journal_mode of
+        in-memory database is always 'memory' and mmap_size is limited by compile time option.
+        Mismatches are reported by RuntimeWarning or by PragmaProfileError if strict is True.
+    """
+
+    # order has sense, busy_timeout is applied before journal_mode that needs exclusive lock
+    default_profiles = {
+        'write': {
+            'busy_timeout': 5000,
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'cache_size': -16384,
+            'temp_store': 'memory',
+            'mmap_size': 268435456,
+        },
+        'read': {
+            'busy_timeout': 5000,
+            'cache_size': -32768,
+            'temp_store': 'memory',
+            'mmap_size': 268435456,
+            'query_only': 1,
+        },
+        'bulk': {
+            'busy_timeout': 30000,
+            'journal_mode': 'wal',
+            'synchronous': 'off',
+            'cache_size': -262144,
+            'temp_store': 'memory',
+            'mmap_size': 1073741824,
+        },
+    }
+
+    # values that PRAGMA returns as numbers
+    pragma_values = {
+        'synchronous': {'off': 0, 'normal': 1, 'full': 2, 'extra': 3},
+        'temp_store': {'default': 0, 'file': 1, 'memory': 2},
+    }
+
+    def __init__(self, profiles: dict[str, dict] = None, strict: bool = False) -> None:
+        self.profiles = {name: dict(pragmas) for name, pragmas in self.default_profiles.items()}
+        for name, pragmas in (profiles or {}).items():
+            profile = self.profiles.setdefault(name, {})
+            for pragma, value in pragmas.items():
+                if value is None:
+                    profile.pop(pragma, None)
+                else:
+                    profile[pragma] = value
+        self.strict = strict
+
+    def get_profile(self, profile: str) -> dict:
+        try:
+            return dict(self.profiles[profile])
+        except KeyError:
+            raise ValueError(f'unknown pragma profile "{profile}"')
+
+    def _normalize(self, pragma: str, value) -> str:
+        value = str(value).lower()
+        return str(self.pragma_values.get(pragma, {}).get(value, value))
+
+    def get_pragmas(self, con: sqlite.Connection, pragmas: Iterable[str] = None) -> dict:
+        """
+            Returns effective values of pragmas, all pragmas of all profiles by default
+        """
+        if pragmas is None:
+            pragmas = dict.fromkeys(p for profile in self.profiles.values() for p in profile)
+        res = {}
+        for pragma in pragmas:
+            cursor = con.execute(f'PRAGMA {pragma}')
+            try:
+                r = cursor.fetchone()
+            finally:
+                cursor.close()
+            res[pragma] = r[0] if r else None
+        return res
+
+    def verify(self, con: sqlite.Connection, profile: str) -> dict[str, tuple]:
+        """
+            Returns {pragma: (expected, effective)} for pragmas of profile that have not expected value
+        """
+        expected = self.get_profile(profile)
+        effective = self.get_pragmas(con, expected)
+        return {
+            p: (v, effective[p]) for p, v in expected.items() if self._normalize(p, v) != self._normalize(p, effective[p])
+        }
+
+    def apply(self, con: sqlite.Connection, profile: str, strict: bool = None) -> dict:
+        """
+            Applies pragmas of profile to connection and returns their effective values
+        """
+        pragmas = self.get_profile(profile)
+        for pragma, value in pragmas.items():
+            con.execute(f'PRAGMA {pragma} = {value}').close()
+
+        mismatches = self.verify(con, profile)
+        if mismatches:
+            msg = f'pragma profile "{profile}" is not applied: ' + ', '.join(
+                f'{p} is {effective} ({expected} is expected)' for p, (expected, effective) in mismatches.items()
+            )
+            if self.strict if strict is None else strict:
+                raise PragmaProfileError(msg)
+            warnings.warn(msg, RuntimeWarning)
+        return self.get_pragmas(con, pragmas)
+
+    def connect(self, database: str, profile: str = 'write', strict: bool = None, **kwargs) -> sqlite.Connection:
+        """
+            Opens connection (kwargs are passed to sqlite3.connect) and applies profile to it
+        """
+        self.get_profile(profile)
+        con = sqlite.connect(database, **kwargs)
+        try:
+            self.apply(con, profile, strict)
+        except Exception:
+            con.close()
+            raise
+        return con
@@ -0,0 +1,269 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts
+# File: connection_pool.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 9:05 PM
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Generator, Union
+
+import sqlite3 as sqlite
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class PoolClosedError(Exception):
+    pass
+
+
+class SQLiteConnectionPool:
+    """
+        Pool of prepared connections to the same database(s).
+
+        connect - callable that opens new connection. Connections are used by different threads (one at a time),
+            so they should be created with check_same_thread=False.
+        prepare - callable that is called once for each new connection (ATTACH, pragmas, sql functions, tokenizers)
+
+        Pool opens min_size connections at once and grows up to max_size on demand. If all connections are in use
+        then acquire waits up to timeout and raises PoolTimeoutError. Slot of new connection is reserved under
+        the lock, but connection is opened, prepared and checked outside it, so other threads are not blocked.
+
+        Health check (health_check_sql) is run on acquire for the connection that was idle for
+        health_check_interval seconds or more (0 - each time), broken connection is replaced by new one.
+        Connection is reopened after max_uses checkouts if it is defined.
+        Connection that raised sqlite.DatabaseError (except OperationalError, for example 'database is locked')
+        inside of connection() is discarded.
+    """
+
+    health_check_sql = 'SELECT 1'
+
+    def __init__(self, connect: Callable[[], sqlite.Connection], prepare: Callable[[sqlite.Connection], None] = None,
+                 min_size: int = 1, max_size: int = 4, timeout: float = 5.0, health_check_interval: float = 30.0,
+                 max_uses: int = None) -> None:
+        if max_size < 1:
+            raise ValueError('max_size must be positive')
+        if not 0 <= min_size <= max_size:
+            raise ValueError('min_size must be in range [0, max_size]')
+
+        self.connect = connect
+        self.prepare = prepare
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_uses = max_uses
+
+        self._cond = threading.Condition()
+        self._idle: deque[tuple[sqlite.Connection, float]] = deque()
+        self._uses: dict[int, int] = {}
+        self._size = 0
+        self._closed = False
+        self._stats = {
+            'created': 0,
+            'discarded': 0,
+            'acquired': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_checks': 0,
+        }
+
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append((self._open(), time.monotonic()))
+
+    def _open(self) -> sqlite.Connection:
+        """
+            Opens and prepares connection, it is called without lock
+        """
+        con = self.connect()
+        try:
+            if self.prepare is not None:
+                self.prepare(con)
+        except Exception:
+            con.close()
+            raise
+        with self._cond:
+            self._uses[id(con)] = 0
+            self._stats['created'] += 1
+        return con
+
+    def _close(self, con: sqlite.Connection):
+        with self._cond:
+            self._uses.pop(id(con), None)
+        try:
+            con.close()
+        except sqlite.Error:
+            pass
+
+    def _is_healthy(self, con: sqlite.Connection) -> bool:
+        """
+            It is called without lock
+        """
+        with self._cond:
+            self._stats['health_checks'] += 1
+        try:
+            con.execute(self.health_check_sql).close()
+        except sqlite.Error:
+            return False
+        return True
+
+    @property
+    def size(self) -> int:
+        """
+            Number of open connections (idle and in use)
+        """
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self._stats, 'size': self._size, 'idle': len(self._idle), 'in_use': self._size - len(self._idle)}
+
+    def acquire(self, timeout: float = None) -> sqlite.Connection:
+        """
+            Returns connection that must be returned back via release
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        con, check = self._reserve(timeout, deadline)
+
+        # connection (or its slot) belongs to this thread now, so it is checked and opened without lock
+        if con is not None:
+            worn_out = self.max_uses is not None and self._uses[id(con)] >= self.max_uses
+            if worn_out or check and not self._is_healthy(con):
+                self._close(con)
+                with self._cond:
+                    self._stats['discarded'] += 1
+                con = None
+        if con is None:
+            con = self._open_slot()
+
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                self._cond.notify_all()
+            else:
+                self._uses[id(con)] += 1
+                self._stats['acquired'] += 1
+                return con
+        self._close(con)
+        raise PoolClosedError('pool is closed')
+
+    def _reserve(self, timeout: float, deadline: float) -> tuple[Union[sqlite.Connection, None], bool]:
+        """
+            Takes idle connection (con, True if health check is required) or reserves slot for new one (None, False)
+        """
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolClosedError('pool is closed')
+                if self._idle:
+                    con, released_at = self._idle.popleft()
+                    return con, time.monotonic() - released_at >= self.health_check_interval
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, False
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(f'no free connection in {timeout} seconds, pool size is {self._size}')
+                self._stats['waits'] += 1
+                self._cond.wait(remaining)
+
+    def _open_slot(self) -> sqlite.Connection:
+        """
+            Opens connection for slot that is already counted in size, slot is freed if it fails
+        """
+        try:
+            return self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, con: sqlite.Connection, discard: bool = False):
+        if not discard:
+            try:
+                if con.in_transaction:
+                    con.rollback()
+            except sqlite.Error:
+                discard = True
+        with self._cond:
+            close = discard or self._closed
+            if close:
+                self._size -= 1
+                if discard:
+                    self._stats['discarded'] += 1
+            else:
+                self._idle.append((con, time.monotonic()))
+            self._cond.notify()
+        if close:
+            self._close(con)
+
+    @contextmanager
+    def connection(self, timeout: float = None) -> Generator[sqlite.Connection, None, None]:
+        con = self.acquire(timeout)
+        discard = False
+        try:
+            yield con
+        except sqlite.OperationalError:
+            raise
+        except sqlite.DatabaseError:
+            discard = True
+            raise
+        finally:
+            self.release(con, discard)
+
+    def close(self):
+        """
+            Closes idle connections, connections in use are closed on release
+        """
+        with self._cond:
+            self._closed = True
+            idle = [con for con, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for con in idle:
+            self._close(con)
+
+
+class QueryInterrupter:
+    """
+        Interrupts statements of connections that are running on behalf of one request (see Connection.interrupt).
+        Connection that starts after interrupt raises sqlite.OperationalError at once.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._cons: set[sqlite.Connection] = set()
+        self.interrupted = False
+
+    @contextmanager
+    def running(self, con: sqlite.Connection) -> Generator[sqlite.Connection, None, None]:
+        with self._lock:
+            if self.interrupted:
+                raise sqlite.OperationalError('interrupted')
+            self._cons.add(con)
+        try:
+            yield con
+        finally:
+            with self._lock:
+                self._cons.discard(con)
+
+    def interrupt(self):
+        with self._lock:
+            self.interrupted = True
+            for con in self._cons:
+                con.interrupt()
@@ -0,0 +1,209 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts
+# File: fts5_maintenance.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 5:10 PM
+
+import threading
+import time
+from typing import Union
+
+import sqlite3 as sqlite
+
+from flexts.sqlite_fts5 import SQLiteFTS5
+
+
+class FTS5MaintenanceScheduler:
+    """
+        Keeps number of b-tree segments of fts5 index low, so query latency does not grow with number of
+        small write transactions.
+
+        Each tick (see tick):
+            - if merge_changes rows of index tables were changed since last merge or index has more than
+              max_segments segments then it runs 'merge' (merge_pages pages per command)
+            - if index was idle (no writes, no changes of segments) during idle_seconds and it has more than one
+              segment then it runs incremental optimize ('merge' with negative pages)
+        Each merge command is separate short transaction and merging stops after step_seconds,
+        the rest is done by next ticks, so writers are never blocked for long.
+
+        automerge, crisismerge, usermerge - if defined then they are written into index configuration on start
+        (see configure).
+
+        Write volume is counted by total_changes of driver's connection (changes of the scheduler are excluded)
+        and by note_changes. Changes of segments made by other connections are seen as activity too.
+
+        tick can be called by writer (after batch) or by background thread (see start). In the last case
+        driver should have own connection created with check_same_thread=False,
+        the connection must not be used by other threads.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, driver: SQLiteFTS5, merge_pages: int = 64, merge_changes: int = 1000, max_segments: int = 16,
+                 step_seconds: float = .05, idle_seconds: float = 30.0, poll_interval: float = 1.0,
+                 automerge: int = None, crisismerge: int = None, usermerge: int = None) -> None:
+        if merge_pages < 1:
+            raise ValueError('merge_pages must be positive')
+
+        self.driver = driver
+        self.merge_pages = merge_pages
+        self.merge_changes = merge_changes
+        self.max_segments = max_segments
+        self.step_seconds = step_seconds
+        self.idle_seconds = idle_seconds
+        self.poll_interval = poll_interval
+        self.config = {'automerge': automerge, 'crisismerge': crisismerge, 'usermerge': usermerge}
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+        self._error: Union[Exception, None] = None
+
+        self._changed = 0
+        self._own_changes = 0
+        self._last_changes = self._changes()
+        self._last_structure = None
+        self._last_activity = None
+        self._stats = {
+            'changes': 0,
+            'merges': 0,
+            'optimizes': 0,
+            'merge_steps': 0,
+            'errors': 0,
+            'segments': 0,
+            'levels': [],
+            'last_merge_at': None,
+            'last_merge_seconds': 0.0,
+            'last_optimize_at': None,
+            'last_optimize_seconds': 0.0,
+        }
+
+    def _changes(self) -> int:
+        return self.driver._connection.total_changes - self._own_changes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def _set(self, **values):
+        with self._lock:
+            self._stats.update(values)
+
+    def _inc(self, **counters):
+        with self._lock:
+            for k, v in counters.items():
+                self._stats[k] += v
+
+    def note_changes(self, n: int = 1):
+        """
+            Counts rows changed by other connections
+        """
+        with self._lock:
+            self._changed += n
+            self._stats['changes'] += n
+        self._last_activity = self.clock()
+
+    def configure(self):
+        for name, value in self.config.items():
+            if value is not None:
+                self.driver.set_config(name, value)
+
+    def _observe(self) -> dict:
+        structure = self.driver.get_structure()
+        changes = self._changes()
+        changed = max(changes - self._last_changes, 0)
+        if changed or structure != self._last_structure or self._last_activity is None:
+            with self._lock:
+                self._changed += changed
+                self._stats['changes'] += changed
+            # idle window starts from the first observation
+            self._last_activity = self.clock()
+        self._last_changes, self._last_structure = changes, structure
+        self._set(segments=structure['segments'], levels=structure['levels'])
+        return structure
+
+    def _merge(self, pages: int) -> tuple[bool, float]:
+        """
+            Runs merge commands until nothing to merge or step_seconds expired.
+            Returns (finished, seconds)
+        """
+        con = self.driver._connection
+        start = time.perf_counter()
+        before = con.total_changes
+        try:
+            while True:
+                done = not self.driver.merge(pages)
+                self._inc(merge_steps=1)
+                if done or time.perf_counter() - start >= self.step_seconds:
+                    break
+        finally:
+            self._own_changes += con.total_changes - before
+            self._last_changes = self._changes()
+            self._last_structure = self.driver.get_structure()
+            self._set(segments=self._last_structure['segments'], levels=self._last_structure['levels'])
+        return done, time.perf_counter() - start
+
+    def tick(self) -> Union[str, None]:
+        """
+            Runs one bounded maintenance step. Returns 'merge', 'optimize' or None if nothing was done.
+        """
+        segments = self._observe()['segments']
+        if segments < 2:
+            return None
+
+        if self._changed >= self.merge_changes or segments > self.max_segments:
+            _, seconds = self._merge(self.merge_pages)
+            with self._lock:
+                self._changed = 0
+                self._stats['merges'] += 1
+                self._stats['last_merge_at'] = time.time()
+                self._stats['last_merge_seconds'] = seconds
+            return 'merge'
+
+        if self.clock() - self._last_activity >= self.idle_seconds:
+            _, seconds = self._merge(-self.merge_pages)
+            with self._lock:
+                self._stats['optimizes'] += 1
+                self._stats['last_optimize_at'] = time.time()
+                self._stats['last_optimize_seconds'] = seconds
+            return 'optimize'
+        return None
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f'{self.__class__.__name__}', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def last_error(self) -> Union[Exception, None]:
+        with self._lock:
+            return self._error
+
+    def _run(self):
+        try:
+            self.configure()
+        except sqlite.Error as exc:
+            with self._lock:
+                self._error = exc
+            self._inc(errors=1)
+
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.tick()
+            except sqlite.Error as exc:
+                # for example database is locked by writer, next tick will try again
+                with self._lock:
+                    self._error = exc
+                self._inc(errors=1)
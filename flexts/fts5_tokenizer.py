@@ -0,0 +1,102 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts
+# File: fts5_tokenizer.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 1:20 PM
+
+import sqlite3 as sqlite
+from typing import Any, Callable, Generator, Union
+
+from flexts.stemmer import SimpleTokenizer, BatchStemmer, ScriptRoutingStemmer
+
+# flags of xTokenize (sqlite3.h), the same as sqlitefts.fts5.FTS5_TOKENIZE_*
+FTS5_TOKENIZE_QUERY = 0x0001
+FTS5_TOKENIZE_PREFIX = 0x0002
+FTS5_TOKENIZE_DOCUMENT = 0x0004
+FTS5_TOKENIZE_AUX = 0x0008
+
+
+class StemmingFTS5Tokenizer:
+    """
+        FTS5 tokenizer (sqlitefts) that splits text as SimpleTokenizer does and replaces each token by its stem.
+        sqlitefts is imported on registration only (see register_tokenizer), so the class does not inherit
+        fts5.FTS5Tokenizer, sqlitefts needs the tokenize method only.
+        All tokens of the text (document) are stemmed by one stemmer.stem_words call.
+        Offsets are in bytes of utf-8 encoded text as FTS5 requires.
+
+        Query text (FTS5_TOKENIZE_QUERY) is only lower cased. The query side should stem the terms itself
+        (see BlogFTSIndex.plain2_match_expr), so the terms are not stemmed twice
+        and prefix queries "term"* keep their meaning.
+
+        stemmer - BatchStemmer (ScriptRoutingStemmer by default: digits as is, Latin - English Snowball,
+            Cyrillic - Hunspell uk_UA)
+    """
+
+    def __init__(self, stemmer: BatchStemmer = None) -> None:
+        self.stemmer = stemmer if stemmer is not None else ScriptRoutingStemmer()
+
+    def stem_words(self, tokens: list[str]) -> list[str]:
+        return self.stemmer.stem_words(tokens)
+
+    def tokenize(self, text: str, flags: int = None) -> Generator[tuple[str, int, int], None, None]:
+        matches = [*SimpleTokenizer._p.finditer(text)]
+        if not matches:
+            return
+
+        tokens = [m.group() for m in matches]
+        if flags is not None and flags & FTS5_TOKENIZE_QUERY:
+            normalized = [t.lower() for t in tokens]
+        else:
+            normalized = self.stem_words(tokens)
+
+        pos, bpos = 0, 0
+        for m, token, norm in zip(matches, tokens, normalized):
+            start, end = m.span()
+            bstart = bpos + len(text[pos:start].encode('utf-8'))
+            bend = bstart + len(token.encode('utf-8'))
+            pos, bpos = end, bend
+            yield norm, bstart, bend
+
+
+# name that is used in tokenize='...' option of fts5 table -> factory of tokenizer instance
+tokenizers: dict[str, Callable[[], Any]] = {
+    'hunspell_ua': StemmingFTS5Tokenizer,
+}
+
+_instances: dict[str, Any] = {}
+_modules = {}
+
+
+def get_tokenizer(name: str) -> Union[Any, None]:
+    """
+        Returns the shared instance of registered tokenizer or None if name is unknown (builtin like unicode61)
+    """
+    tk = _instances.get(name)
+    if tk is None:
+        factory = tokenizers.get(name)
+        if factory is None:
+            return None
+        tk = _instances[name] = factory()
+    return tk
+
+
+def register_tokenizer(con: sqlite.Connection, name: str) -> bool:
+    """
+        Registers tokenizer by name for connection. It must be done for each connection that uses fts5 table
+        with this tokenizer (read or write) before the first access to the table.
+        Returns False if name is not in tokenizers.
+    """
+    tk = get_tokenizer(name)
+    if tk is None:
+        return False
+
+    # cffi extension is loaded by the first registration, not on import of this module
+    from sqlitefts import fts5
+
+    module = _modules.get(name)
+    if module is None:
+        module = _modules[name] = fts5.make_fts5_tokenizer(tk)
+    if not fts5.register_tokenizer(con, name, module):
+        raise sqlite.OperationalError(f'can\'t register fts5 tokenizer "{name}"')
+    return True
@@ -0,0 +1,135 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts
+# File: lexicon.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 3:30 PM
+
+import mmap
+import os
+import struct
+from typing import Iterable, Optional, Union
+
+
+class LexiconFormatError(Exception):
+    pass
+
+
+# file layout (little-endian)
+#   header: magic, number of forms, number of stems, number of stem references
+#   forms:  sorted by utf-8 bytes of form, (form offset, form length, first reference, number of references)
+#   refs:   stem ids
+#   stems:  (stem offset, stem length)
+#   blob:   utf-8 strings of forms and stems
+_MAGIC = b'FLXLEX01'
+_HEADER = struct.Struct('<8sIII')
+_FORM = struct.Struct('<IIII')
+_REF = struct.Struct('<I')
+_STEM = struct.Struct('<II')
+
+
+def compile_lexicon(items: Iterable[tuple[str, Iterable[str]]], path: Union[str, os.PathLike]) -> int:
+    """
+        Compiles (form, stems) pairs into lexicon file. Form is lower cased. If form repeats then the first one wins.
+        Empty stems means the form is known as word without stems (stemmer returns the form itself),
+        so lookup does not fall back to other stemmer for it.
+
+    :return: number of forms
+    """
+    forms = {}
+    for form, stems in items:
+        forms.setdefault(form.lower().encode('utf-8'), tuple(stems))
+
+    stem_ids, stem_list, refs, records = {}, [], [], []
+    blob = bytearray()
+    for bform in sorted(forms):
+        ids = []
+        for stem in forms[bform]:
+            sid = stem_ids.get(stem)
+            if sid is None:
+                sid = stem_ids[stem] = len(stem_list)
+                stem_list.append(stem)
+            ids.append(sid)
+        records.append((len(blob), len(bform), len(refs), len(ids)))
+        blob += bform
+        refs.extend(ids)
+
+    stem_records = []
+    for stem in stem_list:
+        bstem = stem.encode('utf-8')
+        stem_records.append((len(blob), len(bstem)))
+        blob += bstem
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, len(records), len(stem_records), len(refs)))
+        for r in records:
+            f.write(_FORM.pack(*r))
+        for sid in refs:
+            f.write(_REF.pack(sid))
+        for r in stem_records:
+            f.write(_STEM.pack(*r))
+        f.write(blob)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+class Lexicon:
+    """
+        Read-only memory-mapped lexicon (see compile_lexicon). Lookup is binary search over sorted forms,
+        nothing is loaded into process memory, so all processes share one page-cache copy of the file.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]) -> None:
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mm) < _HEADER.size:
+            raise LexiconFormatError(f'"{path}" is too short for lexicon')
+        magic, self.n_forms, self.n_stems, n_refs = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise LexiconFormatError(f'"{path}" is not lexicon file')
+
+        self._forms_pos = _HEADER.size
+        self._refs_pos = self._forms_pos + self.n_forms * _FORM.size
+        self._stems_pos = self._refs_pos + n_refs * _REF.size
+        self._blob_pos = self._stems_pos + self.n_stems * _STEM.size
+        if len(self._mm) < self._blob_pos:
+            raise LexiconFormatError(f'"{path}" is truncated')
+
+    def __len__(self):
+        return self.n_forms
+
+    def _form(self, i: int) -> tuple[bytes, int, int]:
+        off, ln, ref, cnt = _FORM.unpack_from(self._mm, self._forms_pos + i * _FORM.size)
+        start = self._blob_pos + off
+        return self._mm[start:start + ln], ref, cnt
+
+    def _stem(self, sid: int) -> str:
+        off, ln = _STEM.unpack_from(self._mm, self._stems_pos + sid * _STEM.size)
+        start = self._blob_pos + off
+        return self._mm[start:start + ln].decode('utf-8')
+
+    def lookup(self, token: str) -> Optional[tuple]:
+        """
+            Returns stems of lower cased token or None if token is not in lexicon
+        """
+        key = token.encode('utf-8')
+        lo, hi = 0, self.n_forms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            form, ref, cnt = self._form(mid)
+            if form < key:
+                lo = mid + 1
+            elif form > key:
+                hi = mid
+            else:
+                return tuple(
+                    self._stem(_REF.unpack_from(self._mm, self._refs_pos + (ref + i) * _REF.size)[0])
+                    for i in range(cnt)
+                )
+        return None
+
+    def close(self):
+        self._mm.close()
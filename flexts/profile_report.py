@@ -0,0 +1,89 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts
+# File: profile_report.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 7:05 PM
+
+import os
+import time
+from statistics import mean
+from typing import Callable, Iterable
+
+import sqlite3 as sqlite
+
+from flexts.sqlite_fts5 import SQLiteFTS5
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def profile_report(items: Callable[[], Iterable[tuple]], columns: Iterable[str], queries: Iterable[str],
+                   work_dir: str, profiles: Iterable[str] = None, extra: dict = None,
+                   repeat: int = 5, limit: int = 10, index_name: str = 'profile_fts') -> list[dict]:
+    """
+        Builds the same corpus into index of each storage profile (own database file in work_dir)
+        and measures file size, build time and latency of match queries.
+
+        items - callable that returns iterable of (rowid, data) pairs, it is called once per profile
+        queries - fts5 match expressions, each one runs repeat times as
+            SELECT rowid, rank FROM index WHERE index MATCH ? ORDER BY rank LIMIT limit
+        extra - fts5 options that are common for all profiles, for example {'tokenize': 'hunspell_ua'}
+
+        Query that is not supported by profile (for example column filter for detail=none) is counted as error.
+        Size of detail=none profile includes the token table that it requires.
+
+    :return: [{'profile', 'options', 'docs', 'size', 'build_seconds', 'query_ms', 'query_p95_ms', 'errors',
+        'queries': {query: mean ms or None}}, ...]
+    """
+    columns = [*columns]
+    queries = [*queries]
+    res = []
+    for profile in profiles or SQLiteFTS5.storage_profiles:
+        options = SQLiteFTS5.get_profile_options(profile)
+        path = os.path.join(work_dir, f'{index_name}_{profile}.sqlite3')
+        if os.path.exists(path):
+            os.remove(path)
+
+        con = sqlite.connect(path)
+        try:
+            driver = SQLiteFTS5(con, index_name, columns,
+                                token_table=str(options.get('detail', 'full')).lower() == 'none')
+            start = time.perf_counter()
+            driver.create_index(extra, profile=profile)
+            docs = driver.insert_many(items())
+            driver.optimize()
+            build_seconds = time.perf_counter() - start
+
+            sql = f'SELECT rowid, rank FROM {index_name} WHERE {index_name} MATCH ? ORDER BY rank LIMIT ?'
+            timings, per_query, errors = [], {}, 0
+            for q in queries:
+                q_timings = []
+                try:
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        con.execute(sql, (q, limit)).fetchall()
+                        q_timings.append((time.perf_counter() - start) * 1000)
+                except sqlite.OperationalError:
+                    errors += 1
+                    per_query[q] = None
+                    continue
+                timings.extend(q_timings)
+                per_query[q] = mean(q_timings)
+        finally:
+            con.close()
+
+        res.append({
+            'profile': profile,
+            'options': options,
+            'docs': docs,
+            'size': os.path.getsize(path),
+            'build_seconds': build_seconds,
+            'query_ms': mean(timings) if timings else None,
+            'query_p95_ms': _percentile(timings, 95) if timings else None,
+            'errors': errors,
+            'queries': per_query,
+        })
+    return res
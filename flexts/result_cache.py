@@ -0,0 +1,92 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts
+# File: result_cache.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 11:20 PM
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class ResultCache:
+    """
+        LRU cache of search results that are valid for certain generation of index.
+
+        Each entry keeps generation of index that was current before the query was run. Entry of other generation
+        is invalid (index was changed), it is removed on lookup. Empty results (zero hits) are cached too.
+
+        max_size - max number of entries, least recently used entry is evicted
+        ttl - entry lifetime in seconds, None - unlimited
+    """
+
+    clock = staticmethod(time.monotonic)
+    miss = object()
+
+    def __init__(self, max_size: int = 1024, ttl: float = None) -> None:
+        if max_size < 1:
+            raise ValueError('max_size must be positive')
+        if ttl is not None and ttl <= 0:
+            raise ValueError('ttl must be positive')
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Hashable, float, Any]] = OrderedDict()
+        self._stats = {
+            'hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, generation: Hashable) -> Any:
+        """
+            Returns cached value or ResultCache.miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                gen, expires_at, value = entry
+                if gen != generation:
+                    self._stats['invalidations'] += 1
+                elif expires_at is not None and expires_at <= self.clock():
+                    self._stats['expirations'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    if not value:
+                        self._stats['negative_hits'] += 1
+                    return value
+                del self._entries[key]
+            self._stats['misses'] += 1
+            return self.miss
+
+    def put(self, key: Hashable, generation: Hashable, value: Any):
+        expires_at = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (generation, expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'size': len(self._entries),
+                'hit_rate': self._stats['hits'] / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,210 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts
+# File: sharded_fts5.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 8:10 PM
+
+from bisect import bisect_right
+from operator import itemgetter
+from typing import Callable, Iterable, Sequence, Union
+
+import sqlite3 as sqlite
+
+from flexts.sqlite_fts5 import SQLiteFTS5
+
+
+class ShardedSQLiteFTS5:
+    """
+        Index that is partitioned by rowid across several databases (shards), one SQLiteFTS5 per connection
+        with the same index name. Writes are routed to the shard that owns rowid, so each write transaction
+        locks one shard file only.
+
+        partition:
+            'hash' - rowid % number of shards
+            'range' - bounds are sorted rowids where next shard starts, len(bounds) == number of shards - 1
+                (shard 0 keeps rowid < bounds[0], shard 1 keeps bounds[0] <= rowid < bounds[1], ...)
+
+        Partition (and order of connections) must be the same each time for the same shard files.
+        Queries should be run on each shard and results are merged (see BlogFTSIndex.match).
+    """
+
+    partitions = ('hash', 'range')
+    driver_class = SQLiteFTS5
+
+    def __init__(self, connections: Sequence[sqlite.Connection], index_name: str,
+                 index_columns: Union[Iterable, str] = 'content', unindexed_columns: Union[Iterable, str, None] = None,
+                 partition: str = 'hash', bounds: Sequence[int] = None,
+                 token_table: bool = None, index_mode: str = None) -> None:
+        if not connections:
+            raise ValueError('at least one shard connection is required')
+        if partition not in self.partitions:
+            raise ValueError(f'unknown partition "{partition}"')
+        if partition == 'range':
+            bounds = [*(bounds or ())]
+            if len(bounds) != len(connections) - 1:
+                raise ValueError(
+                    f'range partition of {len(connections)} shards requires {len(connections) - 1} bounds'
+                )
+            if bounds != sorted(set(bounds)):
+                raise ValueError('bounds must be sorted and unique')
+        elif bounds:
+            raise ValueError('bounds have sense for range partition only')
+
+        self.partition = partition
+        self.bounds = bounds
+        self.shards = [
+            self.driver_class(con, index_name, index_columns, unindexed_columns,
+                              token_table=token_table, index_mode=index_mode)
+            for con in connections
+        ]
+
+    def with_connection(self, connect: Callable[[sqlite.Connection], sqlite.Connection]) -> 'ShardedSQLiteFTS5':
+        """
+            Returns driver of the same shards that uses connections connect(connection of shard)
+        """
+        return type(self)(
+            [connect(con) for con in self.connections], self.index_name, self.index_columns,
+            self.shards[0].unindexed_columns, self.partition, self.bounds, self.token_table, self.index_mode
+        )
+
+    @property
+    def _connection(self) -> sqlite.Connection:
+        """
+            Connection of the first shard, it keeps the states that are not partitioned (see ChangelogConsumer)
+        """
+        return self.shards[0]._connection
+
+    @property
+    def connections(self) -> list[sqlite.Connection]:
+        return [s._connection for s in self.shards]
+
+    @property
+    def index_name(self) -> str:
+        return self.shards[0].index_name
+
+    @property
+    def index_columns(self) -> list:
+        return self.shards[0].index_columns
+
+    @property
+    def index_mode(self) -> str:
+        return self.shards[0].index_mode
+
+    @property
+    def generation(self) -> int:
+        return sum(s.generation for s in self.shards)
+
+    @property
+    def token_table(self) -> bool:
+        return self.shards[0].token_table
+
+    @token_table.setter
+    def token_table(self, token_table: bool):
+        for s in self.shards:
+            s.token_table = token_table
+
+    def shard_of(self, rowid) -> int:
+        if self.partition == 'range':
+            return bisect_right(self.bounds, rowid)
+        return int(rowid) % len(self.shards)
+
+    def get_shard(self, rowid) -> SQLiteFTS5:
+        return self.shards[self.shard_of(rowid)]
+
+    def _split(self, items: Iterable, key: Callable = itemgetter(0)) -> dict[int, list]:
+        """
+            Splits items by shards of their rowid (key(item)) keeping their order
+        """
+        res = {}
+        for item in items:
+            res.setdefault(self.shard_of(key(item)), []).append(item)
+        return res
+
+    def _many(self, method: str, items: Iterable, commit_every: int = None,
+              key: Callable = itemgetter(0)) -> int:
+        """
+            Calls bulk method of shards for each chunk of items, each shard commits its part of chunk
+        """
+        total = 0
+        for chunk in SQLiteFTS5._chunks(items, commit_every or SQLiteFTS5.commit_every):
+            for i, part in self._split(chunk, key).items():
+                total += getattr(self.shards[i], method)(part, len(part))
+        return total
+
+    def check_index(self) -> bool:
+        return all(s.check_index() for s in self.shards)
+
+    def set_index_mode(self, index_mode: str = None):
+        for s in self.shards:
+            s.set_index_mode(index_mode)
+
+    def get_index_mode(self) -> Union[str, None]:
+        return self.shards[0].get_index_mode()
+
+    def get_index_options(self) -> dict:
+        return self.shards[0].get_index_options()
+
+    def get_tokenizer_name(self, tokenize: str = None) -> Union[str, None]:
+        return self.shards[0].get_tokenizer_name(tokenize)
+
+    def create_index(self, extra: dict = None, profile: str = None):
+        """
+            Creates index in shards where it does not exist
+        """
+        res = True
+        for s in self.shards:
+            if not s.check_index():
+                res = s.create_index(extra, profile) and res
+        return res
+
+    def drop_index(self):
+        return all([s.drop_index() for s in self.shards])
+
+    def count(self) -> int:
+        return sum(s.count() for s in self.shards)
+
+    def optimize(self):
+        for s in self.shards:
+            s.optimize()
+
+    def integrity_check(self, rank: int = None):
+        for s in self.shards:
+            s.integrity_check(rank)
+
+    def check_index_is_broken(self, return_details=False) -> list[sqlite.Row]:
+        return [r for s in self.shards for r in s.check_index_is_broken(return_details)]
+
+    def insert(self, rowid, data: dict):
+        self.get_shard(rowid).insert(rowid, data)
+
+    def update(self, rowid, data: dict):
+        self.get_shard(rowid).update(rowid, data)
+
+    def delete(self, rowid, data: dict):
+        self.get_shard(rowid).delete(rowid, data)
+
+    def delete_for(self, rowid, columns: Iterable = None):
+        self.get_shard(rowid).delete_for(rowid, columns)
+
+    def delete_all(self):
+        for s in self.shards:
+            s.delete_all()
+
+    def insert_many(self, items: Iterable[tuple], commit_every: int = None) -> int:
+        return self._many('insert_many', items, commit_every)
+
+    def delete_many(self, items: Iterable[tuple], commit_every: int = None) -> int:
+        return self._many('delete_many', items, commit_every)
+
+    def delete_for_many(self, items: Iterable[tuple], commit_every: int = None) -> int:
+        return self._many('delete_for_many', items, commit_every)
+
+    def update_many(self, items: Iterable[tuple], commit_every: int = None) -> int:
+        return self._many('update_many', items, commit_every)
+
+    def replace_many(self, items: Iterable[tuple], commit_every: int = None) -> int:
+        return self._many('replace_many', items, commit_every)
+
+    def purge_many(self, rowids: Iterable, commit_every: int = None) -> int:
+        return self._many('purge_many', rowids, commit_every, key=lambda rowid: rowid)
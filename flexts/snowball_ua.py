@@ -9,13 +9,15 @@
 # create links inside virtual environment
 # ....venv/lib/python3.9/site-packages$ ln -s /usr/lib/python3/dist-packages/PyStemmer-2.0.1.egg-info
 # ....venv/lib/python3.9/site-packages$ ln -s /usr/lib/python3/dist-packages/Stemmer.cpython-39-x86_64-linux-gnu.so
+#
+# Backends (hunspell, PyStemmer, snowballstemmer) are registered in flexts.stemmer and loaded on first use.
+# This module has no import time side effects.
 
-import sqlitefts
-import hunspell
-import Stemmer
-import snowballstemmer as sbstem
 
-print(Stemmer.algorithms())
+def algorithms() -> list[str]:
+    import Stemmer
+    return Stemmer.algorithms()
 
-# Stemmer.
 
+if __name__ == '__main__':
+    print(algorithms())
@@ -5,7 +5,13 @@
 # Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
 # Created by ox23 at 2022-11-27 (y-m-d) 6:35 PM
 
-from typing import Iterable, Mapping, Union, Generator
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from itertools import groupby, islice
+from typing import Callable, Iterable, Mapping, Union, Generator
 
 import sqlite3 as sqlite
 
@@ -30,8 +36,9 @@ class SQLiteFTS5SQLBuilder:
     def __init__(self, table_name: str) -> None:
         self.table_name = table_name
 
-    def get_sql_stm_template(self):
-        return f"INSERT INTO {self.table_name} (%({self._cols_template_key})s) VALUES (%({self._prms_template_key})s)"
+    def get_sql_stm_template(self, replace=False):
+        return f"INSERT {'OR REPLACE ' if replace else ''}INTO {self.table_name} "\
+               f"(%({self._cols_template_key})s) VALUES (%({self._prms_template_key})s)"
 
     def get_column_list(self, columns: Iterable, delete=False) -> list:
         if isinstance(columns, Mapping):
@@ -58,7 +65,10 @@ class SQLiteFTS5SQLBuilder:
             prms.insert(0, cmd)
         return prms
 
-    def build(self, columns: Iterable, delete=False) -> str:
+    def build(self, columns: Iterable, delete=False, replace=False) -> str:
+        """
+            replace - INSERT OR REPLACE statement (contentless_delete=1 and regular tables only)
+        """
         if isinstance(columns, Generator):
             columns = tuple(columns)
 
@@ -66,13 +76,17 @@ class SQLiteFTS5SQLBuilder:
             self._cols_template_key: ', '.join(self.get_column_list(columns, delete=delete)),
             self._prms_template_key: ', '.join(self.get_param_list(columns, delete=delete)),
         }
-        return self.get_sql_stm_template() % stmnt_prms
+        return self.get_sql_stm_template(replace and not delete) % stmnt_prms
 
 
 class SQLiteFTS5TooManyBrokenIndexesError(Exception):
     pass
 
 
+class SQLiteFTS5VerificationError(Exception):
+    pass
+
+
 # 2022-12-06
 # SQLiteFTS5 was added the facilities for unindexed columns
 # but for contentless index it has no sense (contentless - default for now).
@@ -80,13 +94,52 @@ class SQLiteFTS5TooManyBrokenIndexesError(Exception):
 
 class SQLiteFTS5:
     pk_name = 'rowid'
+    commit_every = 1000  # default number of rows per one transaction for *_many methods
+    shadow_suffix = '_shadow'
+    token_table_suffix = '_tokens'
+    # contentless - content='', deletes need the old values (token table or fts5vocab)
+    # contentless_delete - content='', contentless_delete=1 (SQLite >= 3.43), deletes need only rowid
+    # external - content='table' in the same database, extra={'content': ..., 'content_rowid': ...}
+    index_modes = ('contentless', 'contentless_delete', 'external')
+    contentless_delete_min_version = (3, 43, 0)
+    _contentless_delete_p = re.compile(r'contentless_delete\s*=\s*[\'"]?1', re.IGNORECASE)
+    _content_rowid_p = re.compile(r'\bcontent_rowid\s*=\s*[\'"]?(\w+)', re.IGNORECASE)
+    _content_p = re.compile(r'\bcontent\s*=\s*(?:\'([^\']*)\'|"([^"]*)"|(\w+))', re.IGNORECASE)
+    builtin_tokenizers = ('unicode61', 'ascii', 'porter', 'trigram')
+    # named sets of fts5 storage options for create_index(profile=...)
+    #   prefix='2 3' - prefix indexes for "term"* queries (2 and 3 characters)
+    #   detail='column' - no positions, phrase and NEAR queries are not supported
+    #   detail='none' - no columns and positions, column filters are not supported, deletes need token_table
+    #   columnsize=0 - no per-column document sizes, bm25 does not take document length into account,
+    #       contentless index can't be scanned (see count)
+    storage_profiles = {
+        'full': {},
+        'prefix': {'prefix': '2 3'},
+        'column': {'detail': 'column'},
+        'column_prefix': {'detail': 'column', 'prefix': '2 3'},
+        'nosize': {'columnsize': 0},
+        'minimal': {'detail': 'none', 'columnsize': 0},
+    }
+    _option_p = re.compile(r'(\w+)\s*=\s*(?:\'([^\']*)\'|"([^"]*)"|(\w+))')
+    _tokenize_p = re.compile(r'tokenize\s*=\s*[\'"]?\s*(\w+)', re.IGNORECASE)
 
     def __init__(self,
                  connection: sqlite.Connection,
                  index_name: str,
                  index_columns: Union[Iterable, str] = 'content',
                  unindexed_columns: Union[Iterable, str, None] = None,
-                 rowfactory=None) -> None:
+                 rowfactory=None,
+                 token_table: bool = None,
+                 index_mode: str = None) -> None:
+        """
+            token_table - keep exact text written for each (rowid, column) in side table {index_name}_tokens,
+            so delete/update get old data by primary key instead of scanning fts5vocab.
+            It is created together with index. None - use it if it exists.
+
+            index_mode - one of index_modes or 'auto' (contentless_delete if SQLite supports it, else contentless)
+            for index that will be created. Mode of existing index is detected from its definition.
+            None - 'contentless'.
+        """
 
         self._connection = connection
 
@@ -100,6 +153,28 @@ class SQLiteFTS5:
 
         self.index_name = str(index_name)
         self.sql_builder = SQLiteFTS5SQLBuilder(self.index_name)
+        self._sql_cache = {}
+        # number of committed write transactions of this driver (see _write_transaction)
+        self.generation = 0
+
+        exists = self.check_index()
+        if token_table is None:
+            token_table = self.check_token_table()
+        elif token_table and exists and not self.check_token_table():
+            raise ValueError(f'index "{self.index_name}" exists without token table, it must be rebuilt')
+        self.token_table = token_table
+        self.set_index_mode(index_mode)
+
+        if exists:
+            self.register_tokenizer()
+
+    def with_connection(self, connect: Callable[[sqlite.Connection], sqlite.Connection]) -> 'SQLiteFTS5':
+        """
+            Returns driver of the same index that uses connection connect(connection of this driver),
+            for example own connection of other thread (see WriteBehindIndexer)
+        """
+        return type(self)(connect(self._connection), self.index_name, self.index_columns, self.unindexed_columns,
+                          token_table=self.token_table, index_mode=self.index_mode)
 
     @property
     def index_columns(self):
@@ -132,6 +207,16 @@ class SQLiteFTS5:
                 raise ValueError(f'unindexed_columns must be subset of index_columns. {ex_cols} is extra set')
         self._unindexed_columns = res
 
+    @contextmanager
+    def _write_transaction(self) -> Generator[sqlite.Connection, None, None]:
+        """
+            Transaction that changes data of index. Generation is bumped after commit,
+            so results cached before are not valid anymore (see flexts.result_cache).
+        """
+        with self._connection as con:
+            yield con
+        self.generation += 1
+
     def check_index(self) -> bool:
         cursor = self._connection.execute(
             "SELECT * FROM sqlite_schema WHERE type = 'table' and name = ?", (self.index_name, )
@@ -142,40 +227,403 @@ class SQLiteFTS5:
         cursor.close()
         return res
 
-    def create_index(self, extra: dict = None):
+    @classmethod
+    def resolve_index_mode(cls, index_mode: str = None) -> str:
+        if index_mode is None:
+            return 'contentless'
+        if index_mode == 'auto':
+            if sqlite.sqlite_version_info >= cls.contentless_delete_min_version:
+                return 'contentless_delete'
+            return 'contentless'
+        if index_mode not in cls.index_modes:
+            raise ValueError(f'unknown index mode "{index_mode}"')
+        return index_mode
+
+    def get_index_mode(self) -> Union[str, None]:
+        """
+            Returns mode of existing index from its definition or None if index does not exist
+        """
+        sql = self.get_index_sql()
+        if sql is None:
+            return None
+        if self._contentless_delete_p.search(sql):
+            return 'contentless_delete'
+        m = self._content_p.search(sql)
+        if m and any(m.groups()):
+            return 'external'
+        return 'contentless'
+
+    def set_index_mode(self, index_mode: str = None):
+        """
+            Sets mode for index that will be created. For existing index it must be None, 'auto' or the same mode.
+        """
+        mode = self.resolve_index_mode(index_mode)
+        existing = self.get_index_mode()
+        if existing is not None:
+            if index_mode not in (None, 'auto') and mode != existing:
+                raise ValueError(f'index "{self.index_name}" exists in "{existing}" mode')
+            mode = existing
+        self.index_mode = mode
+        # it falls back to contentless if SQLite rejects contentless_delete
+        self._auto_index_mode = index_mode == 'auto'
+
+    @property
+    def token_table_name(self) -> str:
+        return f'{self.index_name}{self.token_table_suffix}'
+
+    def check_token_table(self) -> bool:
+        cursor = self._connection.execute(
+            "SELECT 1 FROM sqlite_schema WHERE type = 'table' and name = ?", (self.token_table_name, )
+        )
+        try:
+            return cursor.fetchone() is not None
+        finally:
+            cursor.close()
+
+    def _create_token_table(self, con: sqlite.Connection):
+        con.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.token_table_name} '
+            f'(doc INTEGER NOT NULL, col TEXT NOT NULL, text, PRIMARY KEY (doc, col)) WITHOUT ROWID'
+        ).close()
+
+    @classmethod
+    def get_profile_options(cls, profile: str) -> dict:
+        try:
+            return dict(cls.storage_profiles[profile])
+        except KeyError:
+            raise ValueError(f'unknown storage profile "{profile}"')
+
+    def get_index_options(self) -> dict:
+        """
+            Returns options (name=value) of existing index like {'content': '', 'detail': 'column'}
+        """
+        sql = self.get_index_sql()
+        if sql is None:
+            return {}
+        using = sql[sql.upper().index('USING'):]
+        return {m.group(1).lower(): next(g for g in m.groups()[1:] if g is not None)
+                for m in self._option_p.finditer(using)}
+
+    def create_index(self, extra: dict = None, profile: str = None):
+        """
+            extra - fts5 options {name: value}, they override options of storage profile
+            profile - name of storage profile (see storage_profiles)
+        """
         # execute SQL to create contentless fts5 index
         # CREATE VIRTUAL TABLE blog_fts USING fts5(title, text, content='');
         # SQLiteFTS5 was added the facilities for unindexed columns
         # but for contentless index it has no sense (default for now).
         # Also new facilities compatible with old behaviour and tests but was not tested.
 
+        extra = {**(self.get_profile_options(profile) if profile else {}), **(extra or {})}
+        if str(extra.get('detail', 'full')).lower() == 'none' and not self.token_table:
+            raise ValueError('detail=none index requires token_table, fts5vocab has no columns for deletes')
+        content = extra.pop('content', None)
         _extra = {'content': ''}
-        if extra is not None:
-            extra.pop('content', None)
-            _extra.update(extra)
+        if self.index_mode == 'external':
+            if not content:
+                raise ValueError('"content" table in extra is required for external index mode')
+            _extra['content'] = content
+        _extra.update(extra)
+        if 'tokenize' in _extra:
+            self.register_tokenizer(_extra['tokenize'])
 
-        uic = self.unindexed_columns
-        cols = [
-            *(f'{c}{" UNINDEXED" if c in uic else ""}' for c in self.index_columns),
-            *(f'{p}=\'{v}\'' for p, v in _extra.items())
-        ]
         res = True
         with self._connection as idx_con:
             if not self.check_index():
-                cursor = idx_con.execute(f"CREATE VIRTUAL TABLE {self.index_name} USING fts5 ({', '.join(cols)})")
+                try:
+                    cursor = idx_con.execute(self._create_index_sql(_extra))
+                except sqlite.OperationalError:
+                    if not (self.index_mode == 'contentless_delete' and self._auto_index_mode):
+                        raise
+                    self.index_mode = 'contentless'
+                    cursor = idx_con.execute(self._create_index_sql(_extra))
                 assert cursor.rowcount == -1, f'can\'t create fts5 table "{self.index_name}"'
                 cursor = cursor.execute(
                     f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.index_name}_v USING fts5vocab ({self.index_name}, instance)"
                 )
                 cursor.close()
                 res = cursor.rowcount == -1
+                if self.token_table:
+                    self._create_token_table(idx_con)
         return res
 
+    def _create_index_sql(self, extra: dict) -> str:
+        _extra = dict(extra)
+        if self.index_mode == 'contentless_delete':
+            _extra['contentless_delete'] = 1
+        uic = self.unindexed_columns
+        cols = [
+            *(f'{c}{" UNINDEXED" if c in uic else ""}' for c in self.index_columns),
+            *(f'{p}=\'{v}\'' for p, v in _extra.items())
+        ]
+        return f"CREATE VIRTUAL TABLE {self.index_name} USING fts5 ({', '.join(cols)})"
+
+    def rebuild(self):
+        """
+            Rebuilds external content index from its content table ('rebuild' command).
+            Token table is refilled from the content table too.
+        """
+        if self.index_mode != 'external':
+            raise ValueError(f'rebuild is supported only for external index mode, not "{self.index_mode}"')
+
+        with self._write_transaction() as con:
+            con.execute(f"INSERT INTO {self.index_name}({self.index_name}) VALUES('rebuild')").close()
+            if self.token_table:
+                sql = self.get_index_sql()
+                content = next(g for g in self._content_p.search(sql).groups() if g)
+                m = self._content_rowid_p.search(sql)
+                content_rowid = m.group(1) if m else 'rowid'
+                con.execute(f'DELETE FROM {self.token_table_name}').close()
+                for c in self.index_columns:
+                    con.execute(
+                        f'INSERT INTO {self.token_table_name} (doc, col, text) '
+                        f'SELECT {content_rowid}, ?, {c} FROM {content} WHERE {c} IS NOT NULL', (c, )
+                    ).close()
+
+    def get_index_sql(self) -> Union[str, None]:
+        """
+            Returns CREATE VIRTUAL TABLE statement of existing index or None
+        """
+        cursor = self._connection.execute(
+            "SELECT sql FROM sqlite_schema WHERE type = 'table' and name = ?", (self.index_name, )
+        )
+        try:
+            r = cursor.fetchone()
+        finally:
+            cursor.close()
+        return r[0] if r else None
+
+    def get_tokenizer_name(self, tokenize: str = None) -> Union[str, None]:
+        """
+            Returns name of tokenizer from tokenize option (tokenize='porter ascii' -> 'porter')
+            or from definition of existing index if tokenize is None
+        """
+        if tokenize is None:
+            tokenize = self.get_index_sql()
+            if tokenize is None:
+                return None
+            m = self._tokenize_p.search(tokenize)
+            return m.group(1) if m else None
+        return tokenize.split()[0] if tokenize.split() else None
+
+    def register_tokenizer(self, tokenize: str = None) -> bool:
+        """
+            Registers custom tokenizer (see flexts.fts5_tokenizer.tokenizers) for connection.
+            Builtin tokenizers are skipped (False).
+        """
+        name = self.get_tokenizer_name(tokenize)
+        if not name or name in self.builtin_tokenizers:
+            return False
+
+        from flexts.fts5_tokenizer import tokenizers, register_tokenizer
+        if name not in tokenizers:
+            return False
+        return register_tokenizer(self._connection, name)
+
+    def create_shadow(self, suffix: str = None, recreate: bool = True, extra: dict = None) -> 'SQLiteFTS5':
+        """
+            Creates shadow index (index_name + suffix) that has the same definition (options) as this index.
+            It is used to build new index alongside the live one and to swap it in then (see swap).
+
+            recreate - drop existing shadow index before
+            extra - used only if this index does not exist yet
+        """
+        shadow = self.__class__(
+            self._connection, f'{self.index_name}{suffix or self.shadow_suffix}',
+            self.index_columns, self.unindexed_columns
+        )
+        shadow.token_table = self.token_table
+        shadow.index_mode, shadow._auto_index_mode = self.index_mode, self._auto_index_mode
+        if recreate:
+            shadow.drop_index()
+        if shadow.check_index():
+            return shadow
+
+        sql = self.get_index_sql()
+        if sql is None:
+            shadow.create_index(extra)
+        else:
+            using = sql[sql.upper().index('USING'):]
+            with self._connection as idx_con:
+                idx_con.execute(f"CREATE VIRTUAL TABLE {shadow.index_name} {using}").close()
+                idx_con.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {shadow.index_name}_v "
+                    f"USING fts5vocab ({shadow.index_name}, instance)"
+                ).close()
+                if shadow.token_table:
+                    shadow._create_token_table(idx_con)
+        return shadow
+
+    # rowid of structure record in {index_name}_data table, it describes segments of index (see fts5_index.c)
+    averages_rowid = 1
+    structure_rowid = 10
+    _structure_v2 = b'\xff\x00\x00\x01'
+
+    @staticmethod
+    def _varint(data: bytes, pos: int) -> tuple[int, int]:
+        """
+            Decodes SQLite varint, returns (value, next position)
+        """
+        v = 0
+        for i in range(pos, pos + 8):
+            b = data[i]
+            v = (v << 7) | (b & 0x7f)
+            if b < 0x80:
+                return v, i + 1
+        return (v << 8) | data[pos + 8], pos + 9
+
+    def get_structure(self) -> dict:
+        """
+            Returns summary of index segments from structure record:
+            {'levels': [number of segments on level 0, 1, ...], 'segments': total, 'write_counter': n}
+            write_counter grows on each flush of pending data (each write transaction)
+        """
+        cursor = self._connection.execute(
+            f'SELECT block FROM {self.index_name}_data WHERE id = ?', (self.structure_rowid, )
+        )
+        try:
+            r = cursor.fetchone()
+        finally:
+            cursor.close()
+        if r is None or not r[0]:
+            return {'levels': [], 'segments': 0, 'write_counter': 0}
+
+        data, pos = r[0], 4  # cookie
+        v2 = data[pos:pos + 4] == self._structure_v2
+        if v2:
+            pos += 4
+        n_levels, pos = self._varint(data, pos)
+        n_segments, pos = self._varint(data, pos)
+        write_counter, pos = self._varint(data, pos)
+
+        levels = []
+        for _ in range(n_levels):
+            _, pos = self._varint(data, pos)  # number of segments being merged
+            n, pos = self._varint(data, pos)
+            levels.append(n)
+            # segid, first page, last page + (origin1, origin2, tombstone pages, tombstone entries, entries) for v2
+            for _ in range(n * (8 if v2 else 3)):
+                _, pos = self._varint(data, pos)
+        return {'levels': levels, 'segments': n_segments, 'write_counter': write_counter}
+
+    def segment_count(self) -> int:
+        return self.get_structure()['segments']
+
+    def set_config(self, name: str, value):
+        """
+            Sets persistent configuration option of index, for example 'automerge', 'crisismerge', 'usermerge'
+        """
+        with self._connection as con:
+            con.execute(
+                f"INSERT INTO {self.index_name}({self.index_name}, rank) VALUES(?, ?)", (name, value)
+            ).close()
+
+    def merge(self, pages: int) -> bool:
+        """
+            Runs 'merge' command in own transaction, it writes about abs(pages) pages.
+            Negative pages merges all segments regardless of level (incremental optimize).
+            Returns False if there was nothing to merge.
+        """
+        con = self._connection
+        with con:
+            before = con.total_changes
+            con.execute(
+                f"INSERT INTO {self.index_name}({self.index_name}, rank) VALUES('merge', ?)", (pages, )
+            ).close()
+            # merge that did some work changes 2 or more rows of %_data
+            return con.total_changes - before >= 2
+
+    def optimize(self):
+        """
+            Merges all segments into one, time is not bounded (see merge with negative pages)
+        """
+        with self._connection as con:
+            con.execute(f"INSERT INTO {self.index_name}({self.index_name}) VALUES('optimize')").close()
+
+    def count(self) -> int:
+        """
+            Returns number of rows of index. Contentless index without document sizes (columnsize=0) does not
+            support scanning, number of its rows is read from the averages record (committed rows).
+        """
+        if self.index_mode != 'external' and self.get_index_options().get('columnsize') == '0':
+            cursor = self._connection.execute(
+                f'SELECT block FROM {self.index_name}_data WHERE id = ?', (self.averages_rowid, )
+            )
+            try:
+                r = cursor.fetchone()
+            finally:
+                cursor.close()
+            return self._varint(r[0], 0)[0] if r is not None and r[0] else 0
+
+        cursor = self._connection.execute(f"SELECT count(*) FROM {self.index_name}")
+        try:
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    def verify(self, expected_count: int = None):
+        """
+            Raises SQLiteFTS5VerificationError if index is broken or has not expected number of rows
+        """
+        broken = self.check_index_is_broken()
+        if broken:
+            raise SQLiteFTS5VerificationError(f'index "{self.index_name}" has {len(broken)} broken rows')
+        if expected_count is not None:
+            cnt = self.count()
+            if cnt != expected_count:
+                raise SQLiteFTS5VerificationError(
+                    f'index "{self.index_name}" has {cnt} rows but {expected_count} is expected'
+                )
+
+    def swap(self, shadow: 'SQLiteFTS5', expected_count: int = None):
+        """
+            Replaces this (live) index by shadow index in one transaction via renaming.
+            Readers see either old or new index in full. Old index is dropped.
+            After swap the shadow object refers to not existing index.
+            Writes into this index after shadow was created are not copied into shadow, they must be re-applied
+            after swap (see FTSRebuilder.run, it requires changelog triggers).
+            ValueError is raised if transaction of index connection is open.
+        """
+        con = self._connection
+        if con.in_transaction:
+            # it would be committed or rolled back together with the swap
+            raise ValueError('swap can not be done inside of open transaction of index connection')
+        if not shadow.check_index():
+            raise ValueError(f'shadow index "{shadow.index_name}" does not exist')
+        shadow.verify(expected_count)
+
+        old_name = f'{self.index_name}__old'
+        con.execute('BEGIN IMMEDIATE').close()
+        try:
+            for sql in (
+                f"DROP TABLE IF EXISTS {self.index_name}_v",
+                f"DROP TABLE IF EXISTS {shadow.index_name}_v",
+                f"ALTER TABLE {self.index_name} RENAME TO {old_name}" if self.check_index() else None,
+                f"ALTER TABLE {shadow.index_name} RENAME TO {self.index_name}",
+                f"DROP TABLE IF EXISTS {old_name}",
+                f"CREATE VIRTUAL TABLE {self.index_name}_v USING fts5vocab ({self.index_name}, instance)",
+                f"DROP TABLE IF EXISTS {self.token_table_name}",
+                f"ALTER TABLE {shadow.token_table_name} RENAME TO {self.token_table_name}"
+                if shadow.token_table else None,
+            ):
+                if sql is not None:
+                    con.execute(sql).close()
+        except Exception:
+            con.rollback()
+            raise
+        else:
+            con.commit()
+        self.generation += 1
+        self.token_table = shadow.token_table
+        self.index_mode = shadow.index_mode
+
     def drop_index(self):
-        with self._connection as idx_con:
+        with self._write_transaction() as idx_con:
             cursor = idx_con.execute(f"DROP TABLE IF EXISTS {self.index_name}")
             assert cursor.rowcount == -1, f'can\'t drop fts5 table "{self.index_name}"'
             cursor.execute(f"DROP TABLE IF EXISTS {self.index_name}_v")
+            cursor.execute(f"DROP TABLE IF EXISTS {self.token_table_name}")
             cursor.close()
             return cursor.rowcount == -1
 
@@ -190,9 +638,12 @@ class SQLiteFTS5:
         :return:
         """
         sql_detail = f'SELECT group_concat(term) as terms, doc as rowid, col, offset, count(*) as cnt '\
-                     f'FROM {self.index_name}_v GROUP BY doc, col, offset HAVING cnt >1 ORDER BY doc, col, offset'
+                     f'FROM {self.index_name}_v WHERE offset IS NOT NULL GROUP BY doc, col, offset HAVING cnt >1 '\
+                     f'ORDER BY doc, col, offset'
 
-        sub_sql = f'SELECT doc, count(*) as cnt FROM {self.index_name}_v GROUP BY doc, col, offset HAVING cnt >1'
+        # offset is NULL for detail=column and detail=none indexes, duplicated offsets can't be found for them
+        sub_sql = f'SELECT doc, count(*) as cnt FROM {self.index_name}_v WHERE offset IS NOT NULL '\
+                  f'GROUP BY doc, col, offset HAVING cnt >1'
         sql = f'SELECT doc as rowid, count(*) as error_cnt FROM ( {sub_sql} ) GROUP BY doc'
         sql_cnt = f'SELECT count(*) FROM ({sql})'
         cursor = self._connection.execute(sql_cnt)
@@ -208,6 +659,177 @@ class SQLiteFTS5:
         cursor.close()
         return res
 
+    def _copy_instances(self, schema: str, start_after: int = None, chunk_size: int = 1000):
+        """
+            Copies instances with offsets of index (doc > start_after) into table 'instances' of attached scratch
+            database (schema) keyed by doc. fts5vocab is ordered (and can be searched) by term only, so each
+            statement copies the next range of terms (chunk_size instances at least) and the last copied term is
+            saved with them. The copy is continued after it if scratch database is used again (see iter_broken).
+        """
+        con = self._connection
+        con.execute(
+            f'CREATE TABLE IF NOT EXISTS {schema}.copy_state (start_after INTEGER, last_term TEXT, done INTEGER)'
+        ).close()
+        cursor = con.execute(f'SELECT start_after, last_term, done FROM {schema}.copy_state')
+        try:
+            state = cursor.fetchone()
+        finally:
+            cursor.close()
+        if state is not None and state[0] is not None and (start_after is None or start_after < state[0]):
+            # copy has no instances of rowids that are checked now
+            state = None
+        if state is None:
+            for sql in (
+                f'DROP TABLE IF EXISTS {schema}.instances',
+                f'CREATE TABLE {schema}.instances (doc INTEGER, col TEXT, offset INTEGER, term TEXT)',
+                f'CREATE INDEX {schema}.instances_doc ON instances (doc, col, offset)',
+            ):
+                con.execute(sql).close()
+            with con:
+                con.execute(f'DELETE FROM {schema}.copy_state').close()
+                con.execute(f'INSERT INTO {schema}.copy_state VALUES (?, NULL, 0)', (start_after, )).close()
+            state = (start_after, None, 0)
+
+        lo, last, done = state
+        doc_where = '' if lo is None else 'AND doc > :lo '
+        while not done:
+            term_where = '' if last is None else 'WHERE term > :last '
+            cursor = con.execute(
+                f'SELECT term FROM {self.index_name}_v {term_where}ORDER BY term LIMIT 1 OFFSET :offset',
+                {'last': last, 'offset': chunk_size - 1}
+            )
+            try:
+                r = cursor.fetchone()
+            finally:
+                cursor.close()
+            hi = None if r is None else r[0]
+
+            where, prms = ['offset IS NOT NULL'], {'lo': lo}
+            if last is not None:
+                where.append('term > :last')
+                prms['last'] = last
+            if hi is not None:
+                where.append('term <= :hi')
+                prms['hi'] = hi
+            with con:
+                con.execute(
+                    f'INSERT INTO {schema}.instances (doc, col, offset, term) '
+                    f'SELECT doc, col, offset, term FROM {self.index_name}_v WHERE {" AND ".join(where)} {doc_where}',
+                    prms
+                ).close()
+                con.execute(
+                    f'UPDATE {schema}.copy_state SET last_term = ?, done = ?', (hi, int(hi is None))
+                ).close()
+            done, last = hi is None, hi
+
+    def _get_broken_rows(self, source: str, where: str, prms: Union[dict, tuple], return_details=False) -> list:
+        """
+            Groups instances of source (fts5vocab or copy of instances) by doc, col, offset, see check_index_is_broken
+        """
+        if return_details:
+            sql = f'SELECT group_concat(term) as terms, doc as rowid, col, offset, count(*) as cnt '\
+                  f'FROM {source} WHERE {where} GROUP BY doc, col, offset HAVING cnt >1 '\
+                  f'ORDER BY doc, col, offset'
+        else:
+            sub_sql = f'SELECT doc, count(*) as cnt FROM {source} WHERE {where} '\
+                      f'GROUP BY doc, col, offset HAVING cnt >1'
+            sql = f'SELECT doc as rowid, count(*) as error_cnt FROM ( {sub_sql} ) GROUP BY doc ORDER BY doc'
+        cursor = self._connection.execute(sql, prms)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def iter_broken(self, start_after: int = None, chunk_size: int = 1000, return_details=False,
+                    checkpoint: Callable[[int], None] = None, scratch: str = None) -> Generator[sqlite.Row, None, None]:
+        """
+            Same check as check_index_is_broken but over rowid ranges of chunk_size rows of index, and there is
+            no limit for number of broken rows.
+            fts5vocab can't be searched by doc, so the instances are copied into scratch database file keyed
+            by doc by one pass over fts5vocab (see _copy_instances), it does not depend on temp_store. Then each
+            rowid range is checked against the copy. The rows found are checked again in live fts5vocab
+            (one scan for chunk_size rows found), so the rows written while instances were copied are not reported.
+
+            start_after - resume after this rowid (checkpoint of previous run)
+            checkpoint - is called with the last checked rowid except the last one, after rows before were yielded
+            scratch - path of scratch database file. It is kept until the check is finished, so the next run
+                (resume) continues the copy or uses it. Temporary file is used and removed by default.
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+
+        tmp_dir = None
+        if scratch is None:
+            tmp_dir = tempfile.TemporaryDirectory()
+            path = os.path.join(tmp_dir.name, 'scratch.sqlite3')
+        else:
+            path = scratch
+        schema = f'{self.index_name}_scratch'
+        con = self._connection
+        con.execute(f'ATTACH DATABASE ? AS {schema}', (path, )).close()
+        finished = False
+        try:
+            self._copy_instances(schema, start_after, chunk_size)
+            lo, found = start_after, []
+            while True:
+                where, prms = [], {'limit': chunk_size}
+                if lo is not None:
+                    where.append('doc > :lo')
+                    prms['lo'] = lo
+                cursor = con.execute(
+                    f'SELECT max(doc), count(*) FROM (SELECT DISTINCT doc FROM {schema}.instances '
+                    f'{"WHERE " + " AND ".join(where) if where else ""} ORDER BY doc LIMIT :limit)', prms
+                )
+                try:
+                    r = cursor.fetchone()
+                finally:
+                    cursor.close()
+                # the last rowid of chunk, None - the rest of index
+                hi = r[0] if r[1] == chunk_size else None
+                if hi is not None:
+                    where.append('doc <= :hi')
+                    prms['hi'] = hi
+
+                found.extend(
+                    r['rowid'] for r in self._get_broken_rows(
+                        f'{schema}.instances', ' AND '.join(where) or '1', prms
+                    )
+                )
+                if found and (len(found) >= chunk_size or hi is None):
+                    yield from self._get_broken_rows(
+                        f'{self.index_name}_v', 'offset IS NOT NULL AND doc IN (SELECT value FROM json_each(?))',
+                        (json.dumps(found), ), return_details
+                    )
+                    found = []
+                if hi is None:
+                    break
+                if checkpoint is not None and not found:
+                    checkpoint(hi)
+                lo = hi
+            finished = True
+        finally:
+            con.execute(f'DETACH DATABASE {schema}').close()
+            if tmp_dir is not None:
+                tmp_dir.cleanup()
+            elif finished:
+                os.remove(scratch)
+
+    def integrity_check(self, rank: int = None):
+        """
+            Runs native FTS5 'integrity-check' command (rank=1 also compares external content with index).
+            Raises SQLiteFTS5VerificationError if index is corrupted.
+        """
+        sql = f"INSERT INTO {self.index_name}({self.index_name}) VALUES('integrity-check')"
+        prms = ()
+        if rank is not None:
+            sql = f"INSERT INTO {self.index_name}({self.index_name}, rank) VALUES('integrity-check', ?)"
+            prms = (rank, )
+        try:
+            with self._connection as con:
+                con.execute(sql, prms).close()
+        except sqlite.DatabaseError as exc:
+            raise SQLiteFTS5VerificationError(f'index "{self.index_name}" integrity-check failed: {exc}') from exc
+
     def _check_columns(self, data: Iterable):
         if not set(data).issubset(set(self.index_columns)):
             raise ValueError(f'keys in data is not in {self.__class__.__name__}.index_columns')
@@ -227,6 +849,9 @@ class SQLiteFTS5:
         # щось	 115	text	0
         # ....
 
+        if self.token_table:
+            return self._get_tokens_for(rowid, columns)
+
         prms = {self.pk_name: rowid}
         col_where = ''
 
@@ -242,7 +867,7 @@ class SQLiteFTS5:
         cursor = self._connection.execute(sql, prms)
         try:
             for r in cursor.fetchall():
-                data.setdefault(r['col'], []).append(r['term'])
+                data.setdefault(r['col'] or self.index_columns[0], []).append(r['term'])
 
             for k, v in data.items():
                 if isinstance(v, list):
@@ -251,20 +876,102 @@ class SQLiteFTS5:
             cursor.close()
         return data
 
+    def _get_tokens_for(self, rowid, columns: Iterable = None) -> dict:
+        """
+            Same as _get_terms_for but from token table, it is the data that were written exactly
+        """
+        prms = [rowid]
+        col_where = ''
+        if columns:
+            columns = [*columns]
+            self._check_columns(columns)
+            col_where = f' AND col IN ({", ".join("?" * len(columns))})'
+            prms.extend(columns)
+
+        cursor = self._connection.execute(
+            f'SELECT col, text FROM {self.token_table_name} WHERE doc = CAST(? AS INTEGER){col_where}', prms
+        )
+        try:
+            return {r[0]: r[1] for r in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    def _write_tokens(self, con: sqlite.Connection, rows: list[dict], delete=False):
+        """
+            Maintains token table for rows (prepared data) that were written into index
+        """
+        if not self.token_table or not rows:
+            return
+
+        if delete:
+            con.executemany(
+                f'DELETE FROM {self.token_table_name} WHERE doc = ? AND col = ?',
+                [(r[self.pk_name], c) for r in rows for c in r if c != self.pk_name]
+            ).close()
+        else:
+            con.executemany(
+                f'INSERT OR REPLACE INTO {self.token_table_name} (doc, col, text) VALUES (?, ?, ?)',
+                [(r[self.pk_name], c, v) for r in rows for c, v in r.items() if c != self.pk_name and v is not None]
+            ).close()
+
+    def _delete_row(self, con: sqlite.Connection, rowid, columns: Iterable = None) -> int:
+        """
+            Deletes rowid by primary key (contentless_delete mode), old data are not needed.
+            If columns is not all index columns then data of other columns are re-inserted.
+            Returns number of deleted rows (0 if rowid is not in index)
+        """
+        kept = {}
+        if columns:
+            columns = [*columns]
+            self._check_columns(columns)
+            others = [c for c in self.index_columns if c not in columns]
+            if others:
+                kept = self._get_terms_for(rowid, others)
+
+        cursor = con.execute(f'DELETE FROM {self.index_name} WHERE {self.pk_name} = CAST(? AS INTEGER)', (rowid, ))
+        try:
+            cnt = cursor.rowcount
+            if self.token_table:
+                cursor.execute(f'DELETE FROM {self.token_table_name} WHERE doc = CAST(? AS INTEGER)', (rowid, ))
+        finally:
+            cursor.close()
+
+        if cnt and kept:
+            self._execute_many(con, [self.prepare_data(rowid, kept)])
+        return cnt
+
+    def _merge_row(self, rowid, data: Mapping) -> dict:
+        """
+            Returns full row for INSERT OR REPLACE (contentless_delete mode),
+            columns that are not in data keep their data from index
+        """
+        row = self.prepare_data(rowid, dict(data))
+        others = [c for c in self.index_columns if c not in row]
+        if others:
+            row = self.prepare_data(rowid, self._get_terms_for(rowid, others)) | row
+        return row
+
     def delete_for(self, rowid, columns: Iterable = None):
-        with self._connection as con:
+        with self._write_transaction() as con:
+            if self.index_mode == 'contentless_delete':
+                cnt = self._delete_row(con, rowid, columns)
+                assert cnt <= 1, f'number of deleted rows is {cnt} expected 1'
+                return
             data = self.prepare_data(rowid, self._get_terms_for(rowid, columns))
             sql_del = self.sql_builder.build(data, delete=True)
             cursor = con.execute(sql_del, data)
             assert 1 == cursor.rowcount, f'number of deleted rows is {cursor.rowcount} expected 1'
             cursor.close()
+            self._write_tokens(con, [data], delete=True)
 
     def delete_all(self):
         """
         data - must be same data for rowid that were inserted before. If data diffs then index will broken.
         """
-        with self._connection as idx_con:
+        with self._write_transaction() as idx_con:
             cursor = idx_con.execute(self.sql_builder.build({}, True))
+            if self.token_table:
+                cursor.execute(f'DELETE FROM {self.token_table_name}')
             cursor.close()
 
     def prepare_data(self, rowid, data: Mapping) -> dict:
@@ -280,11 +987,16 @@ class SQLiteFTS5:
             if data contains rowid key then rowid parameter value will be redefined by data's rowid value
         """
         self._check_columns(data)
-        with self._connection as idx_con:
+        with self._write_transaction() as idx_con:
+            if self.index_mode == 'contentless_delete':
+                cnt = self._delete_row(idx_con, rowid, [c for c in data if c != self.pk_name])
+                assert cnt <= 1, f'cursor.rowcount is {cnt} expected 1'
+                return
             _data = self.prepare_data(rowid, data)
             cursor = idx_con.execute(self.sql_builder.build(_data, delete=True), _data)
             assert cursor.rowcount == 1, f'cursor.rowcount is {cursor.rowcount} expected 1'
             cursor.close()
+            self._write_tokens(idx_con, [_data], delete=True)
 
     def insert(self, rowid, data: dict):
         """
@@ -297,7 +1009,7 @@ class SQLiteFTS5:
             if data contains rowid key then rowid parameter value will be redefined by data's rowid value
         """
         self._check_columns(data)
-        with self._connection as con:
+        with self._write_transaction() as con:
             _data = self.prepare_data(rowid, data)
 
             cursor = con.cursor()
@@ -306,6 +1018,7 @@ class SQLiteFTS5:
                 assert cursor.rowcount == 1, f'cursor.rowcount is {cursor.rowcount} expected 1'
             finally:
                 cursor.close()
+            self._write_tokens(con, [_data])
 
     def update(self, rowid, data: dict):
         """
@@ -316,13 +1029,305 @@ class SQLiteFTS5:
         :return:
         """
         self._check_columns(data)
-        with self._connection as con:
+        with self._write_transaction() as con:
+            if self.index_mode == 'contentless_delete':
+                cnt = self._execute_many(con, [self._merge_row(rowid, data)], replace=True)
+                assert cnt == 1, f'replace step cursor.rowcount is {cnt} expected 1'
+                return
             old_data = self._get_terms_for(rowid, data)
             if old_data:
                 _data = self.prepare_data(rowid, old_data)
                 cursor = con.execute(self.sql_builder.build(_data, delete=True), _data)
                 assert cursor.rowcount == 1, f'delete step cursor.rowcount is {cursor.rowcount} expected 1'
+                self._write_tokens(con, [_data], delete=True)
             _data = self.prepare_data(rowid, data)
             cursor = con.execute(self.sql_builder.build(_data), _data)
             assert cursor.rowcount == 1, f'insert step cursor.rowcount is {cursor.rowcount} expected 1'
             cursor.close()
+            self._write_tokens(con, [_data])
+
+    def _get_sql(self, columns: Iterable, delete=False, replace=False) -> str:
+        """
+            Returns cached statement for certain column signature (and order)
+        """
+        key = (tuple(columns), delete, replace)
+        sql = self._sql_cache.get(key)
+        if sql is None:
+            sql = self._sql_cache[key] = self.sql_builder.build(key[0], delete=delete, replace=replace)
+        return sql
+
+    @staticmethod
+    def _chunks(items: Iterable, size: int) -> Generator[list, None, None]:
+        if size < 1:
+            raise ValueError('size of chunk must be positive')
+        it = iter(items)
+        while chunk := list(islice(it, size)):
+            yield chunk
+
+    def _execute_many(self, con: sqlite.Connection, rows: list[dict], delete=False, replace=False) -> int:
+        """
+            Executes rows via executemany, one statement for each consecutive run of the same column signature.
+            replace - rows are full rows for INSERT OR REPLACE (contentless_delete mode).
+            Returns the summary rowcount.
+        """
+        cnt = 0
+        for cols, group in groupby(rows, key=tuple):
+            cursor = con.executemany(self._get_sql(cols, delete, replace), group)
+            try:
+                cnt += cursor.rowcount
+            finally:
+                cursor.close()
+        if replace and self.token_table and rows:
+            con.executemany(
+                f'DELETE FROM {self.token_table_name} WHERE doc = ?', [(r[self.pk_name], ) for r in rows]
+            ).close()
+        self._write_tokens(con, rows, delete)
+        return cnt
+
+    def _delete_rows(self, con: sqlite.Connection, items: Iterable[tuple]) -> int:
+        """
+            Deletes (rowid, columns) items by primary key (contentless_delete mode), returns number of deleted rows
+        """
+        return sum(self._delete_row(con, rowid, columns) for rowid, columns in items)
+
+    def _prepare_many(self, chunk: list) -> list[dict]:
+        rows = []
+        for rowid, data in chunk:
+            self._check_columns(data)
+            rows.append(self.prepare_data(rowid, dict(data)))
+        return rows
+
+    def insert_many(self, items: Iterable[tuple], commit_every: int = None) -> int:
+        """
+            Bulk version of insert.
+            items - iterable of (rowid, data) pairs. Each pair has the same restrictions as for insert.
+            Each commit_every (default self.commit_every) rows are committed in one transaction.
+
+        :return: number of inserted rows
+        """
+        total = 0
+        for chunk in self._chunks(items, commit_every or self.commit_every):
+            rows = self._prepare_many(chunk)
+            with self._write_transaction() as con:
+                cnt = self._execute_many(con, rows)
+                assert cnt == len(rows), f'number of inserted rows is {cnt} expected {len(rows)}'
+            total += cnt
+        return total
+
+    def delete_many(self, items: Iterable[tuple], commit_every: int = None) -> int:
+        """
+            Bulk version of delete.
+            items - iterable of (rowid, data) pairs.
+            data - must be same data for rowid that were inserted before. If data diffs then index will broken.
+
+        :return: number of deleted rows
+        """
+        total = 0
+        for chunk in self._chunks(items, commit_every or self.commit_every):
+            rows = self._prepare_many(chunk)
+            with self._write_transaction() as con:
+                if self.index_mode == 'contentless_delete':
+                    cnt = self._delete_rows(con, ((r[self.pk_name], [c for c in r if c != self.pk_name]) for r in rows))
+                    assert cnt <= len(rows), f'number of deleted rows is {cnt} expected {len(rows)}'
+                    total += cnt
+                    continue
+                cnt = self._execute_many(con, rows, delete=True)
+                assert cnt == len(rows), f'number of deleted rows is {cnt} expected {len(rows)}'
+            total += cnt
+        return total
+
+    def delete_for_many(self, items: Iterable[tuple], commit_every: int = None) -> int:
+        """
+            Bulk version of delete_for.
+            items - iterable of (rowid, columns) pairs. columns has same meaning as for delete_for.
+
+        :return: number of deleted rows
+        """
+        total = 0
+        for chunk in self._chunks(items, commit_every or self.commit_every):
+            with self._write_transaction() as con:
+                if self.index_mode == 'contentless_delete':
+                    cnt = self._delete_rows(con, chunk)
+                    assert cnt <= len(chunk), f'number of deleted rows is {cnt} expected {len(chunk)}'
+                    total += cnt
+                    continue
+                cnt, rows, seen = 0, [], set()
+                for rowid, columns in chunk:
+                    if rowid in seen:
+                        cnt += self._execute_many(con, rows, delete=True)
+                        rows, seen = [], set()
+                    seen.add(rowid)
+                    rows.append(self.prepare_data(rowid, self._get_terms_for(rowid, columns)))
+                cnt += self._execute_many(con, rows, delete=True)
+                assert cnt == len(chunk), f'number of deleted rows is {cnt} expected {len(chunk)}'
+            total += cnt
+        return total
+
+    def _get_vocab_terms(self, rowids: list) -> dict[int, dict]:
+        """
+            Returns {rowid: {col: terms}} for all instances of rowids in fts5vocab (one scan),
+            unlike _get_terms_for it does not use token table
+        """
+        sql = f'SELECT term, doc, col FROM {self.index_name}_v '\
+              f'WHERE doc IN (SELECT value FROM json_each(?)) ORDER BY doc, col, offset'
+        data = {}
+        cursor = self._connection.execute(sql, (json.dumps([int(rowid) for rowid in rowids]), ))
+        try:
+            for term, doc, col in cursor.fetchall():
+                # detail=none index has no columns, delete needs the terms only
+                data.setdefault(doc, {}).setdefault(col or self.index_columns[0], []).append(term)
+        finally:
+            cursor.close()
+        return {doc: {c: ' '.join(terms) for c, terms in cols.items()} for doc, cols in data.items()}
+
+    def purge_many(self, rowids: Iterable, commit_every: int = None) -> int:
+        """
+            Removes all index entries of rowids whatever data were written for them (for example broken rows).
+            Terms of all rowids are taken from fts5vocab by one scan (token table can keep only the last data),
+            it is repeated for the rest of rowids only if other connection changed the database between chunks
+            (PRAGMA data_version). contentless_delete index deletes by rowid.
+
+        :return: number of rowids that were in index
+        """
+        rowids = [*rowids]
+        total, terms, version, pos = 0, None, None, 0
+        for chunk in self._chunks(rowids, commit_every or self.commit_every):
+            with self._write_transaction() as con:
+                if self.index_mode == 'contentless_delete':
+                    cnt = self._delete_rows(con, ((rowid, None) for rowid in chunk))
+                else:
+                    cursor = con.execute('PRAGMA data_version')
+                    try:
+                        cur_version = cursor.fetchone()[0]
+                    finally:
+                        cursor.close()
+                    if terms is None or cur_version != version:
+                        terms, version = self._get_vocab_terms(rowids[pos:]), cur_version
+                    rows = [self.prepare_data(rowid, terms[rowid]) for rowid in chunk if rowid in terms]
+                    cnt = self._execute_many(con, rows, delete=True)
+                    if self.token_table:
+                        con.executemany(
+                            f'DELETE FROM {self.token_table_name} WHERE doc = ?', [(rowid, ) for rowid in chunk]
+                        ).close()
+            total += cnt
+            pos += len(chunk)
+        return total
+
+    def update_many(self, items: Iterable[tuple], commit_every: int = None) -> int:
+        """
+            Bulk version of update.
+            items - iterable of (rowid, data) pairs. It updates full or partially for certain column as update does.
+
+            Old terms are read for each rowid inside the transaction. If rowid repeats inside of chunk then
+            pending statements are executed before, so the next update will see the result of previous one.
+
+        :return: number of updated rows
+        """
+        total = 0
+        for chunk in self._chunks(items, commit_every or self.commit_every):
+            rows = self._prepare_many(chunk)
+            with self._write_transaction() as con:
+                if self.index_mode == 'contentless_delete':
+                    total += self._replace_many(con, rows)
+                    continue
+                exp_del, exp_ins, del_cnt, ins_cnt = 0, 0, 0, 0
+                deletes, inserts, seen = [], [], set()
+                for row in rows:
+                    rowid = row[self.pk_name]
+                    if rowid in seen:
+                        del_cnt += self._execute_many(con, deletes, delete=True)
+                        ins_cnt += self._execute_many(con, inserts)
+                        deletes, inserts, seen = [], [], set()
+                    seen.add(rowid)
+
+                    cols = [c for c in row if c != self.pk_name]
+                    old_data = self._get_terms_for(rowid, cols)
+                    if old_data:
+                        deletes.append(self.prepare_data(rowid, old_data))
+                        exp_del += 1
+                    inserts.append(row)
+                    exp_ins += 1
+
+                del_cnt += self._execute_many(con, deletes, delete=True)
+                ins_cnt += self._execute_many(con, inserts)
+                assert del_cnt == exp_del, f'delete step rowcount is {del_cnt} expected {exp_del}'
+                assert ins_cnt == exp_ins, f'insert step rowcount is {ins_cnt} expected {exp_ins}'
+            total += ins_cnt
+        return total
+
+    def _replace_many(self, con: sqlite.Connection, rows: list[dict]) -> int:
+        """
+            update_many step for contentless_delete mode - partial rows are completed by data from index
+            and all rows are written by INSERT OR REPLACE
+        """
+        cnt, replaces, seen = 0, [], set()
+        for row in rows:
+            rowid = row[self.pk_name]
+            if rowid in seen:
+                cnt += self._execute_many(con, replaces, replace=True)
+                replaces, seen = [], set()
+            seen.add(rowid)
+            replaces.append(self._merge_row(rowid, row))
+        cnt += self._execute_many(con, replaces, replace=True)
+        assert cnt == len(rows), f'replace step rowcount is {cnt} expected {len(rows)}'
+        return cnt
+
+    def replace_many(self, items: Iterable[tuple], commit_every: int = None) -> int:
+        """
+            Replaces full index data for rowid.
+            items - iterable of (rowid, data) pairs. Existing index data (all columns) for rowid are deleted
+            and data are inserted if data is not None. Thus, (rowid, None) only deletes rowid from index.
+
+            Result does not depend on current state of index for rowid, so it is safe to replay.
+
+        :return: number of processed items
+        """
+        total = 0
+        for chunk in self._chunks(items, commit_every or self.commit_every):
+            with self._write_transaction() as con:
+                if self.index_mode == 'contentless_delete':
+                    self._replace_chunk(con, chunk)
+                    total += len(chunk)
+                    continue
+                exp_del, exp_ins, del_cnt, ins_cnt = 0, 0, 0, 0
+                deletes, inserts, seen = [], [], set()
+                for rowid, data in chunk:
+                    if rowid in seen:
+                        del_cnt += self._execute_many(con, deletes, delete=True)
+                        ins_cnt += self._execute_many(con, inserts)
+                        deletes, inserts, seen = [], [], set()
+                    seen.add(rowid)
+
+                    old_data = self._get_terms_for(rowid)
+                    if old_data:
+                        deletes.append(self.prepare_data(rowid, old_data))
+                        exp_del += 1
+                    if data is not None:
+                        self._check_columns(data)
+                        inserts.append(self.prepare_data(rowid, dict(data)))
+                        exp_ins += 1
+
+                del_cnt += self._execute_many(con, deletes, delete=True)
+                ins_cnt += self._execute_many(con, inserts)
+                assert del_cnt == exp_del, f'delete step rowcount is {del_cnt} expected {exp_del}'
+                assert ins_cnt == exp_ins, f'insert step rowcount is {ins_cnt} expected {exp_ins}'
+            total += len(chunk)
+        return total
+
+    def _replace_chunk(self, con: sqlite.Connection, chunk: list[tuple]):
+        """
+            replace_many step for contentless_delete mode - old data are not read at all
+        """
+        replaces, seen = [], set()
+        for rowid, data in chunk:
+            if rowid in seen:
+                self._execute_many(con, replaces, replace=True)
+                replaces, seen = [], set()
+            if data is None:
+                self._delete_row(con, rowid)
+                continue
+            seen.add(rowid)
+            self._check_columns(data)
+            replaces.append(self.prepare_data(rowid, dict(data)))
+        cnt = self._execute_many(con, replaces, replace=True)
+        assert cnt == len(replaces), f'replace step rowcount is {cnt} expected {len(replaces)}'
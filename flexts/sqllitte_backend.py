@@ -7,7 +7,7 @@
 
 
 import sqlite3 as sqlite
-from typing import Callable, Union
+from typing import Callable, Union, Iterable
 
 from flexts.sqlite_fts5 import SQLiteFTS5
 
@@ -35,6 +35,8 @@ class TriggerBase:
     trigger_name_suffix = None
     pk_name = 'rowid'
     fts_table_name_suffix = '_fts5'
+    # WriteBehindIndexer like object. If it is defined then trigger_func only puts the data into indexer's queue
+    indexer = None
 
     def __init__(self, con: sqlite.Connection, table_name: str, column_map: dict, fts_con: sqlite.Connection) -> None:
         self.column_map = column_map
@@ -100,6 +102,9 @@ class TriggerBase:
         cur.close()
         return r is not None
 
+    def _is_fts_table_exist(self):
+        return self._is_integrated(self.fts_con, name=self.get_fts_table_name(), type='table')
+
     def is_integrated(self, all=False):
         """
         Check trigger and function existence if 'all' is False. Otherwise all parts will be tested
@@ -108,7 +113,7 @@ class TriggerBase:
         if all:
             if not self._is_integrated(self.con, name=self.table_name, type='table'):
                 raise TriggerIntegrityError('content_table', self.table_name)
-            if not self._is_integrated(self.fts_con, name=self.get_fts_table_name(), type='table'):
+            if not self._is_fts_table_exist():
                 raise TriggerIntegrityError('fts_table', self.get_fts_table_name())
 
         if not self._is_integrated(self.con, name=self.get_trigger_name(), type='trigger', tbl_name=self.table_name):
@@ -172,16 +177,47 @@ class TriggerBase:
         """
         return fts_data
 
+    def get_fts_item(self, content_row: dict) -> tuple[int, dict]:
+        """
+            Converts the content row {content_column: value} into (fts_rowid, fts_data) pair
+        """
+        fts_rowid = self.get_fts_rowid(content_row)
+        # data must have keys that mapped into fts columns
+        content_row.pop(self.pk_name, None)
+        data = {self.column_map[c]: v for c, v in content_row.items()}
+        return fts_rowid, self.get_fts_data(fts_rowid, data, content_row)
+
+    def fetch_content_rows(self, rowids: Iterable, con: sqlite.Connection = None, schema: str = None) -> dict:
+        """
+            Returns {pk_value: {content_column: value}} for existing rows of the content table.
+            con - connection to read from (self.con by default), schema - schema name (attached database)
+        """
+        rowids = [*rowids]
+        if not rowids:
+            return {}
+
+        con = con or self.con
+        tbl_name = f'{schema}.{self.table_name}' if schema else self.table_name
+        cols = self.get_trigger_columns()
+        sql = f'SELECT {", ".join(cols)} FROM {tbl_name} WHERE {self.pk_name} IN ({", ".join("?" * len(rowids))})'
+        cursor = con.execute(sql, rowids)
+        try:
+            res = {r[0]: dict(zip(cols, r)) for r in cursor.fetchall()}
+        finally:
+            cursor.close()
+        return res
+
     def trigger_func(self, **kwargs):
         """
             Concrete implementation for INSERT, DELETE and UPDATE triggers
             More, see _trigger_func description
         """
-        fts_rowid = self.get_fts_rowid(kwargs)
-        # data must have keys that mapped into fts columns
-        kwargs.pop(self.pk_name, None)
-        data = {self.column_map[c]: v for c, v in kwargs.items()}
-        self.get_driver_handler()(fts_rowid, self.get_fts_data(fts_rowid, data, kwargs))
+        fts_rowid, fts_data = self.get_fts_item(kwargs)
+        handler = self.get_driver_handler()
+        if self.indexer is None:
+            handler(fts_rowid, fts_data)
+        else:
+            self.indexer.put(handler, fts_rowid, fts_data)
 
 
 class Trigger(TriggerBase):
@@ -197,6 +233,10 @@ class Trigger(TriggerBase):
             driver = self.fts_driver_class(fts_con, self.get_fts_table_name(), self.column_map.values())
         self.fts_driver = driver
 
+    def _is_fts_table_exist(self):
+        # driver can keep index in several databases (see ShardedSQLiteFTS5)
+        return self.fts_driver.check_index()
+
 
 class InsertTrigger(Trigger):
     trigger_on = 'INSERT'
@@ -214,3 +254,207 @@ class DeleteTrigger(Trigger):
 
     def get_driver_handler(self) -> Callable[[Union[int, str], dict], None]:
         return self.fts_driver.delete_for
+
+
+class ChangelogTrigger(Trigger):
+    """
+        Trigger's flavour that does not call python (sql function). It only logs (op, row_id, ts)
+        into the changelog table inside the content database. The index is updated by ChangelogConsumer
+        in any process and at its own pace.
+
+        Thus, content can be changed by any connection (Django, sqlite3 CLI, migrations)
+        without registered sql function.
+    """
+
+    changelog_table_name_suffix = '_fts_changelog'
+
+    def get_changelog_table_name(self) -> str:
+        return self.table_name + self.changelog_table_name_suffix
+
+    def get_driver_handler(self) -> Callable[[Union[int, str], dict], None]:
+        raise NotImplementedError(f'{self.__class__.__name__} does not replicate the data into index directly')
+
+    def _create_changelog_table(self):
+        sql = f'CREATE TABLE IF NOT EXISTS {self.get_changelog_table_name()} ('\
+              f'id INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, row_id INTEGER NOT NULL, '\
+              f'ts REAL NOT NULL DEFAULT (julianday(\'now\')))'
+        with self.con:
+            self.con.execute(sql).close()
+
+    def _create_trigger(self):
+        """
+            creates changelog table (if it does not exist) and trigger
+        """
+        self._create_changelog_table()
+
+        op = self.trigger_on.lower()
+        ref_name = 'old' if op == 'delete' else 'new'
+        log_sql = f'INSERT INTO {self.get_changelog_table_name()} (op, row_id)'
+        stmts = [f'{log_sql} VALUES (\'{op}\', {ref_name}.{self.pk_name});']
+        if op == 'update':
+            # primary key was changed
+            stmts.append(f'{log_sql} SELECT \'delete\', old.{self.pk_name} '
+                         f'WHERE old.{self.pk_name} IS NOT new.{self.pk_name};')
+
+        sql = f'CREATE TRIGGER {self.get_trigger_name()} AFTER {self.trigger_on.upper()} ON {self.table_name} BEGIN'\
+              f' {" ".join(stmts)} END;'
+        with self.con:
+            self.con.execute(sql).close()
+
+    def register_sql_func(self):
+        """
+            Changelog trigger has no sql function
+        """
+        pass
+
+    def _is_sql_function_exist(self):
+        return True
+
+    def is_integrated(self, all=False):
+        super().is_integrated(all)
+        if not self._is_integrated(self.con, name=self.get_changelog_table_name(), type='table'):
+            raise TriggerIntegrityError(
+                'trigger', self.get_trigger_name(), f'changelog table {self.get_changelog_table_name()} is missed'
+            )
+
+
+class ChangelogInsertTrigger(ChangelogTrigger):
+    trigger_on = 'INSERT'
+    trigger_name_suffix = '_ai_log'
+
+
+class ChangelogUpdateTrigger(ChangelogTrigger):
+    trigger_on = 'UPDATE'
+    trigger_name_suffix = '_au_log'
+
+
+class ChangelogDeleteTrigger(ChangelogTrigger):
+    trigger_on = 'DELETE'
+    trigger_name_suffix = '_ad_log'
+
+
+class ChangelogConsumer:
+    """
+        Incremental consumer of the changelog table.
+
+        It reads the changelog after the high-water mark (last consumed changelog id), fetches current
+        content for all touched rows and replaces their index data in batches (SQLiteFTS5.replace_many).
+        Replacement does not depend on the operation and order, so replaying of the changelog is safe.
+        High-water mark is stored inside the index database in state_table_name table.
+    """
+
+    state_table_name = 'fts_changelog_state'
+
+    def __init__(self, trigger: ChangelogTrigger, batch_size: int = 500, con: sqlite.Connection = None,
+                 state_name: str = None) -> None:
+        """
+            trigger - any trigger of the content table. It defines content table, columns mapping and fts driver.
+            con - content connection, trigger.con by default
+            state_name - name of the high-water mark in state table, changelog table name by default
+        """
+        self.trigger = trigger
+        self.batch_size = batch_size
+        self.con = con or trigger.con
+        self.fts_driver: SQLiteFTS5 = trigger.fts_driver
+        self.changelog_table_name = trigger.get_changelog_table_name()
+        self.state_name = state_name or self.changelog_table_name
+
+    @property
+    def fts_con(self) -> sqlite.Connection:
+        return self.fts_driver._connection
+
+    def _create_state_table(self):
+        sql = f'CREATE TABLE IF NOT EXISTS {self.state_table_name} (name TEXT PRIMARY KEY, last_id INTEGER NOT NULL)'
+        with self.fts_con:
+            self.fts_con.execute(sql).close()
+
+    def get_high_water(self) -> int:
+        self._create_state_table()
+        cursor = self.fts_con.execute(
+            f'SELECT last_id FROM {self.state_table_name} WHERE name = ?', (self.state_name,)
+        )
+        try:
+            r = cursor.fetchone()
+        finally:
+            cursor.close()
+        return r[0] if r else 0
+
+    def set_high_water(self, last_id: int):
+        self._create_state_table()
+        sql = f'INSERT INTO {self.state_table_name} (name, last_id) VALUES (?, ?) '\
+              f'ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id'
+        with self.fts_con:
+            self.fts_con.execute(sql, (self.state_name, last_id)).close()
+
+    def get_latest_id(self) -> int:
+        cursor = self.con.execute(f'SELECT max(id) FROM {self.changelog_table_name}')
+        try:
+            r = cursor.fetchone()
+        finally:
+            cursor.close()
+        return r[0] or 0
+
+    def lag(self) -> int:
+        """
+            number of unconsumed changelog records
+        """
+        cursor = self.con.execute(
+            f'SELECT count(*) FROM {self.changelog_table_name} WHERE id > ?', (self.get_high_water(),)
+        )
+        try:
+            r = cursor.fetchone()
+        finally:
+            cursor.close()
+        return r[0]
+
+    def consume_batch(self) -> int:
+        """
+            Applies one batch of the changelog. Returns number of consumed changelog records.
+        """
+        hw = self.get_high_water()
+        cursor = self.con.execute(
+            f'SELECT id, op, row_id FROM {self.changelog_table_name} WHERE id > ? ORDER BY id LIMIT ?',
+            (hw, self.batch_size)
+        )
+        try:
+            log = cursor.fetchall()
+        finally:
+            cursor.close()
+
+        if not log:
+            return 0
+
+        rowids = [*dict.fromkeys(r[2] for r in log)]
+        content = self.trigger.fetch_content_rows(rowids, self.con)
+        items = []
+        for rowid in rowids:
+            row = content.get(rowid)
+            items.append(self.trigger.get_fts_item(row) if row is not None else (rowid, None))
+
+        self.fts_driver.replace_many(items, commit_every=len(items))
+        self.set_high_water(log[-1][0])
+        return len(log)
+
+    def consume(self, max_batches: int = None) -> int:
+        """
+            Applies the changelog until it is exhausted or max_batches were applied.
+            Returns number of consumed changelog records.
+        """
+        total, i = 0, 0
+        while max_batches is None or i < max_batches:
+            cnt = self.consume_batch()
+            if not cnt:
+                break
+            total += cnt
+            i += 1
+        return total
+
+    def purge(self) -> int:
+        """
+            Removes consumed records from the changelog. Returns number of removed records.
+        """
+        with self.con:
+            cursor = self.con.execute(f'DELETE FROM {self.changelog_table_name} WHERE id <= ?', (self.get_high_water(),))
+            cnt = cursor.rowcount
+            cursor.close()
+        return cnt
@@ -0,0 +1,190 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts
+# File: stem_store.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 2:40 PM
+
+import queue
+import threading
+from typing import Iterable, Union, Generator
+
+import sqlite3 as sqlite
+
+
+class SQLiteStemStore:
+    """
+        Persistent token -> stems dictionary in SQLite database file (sidecar file or index database).
+        It is shared by processes (django workers, rebuild), so new process does not need to re-derive
+        the stems that were derived by others.
+
+        Lookups are batched - one SELECT ... WHERE token IN (...) per document (see HunspellStemmer.prefetch).
+        New stems are written back asynchronously by background thread via own connection,
+        if the write-back queue is full then item is dropped (it is only cache).
+
+        Stems are stored as one string joined by stems_sep, empty string means the token is unknown for stemmer.
+    """
+
+    table_name = 'stem_dict'
+    stems_sep = '\t'
+    max_variables = 500  # number of tokens in one IN (...)
+
+    def __init__(self, path: str, table_name: str = None, maxsize: int = 100000, batch_size: int = 1000,
+                 timeout: float = 5.0, poll_interval: float = .1) -> None:
+        self.path = str(path)
+        self.table_name = table_name or self.table_name
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+        self._queue = queue.Queue(maxsize)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+        self._stats = {'lookups': 0, 'looked_up': 0, 'found': 0, 'queued': 0, 'written': 0, 'dropped': 0}
+
+        self.create_table()
+
+    def _connect(self) -> sqlite.Connection:
+        return sqlite.connect(self.path, timeout=self.timeout, check_same_thread=False)
+
+    def create_table(self):
+        con = self._connect()
+        try:
+            with con:
+                con.execute(
+                    f'CREATE TABLE IF NOT EXISTS {self.table_name} (token TEXT PRIMARY KEY, stems TEXT NOT NULL) '
+                    f'WITHOUT ROWID'
+                ).close()
+        finally:
+            con.close()
+
+    @property
+    def connection(self) -> sqlite.Connection:
+        """
+            Connection for lookups, one per thread
+        """
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = self._connect()
+            with self._lock:
+                self._connections.append(con)
+        return con
+
+    def _inc(self, **counters):
+        with self._lock:
+            for k, v in counters.items():
+                self._stats[k] += v
+
+    def stats(self) -> dict:
+        with self._lock:
+            res = dict(self._stats)
+        res['depth'] = self._queue.qsize()
+        return res
+
+    def lookup(self, tokens: Iterable[str]) -> dict[str, tuple]:
+        """
+            Returns {token: stems} for tokens that are in the store
+        """
+        tokens = list(set(tokens))
+        res = {}
+        for i in range(0, len(tokens), self.max_variables):
+            chunk = tokens[i:i + self.max_variables]
+            cursor = self.connection.execute(
+                f'SELECT token, stems FROM {self.table_name} WHERE token IN ({", ".join("?" * len(chunk))})', chunk
+            )
+            try:
+                for token, stems in cursor.fetchall():
+                    res[token] = tuple(stems.split(self.stems_sep)) if stems else ()
+            finally:
+                cursor.close()
+            self._inc(lookups=1)
+        self._inc(looked_up=len(tokens), found=len(res))
+        return res
+
+    def items(self) -> Generator[tuple[str, tuple], None, None]:
+        """
+            Yields all (token, stems) pairs of the store
+        """
+        cursor = self.connection.execute(f'SELECT token, stems FROM {self.table_name}')
+        try:
+            for token, stems in cursor:
+                yield token, tuple(stems.split(self.stems_sep)) if stems else ()
+        finally:
+            cursor.close()
+
+    def put(self, token: str, stems: tuple):
+        """
+            Queues token -> stems for writing back
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        try:
+            self._queue.put_nowait((token, self.stems_sep.join(stems)))
+        except queue.Full:
+            self._inc(dropped=1)
+        else:
+            self._inc(queued=1)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.__class__.__name__, daemon=True)
+            self._thread.start()
+
+    def _get_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=self.poll_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        con = self._connect()
+        try:
+            while not self._stop.is_set():
+                batch = self._get_batch()
+                if not batch:
+                    continue
+                try:
+                    with con:
+                        con.executemany(
+                            f'INSERT OR IGNORE INTO {self.table_name} (token, stems) VALUES (?, ?)', batch
+                        ).close()
+                except sqlite.Error:
+                    self._inc(dropped=len(batch))
+                else:
+                    self._inc(written=len(batch))
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            con.close()
+
+    def flush(self):
+        """
+            Waits until all queued stems are written
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        self.flush()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for con in connections:
+            con.close()
+        self._local = threading.local()
@@ -6,13 +6,127 @@
 # Created by ox23 at 2022-11-27 (y-m-d) 6:34 PM
 
 import re
-from typing import Iterable, Iterator, Callable, Optional
-
-import hunspell
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Iterable, Iterator, Callable, Optional, Any, Protocol
 
 from flexts.parser import HTMLParser
 
 
+# name -> callable without parameters that creates the backend (heavy object like loaded dictionary).
+# Factories must import their libraries inside, so importing of this module stays cheap.
+backend_factories: dict[str, Callable[[], Any]] = {}
+_backends: dict[str, Any] = {}
+_backends_lock = threading.Lock()
+
+
+def register_backend(name: str, factory: Callable[[], Any]):
+    """
+        Registers (or replaces) the factory of stemmer backend. Already created backend is discarded.
+    """
+    with _backends_lock:
+        backend_factories[name] = factory
+        _backends.pop(name, None)
+
+
+def get_backend(name: str) -> Any:
+    """
+        Returns the backend, it is created on first use (once per process)
+    """
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                try:
+                    factory = backend_factories[name]
+                except KeyError:
+                    raise ValueError(f'stemmer backend "{name}" is not registered')
+                backend = _backends[name] = factory()
+    return backend
+
+
+def is_loaded(name: str) -> bool:
+    return name in _backends
+
+
+def warmup(names: Iterable[str] = None) -> list[str]:
+    """
+        Creates backends (all registered if names is None) now. Call it in master process before fork
+        (for example, gunicorn --preload), so workers share the loaded dictionaries via copy-on-write.
+    """
+    names = list(backend_factories) if names is None else list(names)
+    for name in names:
+        get_backend(name)
+    return names
+
+
+class LazyBackend:
+    """
+        Class attribute descriptor that resolves backend by name on first access
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __get__(self, instance, owner):
+        return get_backend(self.name)
+
+
+def hunspell_uk_ua():
+    import hunspell
+    return hunspell.HunSpell('/usr/share/hunspell/uk_UA.dic', '/usr/share/hunspell/uk_UA.aff')
+
+
+def snowball(language: str):
+    import snowballstemmer
+    return snowballstemmer.stemmer(language)
+
+
+def pystemmer(language: str):
+    import Stemmer
+    return Stemmer.Stemmer(language)
+
+
+register_backend('hunspell_uk_UA', hunspell_uk_ua)
+for _lang in ('english', 'russian'):
+    register_backend(f'snowball_{_lang}', partial(snowball, _lang))
+    register_backend(f'pystemmer_{_lang}', partial(pystemmer, _lang))
+
+
+class BatchStemmer(Protocol):
+    """
+        Stems the list of tokens (for example all tokens of document) at once.
+        Returns the list of the same length, one stem (lower case) for each token.
+    """
+
+    def stem_words(self, tokens: list[str]) -> list[str]:
+        ...
+
+
+class PyStemmerStemmer:
+    """
+        BatchStemmer via PyStemmer (C implementation of Snowball), whole batch is stemmed by one stemWords call
+    """
+
+    def __init__(self, language: str = 'english') -> None:
+        self.language = language
+        self.backend_name = f'pystemmer_{language}'
+        if self.backend_name not in backend_factories:
+            register_backend(self.backend_name, partial(pystemmer, language))
+
+    @property
+    def stemmer(self):
+        return get_backend(self.backend_name)
+
+    def stem_words(self, tokens: list[str]) -> list[str]:
+        return self.stemmer.stemWords([t.lower() for t in tokens])
+
+    def stem(self, token: str) -> str:
+        return self.stem_words([token])[0]
+
+
 class SimpleTokenizer(Iterable):
 
     _p = re.compile(r'\w+', re.UNICODE)
@@ -51,22 +165,234 @@ class SimpleTokenizer(Iterable):
                 yield t
 
 
+class StemmingTokenizer(SimpleTokenizer):
+    """
+        SimpleTokenizer that stems all (filtered) tokens of the document by one stemmer.stem_words call
+    """
+
+    def __init__(self, document: str = None, token_filter: Callable = None, stemmer: BatchStemmer = None) -> None:
+        super().__init__(document, token_filter)
+        self.stemmer = stemmer
+
+    def __iter__(self) -> Iterator[str]:
+        tokens = [*super().__iter__()]
+        if self.stemmer is None or not tokens:
+            yield from tokens
+        else:
+            yield from self.stemmer.stem_words(tokens)
+
+
+class StemCache:
+    """
+        Bounded LRU memo: lower cased token -> tuple of decoded stems (empty tuple if token is unknown).
+        It is thread safe because tokenizer can be called from different threads (write-behind indexer).
+    """
+
+    def __init__(self, capacity: int = 50000) -> None:
+        if capacity < 1:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, token: str):
+        # it does not touch the counters and the order
+        return token in self._data
+
+    def get(self, token: str) -> Optional[tuple]:
+        with self._lock:
+            stems = self._data.get(token)
+            if stems is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(token)
+            return stems
+
+    def put(self, token: str, stems: tuple):
+        with self._lock:
+            self._data[token] = stems
+            self._data.move_to_end(token)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._data), 'capacity': self.capacity,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions
+            }
+
+
 class HunspellStemmer(SimpleTokenizer):
 
-    stemmer = hunspell.HunSpell('/usr/share/hunspell/uk_UA.dic', '/usr/share/hunspell/uk_UA.aff')
+    # Hunspell dictionary is loaded on first stemming, not on import (see warmup)
+    stemmer = LazyBackend('hunspell_uk_UA')
     min_token_len = 2
+    # shared by all instances, so indexing (fts5 tokenizer) and query paths warm the same cache
+    cache = StemCache()
+    # persistent dictionary shared by processes (flexts.stem_store.SQLiteStemStore), None - is not used
+    store = None
+    # compiled memory-mapped lexicon (flexts.lexicon.Lexicon), Hunspell is used for words that are not in it
+    lexicon = None
+
+    def prefetch(self, tokens: Iterable[str]):
+        """
+            Loads stems of lower cased tokens that are not in cache from lexicon and then from store
+            by one batch lookup
+        """
+        if self.store is None and self.lexicon is None:
+            return
+        missed = {t for t in tokens if len(t) > self.min_token_len and t not in self.cache}
+        if self.lexicon is not None:
+            for token in [*missed]:
+                stems = self.lexicon.lookup(token)
+                if stems is not None:
+                    self.cache.put(token, stems)
+                    missed.discard(token)
+        if missed and self.store is not None:
+            for token, stems in self.store.lookup(missed).items():
+                self.cache.put(token, stems)
+
+    def get_stems(self, token: str) -> tuple:
+        """
+            Returns decoded stems of lower cased token, empty tuple if token is unknown for the stemmer
+        """
+        stems = self.cache.get(token)
+        if stems is None and self.lexicon is not None:
+            stems = self.lexicon.lookup(token)
+            if stems is not None:
+                self.cache.put(token, stems)
+        if stems is None:
+            stems = tuple(s.decode('utf-8') for s in self.stemmer.stem(token))
+            self.cache.put(token, stems)
+            if self.store is not None:
+                self.store.put(token, stems)
+        return stems
+
+    def stem(self, token: str) -> str:
+        """
+            Returns the single stem of token (lower case) or token itself if it is short or unknown.
+            If token is one of its own stems then token is preferred, so stem(stem(token)) == stem(token)
+            for dictionary words. It matters for contentless index where the terms are re-tokenized on delete.
+        """
+        token = token.lower()
+        if len(token) <= self.min_token_len or token.isdigit():
+            return token
+
+        stems = self.get_stems(token)
+        if not stems or token in stems:
+            return token
+        return stems[0]
+
+    def stem_words(self, tokens: list[str]) -> list[str]:
+        """
+            BatchStemmer interface. Store lookup is done once for whole batch.
+        """
+        tokens = [t.lower() for t in tokens]
+        self.prefetch(tokens)
+        return [self.stem(t) for t in tokens]
 
     def stems(self, document):
         parsed = HTMLParser().parse(document)
         self.document = parsed
         self.token_filter = str.lower
-        for token in self:
+        tokens = [*self]
+        self.prefetch(tokens)
+        for token in tokens:
             if len(token) <= self.min_token_len:
                 continue
+            if token.isdigit():
+                # dictionary has no numbers
+                yield token
+                continue
 
-            stems = self.stemmer.stem(token)
+            stems = self.get_stems(token)
             if stems:
-                for stem in stems:
-                    yield stem.decode('utf-8')
+                yield from stems
             else:
                 yield token
+
+
+class ScriptRoutingStemmer:
+    """
+        BatchStemmer that routes tokens by script:
+            'digit' - only digits, they pass through
+            'latin' - ASCII tokens (letters, digits, _), English Snowball (PyStemmer) by default
+            'cyrillic' - tokens with cyrillic letters, Hunspell uk_UA by default
+            'other' - the rest (Latin with diacritics, Greek ...), they pass through as digits do,
+                only cyrillic tokens reach Hunspell
+
+        Each class of the batch is stemmed by one stem_words call.
+        Latin stems are reduced to fixed point (stem of stem is the same stem) because Snowball
+        is not idempotent, but contentless index re-tokenizes the stored terms on delete.
+    """
+
+    classes = ('digit', 'latin', 'cyrillic', 'other')
+    # classes that are not stemmed (only lower cased)
+    passthrough = ('digit', 'other')
+    _cyrillic_p = re.compile(r'[\u0400-\u04FF]')
+
+    def __init__(self, latin: BatchStemmer = None, cyrillic: BatchStemmer = None) -> None:
+        self.latin = latin if latin is not None else PyStemmerStemmer('english')
+        self.cyrillic = cyrillic if cyrillic is not None else HunspellStemmer()
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(self.classes, 0)
+
+    def classify(self, token: str) -> str:
+        if token.isdigit():
+            return 'digit'
+        if token.isascii():
+            return 'latin'
+        if self._cyrillic_p.search(token):
+            return 'cyrillic'
+        return 'other'
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def _stem_latin(self, tokens: list[str]) -> list[str]:
+        stems = self.latin.stem_words(tokens)
+        while True:
+            again = self.latin.stem_words(stems)
+            if again == stems:
+                return stems
+            stems = again
+
+    def stem_words(self, tokens: list[str]) -> list[str]:
+        res = [t.lower() for t in tokens]
+        groups = {}
+        for i, token in enumerate(res):
+            groups.setdefault(self.classify(token), []).append(i)
+
+        with self._lock:
+            for cls, idx in groups.items():
+                self.counters[cls] += len(idx)
+
+        for cls, idx in groups.items():
+            if cls in self.passthrough:
+                continue
+            words = [res[i] for i in idx]
+            if cls == 'latin':
+                stems = self._stem_latin(words)
+            else:
+                stems = self.cyrillic.stem_words(words)
+            for i, stem in zip(idx, stems):
+                res[i] = stem
+        return res
+
+    def stem(self, token: str) -> str:
+        return self.stem_words([token])[0]
@@ -0,0 +1,68 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts/tests
+# File: test_connection_factory.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 10:30 PM
+
+import os
+import tempfile
+import warnings
+from unittest import TestCase
+
+import sqlite3 as sqlite
+
+from flexts.connection_factory import SQLiteConnectionFactory, PragmaProfileError
+
+
+class TestSQLiteConnectionFactory(TestCase):
+
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self._tmp_dir.name, 'factory.sqlite3')
+        self.factory = SQLiteConnectionFactory()
+
+    def tearDown(self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_profiles(self):
+        factory = SQLiteConnectionFactory({'read': {'mmap_size': 0, 'query_only': None}, 'tiny': {'cache_size': 10}})
+        self.assertEqual(0, factory.get_profile('read')['mmap_size'])
+        self.assertNotIn('query_only', factory.get_profile('read'))
+        self.assertDictEqual({'cache_size': 10}, factory.get_profile('tiny'))
+        # defaults are not changed
+        self.assertEqual(1, self.factory.get_profile('read')['query_only'])
+        with self.assertRaises(ValueError):
+            self.factory.get_profile('unknown')
+
+    def test_connect(self):
+        con = self.factory.connect(self.db_file, 'write')
+        try:
+            res = self.factory.get_pragmas(con, ['journal_mode', 'synchronous', 'temp_store', 'busy_timeout'])
+            self.assertDictEqual({'journal_mode': 'wal', 'synchronous': 1, 'temp_store': 2, 'busy_timeout': 5000}, res)
+            self.assertDictEqual({}, self.factory.verify(con, 'write'))
+            con.execute('CREATE TABLE t (a)').close()
+        finally:
+            con.close()
+
+        con = self.factory.connect(f'file:{self.db_file}?mode=ro', 'read', uri=True)
+        try:
+            self.assertDictEqual({}, self.factory.verify(con, 'read'))
+            # WAL is persistent
+            self.assertEqual('wal', self.factory.get_pragmas(con, ['journal_mode'])['journal_mode'])
+            with self.assertRaises(sqlite.OperationalError):
+                con.execute('INSERT INTO t VALUES (1)')
+        finally:
+            con.close()
+
+    def test_mismatch(self):
+        # in-memory database has journal_mode=memory always
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            con = self.factory.connect(':memory:', 'bulk')
+        con.close()
+        self.assertEqual(1, len(w))
+        self.assertIn('journal_mode is memory', str(w[0].message))
+
+        with self.assertRaises(PragmaProfileError):
+            self.factory.connect(':memory:', 'bulk', strict=True)
@@ -0,0 +1,151 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts/tests
+# File: test_connection_pool.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 9:40 PM
+
+import threading
+from unittest import TestCase
+
+import sqlite3 as sqlite
+
+from flexts.connection_pool import SQLiteConnectionPool, PoolTimeoutError, PoolClosedError
+
+
+class TestSQLiteConnectionPool(TestCase):
+
+    def setUp(self) -> None:
+        self.prepared = []
+        self.pool = SQLiteConnectionPool(self.connect, self.prepared.append, min_size=1, max_size=2, timeout=.05)
+
+    def tearDown(self) -> None:
+        self.pool.close()
+
+    @staticmethod
+    def connect() -> sqlite.Connection:
+        return sqlite.connect(':memory:', check_same_thread=False)
+
+    def test_init(self):
+        self.assertEqual(1, self.pool.size)
+        self.assertEqual(1, len(self.prepared))
+        with self.assertRaises(ValueError):
+            SQLiteConnectionPool(self.connect, max_size=0)
+        with self.assertRaises(ValueError):
+            SQLiteConnectionPool(self.connect, min_size=3, max_size=2)
+
+    def test_acquire_release(self):
+        con1 = self.pool.acquire()
+        self.assertIs(self.prepared[0], con1)
+        con2 = self.pool.acquire()
+        self.assertEqual(2, len(self.prepared))
+        with self.assertRaises(PoolTimeoutError):
+            self.pool.acquire()
+
+        # waiting acquire gets released connection
+        res = []
+        t = threading.Thread(target=lambda: res.append(self.pool.acquire(timeout=1)))
+        t.start()
+        self.pool.release(con1)
+        t.join()
+        self.assertListEqual([con1], res)
+
+        self.pool.release(con1)
+        self.pool.release(con2, discard=True)
+        stats = self.pool.stats()
+        self.assertEqual(1, stats['size'])
+        self.assertEqual(1, stats['idle'])
+        self.assertEqual(1, stats['discarded'])
+        self.assertEqual(1, stats['timeouts'])
+
+    def test_connection(self):
+        with self.pool.connection() as con:
+            con.execute('CREATE TABLE t (a)').close()
+            con.execute('INSERT INTO t VALUES (1)').close()
+            self.assertTrue(con.in_transaction)
+        # not committed transaction is rolled back on release
+        self.assertFalse(con.in_transaction)
+        self.assertEqual(1, self.pool.idle)
+
+        with self.assertRaises(sqlite.OperationalError):
+            with self.pool.connection() as con:
+                con.execute('SELECT * FROM not_exists')
+        self.assertEqual(1, self.pool.size)
+
+        with self.assertRaises(sqlite.DatabaseError):
+            with self.pool.connection() as con:
+                raise sqlite.DatabaseError('database disk image is malformed')
+        self.assertEqual(0, self.pool.size)
+
+    def test_health_check(self):
+        self.pool.health_check_interval = 0
+        con = self.pool.acquire()
+        self.pool.release(con)
+        con.close()
+        con2 = self.pool.acquire()
+        self.assertIsNot(con, con2)
+        self.assertEqual(1, self.pool.stats()['discarded'])
+        self.pool.release(con2)
+
+    def test_max_uses(self):
+        self.pool.max_uses = 2
+        cons = []
+        for _ in range(3):
+            with self.pool.connection() as con:
+                cons.append(con)
+        self.assertIs(cons[0], cons[1])
+        self.assertIsNot(cons[1], cons[2])
+
+    def test_close(self):
+        con = self.pool.acquire()
+        self.pool.close()
+        with self.assertRaises(PoolClosedError):
+            self.pool.acquire()
+        self.pool.release(con)
+        self.assertEqual(0, self.pool.size)
+        with self.assertRaises(sqlite.ProgrammingError):
+            con.execute('SELECT 1')
+
+    def test_open_without_lock(self):
+        opening, opened = threading.Event(), threading.Event()
+        prepared = []
+
+        def prepare(con: sqlite.Connection):
+            if prepared:
+                opening.set()
+                opened.wait(5)
+            prepared.append(con)
+
+        pool = SQLiteConnectionPool(self.connect, prepare, min_size=1, max_size=2, timeout=.05)
+        try:
+            con1 = pool.acquire()
+            res = []
+            thread = threading.Thread(target=lambda: res.append(pool.acquire(1)))
+            thread.start()
+            self.assertTrue(opening.wait(5))
+            # the second connection is being prepared, other threads are not blocked
+            self.assertEqual(2, pool.size)
+            pool.release(con1)
+            self.assertIs(con1, pool.acquire())
+            # reserved slot is in use too
+            self.assertEqual(2, pool.stats()['in_use'])
+            opened.set()
+            thread.join()
+            self.assertIs(prepared[1], res[0])
+            pool.release(con1)
+            pool.release(res[0])
+        finally:
+            opened.set()
+            pool.close()
+
+    def test_open_failure(self):
+        pool = SQLiteConnectionPool(self.connect, min_size=0, max_size=1, timeout=.05)
+        pool.connect = lambda: sqlite.connect('/nonexistent/dir/db.sqlite3')
+        with self.assertRaises(sqlite.OperationalError):
+            pool.acquire()
+        # slot is given back
+        self.assertEqual(0, pool.size)
+        pool.connect = self.connect
+        pool.release(pool.acquire())
+        self.assertEqual(1, pool.size)
+        pool.close()
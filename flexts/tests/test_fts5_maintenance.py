@@ -0,0 +1,121 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts/tests
+# File: test_fts5_maintenance.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 5:40 PM
+
+import time
+from unittest import TestCase
+
+import sqlite3 as sqlite
+
+from flexts.fts5_maintenance import FTS5MaintenanceScheduler
+from flexts.sqlite_fts5 import SQLiteFTS5
+
+
+class TestFTS5MaintenanceScheduler(TestCase):
+
+    def setUp(self) -> None:
+        self.con: sqlite.Connection = sqlite.connect(':memory:', check_same_thread=False)
+        self.fts5 = SQLiteFTS5(self.con, 'test_fts', ('title', 'text'))
+        self.fts5.create_index()
+        self.fts5.set_config('automerge', 0)
+        self.now = 0.0
+
+    def tearDown(self) -> None:
+        self.con.close()
+
+    def insert(self, start: int, n: int):
+        # one transaction (segment) per row
+        for i in range(start, start + n):
+            self.fts5.insert(i, {'title': f'title {i}', 'text': f'some text {i}'})
+
+    def get_scheduler(self, **kwargs) -> FTS5MaintenanceScheduler:
+        scheduler = FTS5MaintenanceScheduler(self.fts5, **kwargs)
+        scheduler.clock = lambda: self.now
+        return scheduler
+
+    def test_structure(self):
+        self.assertDictEqual({'levels': [], 'segments': 0, 'write_counter': 0}, self.fts5.get_structure())
+        self.insert(1, 5)
+        self.assertEqual(5, self.fts5.segment_count())
+        self.assertListEqual([5], self.fts5.get_structure()['levels'][:1])
+
+        self.assertTrue(self.fts5.merge(-10))
+        self.assertEqual(1, self.fts5.segment_count())
+        self.assertFalse(self.fts5.merge(-10))
+
+        self.insert(6, 2)
+        self.fts5.optimize()
+        self.assertEqual(1, self.fts5.segment_count())
+        self.assertEqual(7, self.fts5.count())
+
+    def test_tick(self):
+        scheduler = self.get_scheduler(merge_changes=10 ** 6, max_segments=100, idle_seconds=10, merge_pages=1000)
+        self.assertIsNone(scheduler.tick())
+        before = self.con.total_changes
+        self.insert(1, 3)
+        self.assertIsNone(scheduler.tick())
+        self.assertEqual(self.con.total_changes - before, scheduler.stats()['changes'])
+
+        scheduler.merge_changes = scheduler.stats()['changes'] + 1
+        self.insert(4, 1)
+        self.assertEqual('merge', scheduler.tick())
+        stats = scheduler.stats()
+        self.assertEqual(1, stats['merges'])
+        self.assertIsNotNone(stats['last_merge_at'])
+
+        # 'merge' merges only levels with usermerge (4) segments or more
+        self.insert(5, 2)
+        segments = self.fts5.segment_count()
+        self.assertGreater(segments, 1)
+        self.assertIsNone(scheduler.tick())
+        self.now += 5
+        self.assertIsNone(scheduler.tick())
+        changes = scheduler.stats()['changes']
+
+        # own merges are not changes and do not break idle window
+        self.now += 10
+        self.assertEqual('optimize', scheduler.tick())
+        self.assertEqual(1, self.fts5.segment_count())
+        self.assertIsNone(scheduler.tick())
+        stats = scheduler.stats()
+        self.assertEqual(1, stats['optimizes'])
+        self.assertEqual(changes, stats['changes'])
+        self.assertEqual(1, stats['segments'])
+        self.assertEqual(6, self.fts5.count())
+
+    def test_max_segments(self):
+        scheduler = self.get_scheduler(max_segments=3, idle_seconds=1000)
+        self.insert(1, 4)
+        self.assertEqual('merge', scheduler.tick())
+        self.assertEqual(1, self.fts5.segment_count())
+
+    def test_step_seconds(self):
+        self.insert(1, 10)
+        scheduler = self.get_scheduler(merge_pages=1, step_seconds=0, idle_seconds=0)
+        self.assertEqual('optimize', scheduler.tick())
+        # one merge command per tick
+        self.assertEqual(1, scheduler.stats()['merge_steps'])
+        while scheduler.tick():
+            pass
+        self.assertEqual(1, self.fts5.segment_count())
+        self.assertEqual(10, self.fts5.count())
+
+    def test_start(self):
+        self.insert(1, 6)
+        scheduler = FTS5MaintenanceScheduler(self.fts5, idle_seconds=0, poll_interval=.01, usermerge=2)
+        scheduler.start()
+        try:
+            end = time.monotonic() + 5
+            while self.fts5.segment_count() > 1 and time.monotonic() < end:
+                time.sleep(.01)
+        finally:
+            scheduler.stop()
+        self.assertFalse(scheduler.is_alive())
+        self.assertEqual(1, self.fts5.segment_count())
+        self.assertIsNone(scheduler.last_error())
+        self.assertEqual(
+            [(2, )], [tuple(r) for r in self.con.execute('SELECT v FROM test_fts_config WHERE k = \'usermerge\'')]
+        )
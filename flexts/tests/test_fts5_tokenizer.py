@@ -0,0 +1,131 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts/tests
+# File: test_fts5_tokenizer.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 1:55 PM
+
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+import sqlite3 as sqlite
+from sqlitefts import fts5
+
+from flexts import fts5_tokenizer
+from flexts.fts5_tokenizer import StemmingFTS5Tokenizer, register_tokenizer
+from flexts.sqlite_fts5 import SQLiteFTS5
+
+
+class DictStemmer:
+    """
+        Stems by dictionary, lower cased token is stem of itself if it is not in dictionary
+    """
+    stems = {'словами': 'слово', 'слова': 'слово', 'rats': 'rat'}
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def stem_words(self, tokens: list[str]) -> list[str]:
+        self.calls += 1
+        return [self.stems.get(t.lower(), t.lower()) for t in tokens]
+
+
+class TestStemmingFTS5Tokenizer(TestCase):
+
+    def setUp(self) -> None:
+        self.tokenizer = StemmingFTS5Tokenizer(DictStemmer())
+
+    def test_tokenize(self):
+        text = 'Деякі слова, Rats!'
+        res = [*self.tokenizer.tokenize(text, fts5.FTS5_TOKENIZE_DOCUMENT)]
+        self.assertListEqual(['деякі', 'слово', 'rat'], [t for t, b, e in res])
+
+        btext = text.encode('utf-8')
+        self.assertListEqual(['Деякі', 'слова', 'Rats'], [btext[b:e].decode('utf-8') for t, b, e in res])
+        # one stemmer call per document
+        self.assertEqual(1, self.tokenizer.stemmer.calls)
+        self.assertListEqual([], [*self.tokenizer.tokenize(' , ', fts5.FTS5_TOKENIZE_DOCUMENT)])
+
+    def test_tokenize_query(self):
+        res = [*self.tokenizer.tokenize('Слова Rats', fts5.FTS5_TOKENIZE_QUERY)]
+        self.assertListEqual([('слова', 0, 10), ('rats', 11, 15)], res)
+        self.assertEqual(0, self.tokenizer.stemmer.calls)
+
+    def test_import_does_not_load_sqlitefts(self):
+        for flag in ('QUERY', 'PREFIX', 'DOCUMENT', 'AUX'):
+            with self.subTest(flag=flag):
+                self.assertEqual(
+                    getattr(fts5, f'FTS5_TOKENIZE_{flag}'), getattr(fts5_tokenizer, f'FTS5_TOKENIZE_{flag}')
+                )
+        # clean interpreter, other tests could load sqlitefts already
+        code = 'import sys, fts_sqlite.blog_sqlite_fts; print("sqlitefts" in sys.modules)'
+        res = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual('False', res.stdout.strip())
+
+
+class TestRegisterTokenizer(TestCase):
+
+    name = 'test_dict_stem'
+
+    def setUp(self) -> None:
+        fts5_tokenizer.tokenizers[self.name] = lambda: StemmingFTS5Tokenizer(DictStemmer())
+        self.con = sqlite.connect(':memory:')
+        self.fts5 = SQLiteFTS5(self.con, 'test_fts5', ['title', 'content'])
+
+    def tearDown(self) -> None:
+        self.con.close()
+        fts5_tokenizer.tokenizers.pop(self.name)
+
+    def get_terms(self) -> list:
+        return [r['term'] for r in self.con.execute('SELECT term FROM test_fts5_v ORDER BY doc, col, offset')]
+
+    def test_register_tokenizer(self):
+        self.assertFalse(register_tokenizer(self.con, 'unicode61'))
+        self.assertTrue(register_tokenizer(self.con, self.name))
+
+    def test_index(self):
+        self.assertTrue(self.fts5.create_index({'tokenize': self.name}))
+        self.assertEqual(self.name, self.fts5.get_tokenizer_name())
+        self.assertEqual('porter', self.fts5.get_tokenizer_name('porter ascii'))
+
+        self.fts5.insert(1, {'title': 'Rats', 'content': 'Деякі слова'})
+        self.fts5.insert(2, {'title': 'Cats', 'content': 'словами'})
+        self.assertListEqual(['деякі', 'слово', 'rat', 'слово', 'cats'], self.get_terms())
+
+        sql = 'SELECT rowid FROM test_fts5 WHERE test_fts5 MATCH ? ORDER BY rowid'
+        self.assertListEqual([1, 2], [r[0] for r in self.con.execute(sql, ('"слово"', ))])
+        # query terms are not stemmed by tokenizer
+        self.assertListEqual([], [r[0] for r in self.con.execute(sql, ('"слова"', ))])
+
+        # delete re-tokenizes the terms from index
+        self.fts5.delete_for(1)
+        self.assertListEqual(['слово', 'cats'], self.get_terms())
+        self.assertListEqual([], self.fts5.check_index_is_broken())
+
+    def test_registered_for_existing_index(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, 'fts.sqlite3')
+            con = sqlite.connect(db_file)
+            try:
+                SQLiteFTS5(con, 'test_fts5', ['title', 'content']).create_index({'tokenize': self.name})
+            finally:
+                con.close()
+
+            sql = 'SELECT rowid FROM test_fts5 WHERE test_fts5 MATCH \'"слово"\''
+            con = sqlite.connect(db_file)
+            try:
+                with self.assertRaises(sqlite.OperationalError):
+                    con.execute(sql)
+            finally:
+                con.close()
+
+            con = sqlite.connect(db_file)
+            try:
+                # driver registers the tokenizer of existing index
+                SQLiteFTS5(con, 'test_fts5', ['title', 'content']).insert(1, {'content': 'Деякі слова'})
+                self.assertListEqual([1], [r[0] for r in con.execute(sql)])
+            finally:
+                con.close()
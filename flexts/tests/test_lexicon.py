@@ -0,0 +1,63 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts/tests
+# File: test_lexicon.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 4:15 PM
+
+import os
+import tempfile
+from unittest import TestCase
+
+from flexts.lexicon import compile_lexicon, Lexicon, LexiconFormatError
+
+
+class TestLexicon(TestCase):
+
+    items = [
+        ('словами', ['слово']),
+        ('Слова', ['слово']),
+        ('деякі', ['деякий', 'дея']),
+        ('english', []),
+        ('слова', ['other']),  # first one wins
+        ('ґанок', ['ґанок']),
+    ]
+
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp_dir.name, 'uk.lex')
+
+    def tearDown(self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_lookup(self):
+        self.assertEqual(5, compile_lexicon(self.items, self.path))
+
+        lex = Lexicon(self.path)
+        try:
+            self.assertEqual(5, len(lex))
+            self.assertEqual(4, lex.n_stems)
+            self.assertTupleEqual(('слово', ), lex.lookup('словами'))
+            self.assertTupleEqual(('слово', ), lex.lookup('слова'))
+            self.assertTupleEqual(('деякий', 'дея'), lex.lookup('деякі'))
+            self.assertTupleEqual(('ґанок', ), lex.lookup('ґанок'))
+            self.assertTupleEqual((), lex.lookup('english'))
+            for token in ('unknown', 'слов', 'я', ''):
+                with self.subTest(token=token):
+                    self.assertIsNone(lex.lookup(token))
+        finally:
+            lex.close()
+
+    def test_empty(self):
+        self.assertEqual(0, compile_lexicon([], self.path))
+        lex = Lexicon(self.path)
+        try:
+            self.assertIsNone(lex.lookup('слова'))
+        finally:
+            lex.close()
+
+    def test_format_error(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a lexicon file at all')
+        with self.assertRaises(LexiconFormatError):
+            Lexicon(self.path)
@@ -0,0 +1,41 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts/tests
+# File: test_profile_report.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 7:50 PM
+
+import tempfile
+from unittest import TestCase
+
+from flexts.profile_report import profile_report
+
+
+class TestProfileReport(TestCase):
+
+    def test_profile_report(self):
+        def items():
+            return ((i, {'headline': f'headline {i} about some thing', 'body': f'body text {i}'}) for i in range(1, 51))
+
+        queries = ['"some"', '"thi"*', '{headline} : "about"', '"some thing"']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report = profile_report(items, ['headline', 'body'], queries, tmp_dir, repeat=2)
+
+        self.assertListEqual(['full', 'prefix', 'column', 'column_prefix', 'nosize', 'minimal'], [r['profile'] for r in report])
+        res = {r['profile']: r for r in report}
+        for r in report:
+            with self.subTest(profile=r['profile']):
+                self.assertEqual(50, r['docs'])
+                self.assertGreater(r['size'], 0)
+                self.assertIsNotNone(r['query_ms'])
+
+        self.assertEqual(0, res['full']['errors'])
+        self.assertEqual(0, res['prefix']['errors'])
+        self.assertDictEqual({'columnsize': 0}, res['nosize']['options'])
+        self.assertEqual(0, res['nosize']['errors'])
+        self.assertDictEqual({'detail': 'column'}, res['column']['options'])
+        # phrase query needs positions
+        self.assertEqual(1, res['column']['errors'])
+        self.assertIsNone(res['column']['queries']['"some thing"'])
+        # phrase query and column filter
+        self.assertEqual(2, res['minimal']['errors'])
@@ -0,0 +1,57 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts/tests
+# File: test_result_cache.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 11:40 PM
+
+from unittest import TestCase
+
+from flexts.result_cache import ResultCache
+
+
+class TestResultCache(TestCase):
+
+    def setUp(self) -> None:
+        self.now = 100.0
+        self.cache = ResultCache(max_size=2, ttl=10)
+        self.cache.clock = lambda: self.now
+
+    def test_init(self):
+        for kwargs in ({'max_size': 0}, {'ttl': 0}, {'ttl': -1}):
+            with self.assertRaises(ValueError):
+                ResultCache(**kwargs)
+
+    def test_lru(self):
+        self.assertIs(ResultCache.miss, self.cache.get('a', 1))
+        self.cache.put('a', 1, (1, ))
+        self.cache.put('b', 1, (2, ))
+        self.assertEqual((1, ), self.cache.get('a', 1))
+        # 'b' is least recently used
+        self.cache.put('c', 1, (3, ))
+        self.assertIs(ResultCache.miss, self.cache.get('b', 1))
+        self.assertEqual((1, ), self.cache.get('a', 1))
+        self.assertEqual((3, ), self.cache.get('c', 1))
+        self.assertEqual(2, len(self.cache))
+
+        stats = self.cache.stats()
+        self.assertEqual((3, 2, 1), (stats['hits'], stats['misses'], stats['evictions']))
+        self.assertEqual(.6, stats['hit_rate'])
+
+    def test_invalidation(self):
+        self.cache.put('a', 1, (1, ))
+        self.assertIs(ResultCache.miss, self.cache.get('a', 2))
+        self.assertEqual(0, len(self.cache))
+
+        self.cache.put('a', 2, (1, ))
+        self.now += 10
+        self.assertIs(ResultCache.miss, self.cache.get('a', 2))
+
+        # zero hits are cached too
+        self.cache.put('b', 2, ())
+        self.assertEqual((), self.cache.get('b', 2))
+
+        stats = self.cache.stats()
+        self.assertEqual((1, 1, 1, 1), tuple(stats[k] for k in ('invalidations', 'expirations', 'hits', 'negative_hits')))
+        self.cache.clear()
+        self.assertEqual(0, self.cache.stats()['size'])
@@ -0,0 +1,98 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts/tests
+# File: test_sharded_fts5.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 8:40 PM
+
+from unittest import TestCase
+
+import sqlite3 as sqlite
+
+from flexts.sharded_fts5 import ShardedSQLiteFTS5
+
+
+class TestShardedSQLiteFTS5(TestCase):
+
+    index_name = 'test_sharded_fts5'
+
+    def setUp(self) -> None:
+        self.cons = [sqlite.connect(':memory:') for _ in range(3)]
+        self.driver = ShardedSQLiteFTS5(self.cons, self.index_name, ['title', 'text'])
+        self.driver.create_index()
+
+    def tearDown(self) -> None:
+        for con in self.cons:
+            con.close()
+
+    def rowids(self, con: sqlite.Connection) -> list:
+        return [r[0] for r in con.execute(f'SELECT rowid FROM {self.index_name} ORDER BY rowid').fetchall()]
+
+    def match(self, s: str) -> list:
+        sql = f'SELECT rowid FROM {self.index_name} WHERE {self.index_name} MATCH ?'
+        return sorted(r[0] for con in self.cons for r in con.execute(sql, (s, )).fetchall())
+
+    def test_init(self):
+        self.assertTrue(self.driver.check_index())
+        self.assertEqual(0, self.driver.count())
+
+        with self.assertRaises(ValueError):
+            ShardedSQLiteFTS5([], self.index_name, ['title'])
+        with self.assertRaises(ValueError):
+            ShardedSQLiteFTS5(self.cons, self.index_name, ['title'], partition='list')
+        with self.assertRaises(ValueError):
+            ShardedSQLiteFTS5(self.cons, self.index_name, ['title'], partition='range', bounds=[10])
+        with self.assertRaises(ValueError):
+            ShardedSQLiteFTS5(self.cons, self.index_name, ['title'], partition='range', bounds=[20, 10])
+        with self.assertRaises(ValueError):
+            ShardedSQLiteFTS5(self.cons, self.index_name, ['title'], bounds=[10, 20])
+
+    def test_with_connection(self):
+        self.driver.insert(4, {'title': 'some title'})
+        driver = self.driver.with_connection(lambda con: con)
+        self.assertIsNot(self.driver, driver)
+        self.assertListEqual(self.cons, driver.connections)
+        self.assertEqual(self.driver.shard_of(4), driver.shard_of(4))
+        driver.delete_for(4)
+        self.assertListEqual([], self.match('some'))
+
+    def test_shard_of(self):
+        self.assertListEqual([0, 1, 2, 0], [self.driver.shard_of(rowid) for rowid in (3, 4, 5, 6)])
+
+        driver = ShardedSQLiteFTS5(self.cons, self.index_name, ['title', 'text'], partition='range', bounds=[10, 20])
+        self.assertListEqual([0, 1, 1, 2, 2], [driver.shard_of(rowid) for rowid in (9, 10, 19, 20, 1000)])
+
+    def test_insert_update_delete(self):
+        for rowid in (1, 2, 3):
+            self.driver.insert(rowid, {'title': f'title {rowid}', 'text': 'some text'})
+        self.assertListEqual([[3], [1], [2]], [self.rowids(con) for con in self.cons])
+
+        self.driver.update(2, {'text': 'other words'})
+        self.assertListEqual([1, 3], self.match('some'))
+        self.assertListEqual([2], self.match('other'))
+
+        self.driver.delete(2, {'text': 'other words'})
+        self.assertListEqual([], self.match('other'))
+        self.driver.delete_for(1)
+        self.assertListEqual([[3], [], []], [self.rowids(con) for con in self.cons])
+        self.assertListEqual([], self.driver.check_index_is_broken())
+
+    def test_many(self):
+        items = [(rowid, {'title': f'title {rowid}', 'text': 'some text'}) for rowid in range(1, 11)]
+        self.assertEqual(10, self.driver.insert_many(items, commit_every=4))
+        self.assertListEqual([[3, 6, 9], [1, 4, 7, 10], [2, 5, 8]], [self.rowids(con) for con in self.cons])
+
+        self.assertEqual(2, self.driver.update_many([(1, {'text': 'other'}), (5, {'text': 'other'})]))
+        self.assertListEqual([1, 5], self.match('other'))
+
+        self.assertEqual(3, self.driver.replace_many([(1, None), (2, {'title': 'new', 'text': 'text'}), (3, None)]))
+        self.assertListEqual([2], self.match('new'))
+        self.assertEqual(8, self.driver.count())
+
+        self.assertEqual(2, self.driver.delete_for_many([(4, None), (5, None)]))
+        self.assertEqual(2, self.driver.purge_many([6, 7, 100]))
+        self.assertListEqual([2, 8, 9, 10], sorted(rowid for con in self.cons for rowid in self.rowids(con)))
+        self.assertListEqual([], self.driver.check_index_is_broken())
+
+        self.driver.delete_all()
+        self.assertEqual(0, self.driver.count())
@@ -4,12 +4,14 @@
 # File: ${FILE_NAME}
 # Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
 # Created by ox23 at 2022-11-19 (y-m-d) 6:30 AM
+import os
+import tempfile
 from typing import Iterable, Union
-from unittest import TestCase
+from unittest import TestCase, mock, skipUnless
 
 import sqlite3 as sqlite
 
-from flexts.sqlite_fts5 import SQLiteFTS5SQLBuilder, SQLiteFTS5
+from flexts.sqlite_fts5 import SQLiteFTS5SQLBuilder, SQLiteFTS5, SQLiteFTS5VerificationError
 
 
 class TestSQLiteFTS5SQLBuilder(TestCase):
@@ -417,3 +419,558 @@ class TestSQLiteFTS5(TestCase):
         self.fts5.update(111, {'text': new_text})
         res = utl.res_from_index(111)
         self.assertListEqual(utl.dicts2hashes(init), utl.dicts2hashes(res))
+
+    def test_insert_many(self):
+        self.assertTrue(self.fts5.create_index())
+        utl = self.fts5_utils
+
+        items = [(v['rowid'], {c: v[c] for c in self.index_columns}) for v in utl.test_values[:2]]
+        items.append((117, {'text': 'only text'}))  # other column signature
+        self.assertEqual(3, self.fts5.insert_many(items, commit_every=2))
+
+        for i in range(2):
+            init = []
+            for c in self.index_columns:
+                init.extend(utl.pretend_v(utl[i, c], utl[i, 'rowid'], c))
+            with self.subTest(rowid=utl[i, 'rowid']):
+                self.assertListEqual(utl.dicts2hashes(init), utl.dicts2hashes(utl.res_from_index(utl[i, 'rowid'])))
+
+        self.assertListEqual(
+            utl.dicts2hashes(utl.pretend_v('only text', 117, 'text')), utl.dicts2hashes(utl.res_from_index(117))
+        )
+        self.assertEqual(0, len(self.fts5.check_index_is_broken()))
+
+        with self.assertRaises(ValueError):
+            self.fts5.insert_many([(118, {'unknown': 'value'})])
+
+    def test_generation(self):
+        self.assertTrue(self.fts5.create_index())
+        self.assertEqual(0, self.fts5.generation)
+        self.fts5.insert(111, {'title': 'One hundred one'})
+        self.assertEqual(1, self.fts5.generation)
+        items = [(rowid, {'title': f'title {rowid}'}) for rowid in (112, 113, 114)]
+        self.assertEqual(3, self.fts5.insert_many(items, commit_every=2))
+        self.assertEqual(3, self.fts5.generation)
+        self.fts5.count()
+        self.assertEqual(3, self.fts5.generation)
+        self.fts5.delete_all()
+        self.assertEqual(4, self.fts5.generation)
+
+    def test_delete_many(self):
+        self.assertTrue(self.fts5.create_index())
+        utl = self.fts5_utils
+        utl.tval2index(self, stop=2)
+
+        items = [(v['rowid'], {c: v[c] for c in self.index_columns}) for v in utl.test_values[:2]]
+        self.assertEqual(2, self.fts5.delete_many(items, commit_every=1))
+        self.assertListEqual([], utl.res_from_index(111))
+        self.assertListEqual([], utl.res_from_index(115))
+
+    def test_update_many(self):
+        self.assertTrue(self.fts5.create_index())
+        utl = self.fts5_utils
+        utl.tval2index(self, stop=2)
+
+        items = [
+            (111, {'text': 'щось новеньке new value'}),
+            (115, {'title': 'title of 115'}),
+            (111, {'text': 'and newest value'}),  # repeated rowid inside of one chunk
+        ]
+        self.assertEqual(3, self.fts5.update_many(items))
+
+        init = utl.pretend_v('and newest value', 111, 'text')
+        init.extend(utl.pretend_v(utl[0, 'title'], 111, 'title'))
+        self.assertListEqual(utl.dicts2hashes(init), utl.dicts2hashes(utl.res_from_index(111)))
+
+        init = utl.pretend_v('title of 115', 115, 'title')
+        init.extend(utl.pretend_v(utl[1, 'text'], 115, 'text'))
+        self.assertListEqual(utl.dicts2hashes(init), utl.dicts2hashes(utl.res_from_index(115)))
+        self.assertEqual(0, len(self.fts5.check_index_is_broken()))
+
+    def test_replace_many(self):
+        self.assertTrue(self.fts5.create_index())
+        utl = self.fts5_utils
+        utl.tval2index(self)  # rowid 115 is broken
+
+        items = [
+            (111, None),  # only delete
+            (115, {'title': 'title of 115'}),  # replaces all columns even the broken ones
+            (117, {'text': 'new row'}),
+            (117, {'text': 'new row replaced'}),  # repeated rowid inside of one chunk
+        ]
+        self.assertEqual(4, self.fts5.replace_many(items))
+
+        self.assertListEqual([], utl.res_from_index(111))
+        self.assertListEqual(
+            utl.dicts2hashes(utl.pretend_v('title of 115', 115, 'title')), utl.dicts2hashes(utl.res_from_index(115))
+        )
+        self.assertListEqual(
+            utl.dicts2hashes(utl.pretend_v('new row replaced', 117, 'text')), utl.dicts2hashes(utl.res_from_index(117))
+        )
+        self.assertEqual(0, len(self.fts5.check_index_is_broken()))
+
+        # replay is safe
+        self.assertEqual(4, self.fts5.replace_many(items))
+        self.assertEqual(0, len(self.fts5.check_index_is_broken()))
+
+    def test_shadow_swap(self):
+        self.assertTrue(self.fts5.create_index({'tokenize': 'unicode61 remove_diacritics 0'}))
+        utl = self.fts5_utils
+        utl.tval2index(self, stop=1)  # rowid 111
+
+        shadow = self.fts5.create_shadow()
+        self.assertEqual(f'{self.index_name}{self.fts5.shadow_suffix}', shadow.index_name)
+        self.assertTrue(shadow.check_index())
+        # the same definition
+        self.assertEqual(
+            self.fts5.get_index_sql().replace(self.index_name, ''), shadow.get_index_sql().replace(shadow.index_name, '')
+        )
+
+        shadow.insert(115, {'title': 'first second third', 'text': 'щось за contents'})
+        # live index is untouched
+        self.assertTrue(utl.res_from_index(111))
+        self.assertFalse(utl.res_from_index(115))
+
+        with self.assertRaises(SQLiteFTS5VerificationError):
+            self.fts5.swap(shadow, expected_count=2)
+
+        self.fts5.swap(shadow, expected_count=1)
+        self.assertFalse(shadow.check_index())
+        self.assertFalse(utl.res_from_index(111))
+        init = utl.pretend_v('first second third', 115, 'title')
+        init.extend(utl.pretend_v('щось за contents', 115, 'text'))
+        self.assertListEqual(utl.dicts2hashes(init), utl.dicts2hashes(utl.res_from_index(115)))
+        self.assertIn('remove_diacritics', self.fts5.get_index_sql())
+
+        # broken shadow can not be swapped in
+        shadow = self.fts5.create_shadow()
+        shadow.insert(115, {'title': 'first second third'})
+        shadow.insert(115, {'title': 'once other content'})
+        with self.assertRaises(SQLiteFTS5VerificationError):
+            self.fts5.swap(shadow)
+        self.assertTrue(utl.res_from_index(115))
+
+        # transaction of caller is not committed by swap
+        shadow = self.fts5.create_shadow()
+        shadow.insert(116, {'title': 'new content'})
+        self.connection.execute(f'INSERT INTO {self.index_name} (rowid, title) VALUES (117, \'pending\')')
+        with self.assertRaisesRegex(ValueError, 'transaction'):
+            self.fts5.swap(shadow, expected_count=1)
+        self.connection.rollback()
+        self.assertFalse(utl.res_from_index(117))
+        self.fts5.swap(shadow, expected_count=1)
+        self.assertTrue(utl.res_from_index(116))
+
+
+class TestSQLiteFTS5TokenTable(TestCase):
+
+    def setUp(self) -> None:
+        self.connection: sqlite.Connection = sqlite.connect(':memory:')
+        self.index_name = 'test_fts'
+        self.index_columns = ('title', 'text')
+        self.fts5 = SQLiteFTS5(self.connection, self.index_name, self.index_columns, token_table=True)
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+    def get_tokens(self) -> list[tuple]:
+        sql = f'SELECT doc, col, text FROM {self.fts5.token_table_name} ORDER BY doc, col'
+        return [tuple(r) for r in self.connection.execute(sql)]
+
+    def test_token_table(self):
+        self.fts5.create_index()
+        self.assertTrue(self.fts5.check_token_table())
+        self.assertTrue(SQLiteFTS5(self.connection, self.index_name, self.index_columns).token_table)
+
+        self.fts5.insert(1, {'title': 'Some Title', 'text': 'Some, text!'})
+        self.fts5.insert_many([(2, {'title': 'Other title'}), (3, {'text': 'third'})])
+        self.assertListEqual(
+            [(1, 'text', 'Some, text!'), (1, 'title', 'Some Title'), (2, 'title', 'Other title'), (3, 'text', 'third')],
+            self.get_tokens()
+        )
+        self.assertDictEqual({'title': 'Some Title'}, self.fts5._get_terms_for(1, ['title']))
+
+        self.fts5.update(1, {'text': 'new text'})
+        self.fts5.delete_for(2)
+        self.fts5.update_many([(3, {'title': 'title 3'})])
+        self.assertListEqual(
+            [(1, 'text', 'new text'), (1, 'title', 'Some Title'), (3, 'text', 'third'), (3, 'title', 'title 3')],
+            self.get_tokens()
+        )
+        self.fts5.replace_many([(1, None), (3, {'text': 'last'})])
+        self.assertListEqual([(3, 'text', 'last')], self.get_tokens())
+        self.assertListEqual([], self.fts5.check_index_is_broken())
+        self.assertListEqual(
+            ['last'], [r['term'] for r in self.connection.execute(f'SELECT term FROM {self.index_name}_v')]
+        )
+
+        self.fts5.delete_all()
+        self.assertListEqual([], self.get_tokens())
+
+    def test_shadow_swap(self):
+        self.fts5.create_index()
+        self.fts5.insert(1, {'title': 'old'})
+
+        shadow = self.fts5.create_shadow()
+        self.assertTrue(shadow.check_token_table())
+        shadow.insert(1, {'title': 'new'})
+        self.fts5.swap(shadow, 1)
+
+        self.assertFalse(shadow.check_token_table())
+        self.assertListEqual([(1, 'title', 'new')], self.get_tokens())
+        self.fts5.delete_for(1)
+        self.assertEqual(0, self.fts5.count())
+
+    def test_existing_index_without_token_table(self):
+        SQLiteFTS5(self.connection, 'other', self.index_columns).create_index()
+        self.assertFalse(SQLiteFTS5(self.connection, 'other', self.index_columns).token_table)
+        with self.assertRaises(ValueError):
+            SQLiteFTS5(self.connection, 'other', self.index_columns, token_table=True)
+
+
+class TestSQLiteFTS5IndexMode(TestCase):
+
+    has_contentless_delete = sqlite.sqlite_version_info >= SQLiteFTS5.contentless_delete_min_version
+
+    def setUp(self) -> None:
+        self.connection: sqlite.Connection = sqlite.connect(':memory:')
+        self.index_name = 'test_fts'
+        self.index_columns = ('title', 'text')
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+    def get_terms(self, index_name: str = None) -> list[tuple]:
+        sql = f'SELECT doc, col, term FROM {index_name or self.index_name}_v ORDER BY doc, col, offset'
+        return [tuple(r) for r in self.connection.execute(sql)]
+
+    def test_index_mode(self):
+        fts5 = SQLiteFTS5(self.connection, self.index_name, self.index_columns)
+        self.assertEqual('contentless', fts5.index_mode)
+        self.assertIsNone(fts5.get_index_mode())
+        with self.assertRaises(ValueError):
+            fts5.set_index_mode('unknown')
+
+        fts5.create_index()
+        self.assertEqual('contentless', fts5.get_index_mode())
+        self.assertEqual('contentless', SQLiteFTS5(self.connection, self.index_name, self.index_columns,
+                                                   index_mode='auto').index_mode)
+        with self.assertRaises(ValueError):
+            SQLiteFTS5(self.connection, self.index_name, self.index_columns, index_mode='external')
+
+        exp = 'contentless_delete' if self.has_contentless_delete else 'contentless'
+        self.assertEqual(exp, SQLiteFTS5(self.connection, 'other', self.index_columns, index_mode='auto').index_mode)
+
+    def test_auto_fallback(self):
+        if self.has_contentless_delete:
+            self.skipTest('SQLite supports contentless_delete')
+
+        class FTS5(SQLiteFTS5):
+            contentless_delete_min_version = (3, 0, 0)
+
+        fts5 = FTS5(self.connection, self.index_name, self.index_columns, index_mode='auto')
+        self.assertEqual('contentless_delete', fts5.index_mode)
+        fts5.create_index()
+        self.assertEqual('contentless', fts5.index_mode)
+        self.assertEqual('contentless', fts5.get_index_mode())
+
+        with self.assertRaises(sqlite.OperationalError):
+            FTS5(self.connection, 'other', self.index_columns, index_mode='contentless_delete').create_index()
+
+    def test_external(self):
+        self.connection.execute('CREATE TABLE doc (id INTEGER PRIMARY KEY, title TEXT, text TEXT)')
+        self.connection.executemany(
+            'INSERT INTO doc (id, title, text) VALUES (?, ?, ?)', [(1, 'First title', 'some text'), (2, 'Second', None)]
+        )
+        fts5 = SQLiteFTS5(self.connection, self.index_name, self.index_columns, index_mode='external',
+                          token_table=True)
+        with self.assertRaises(ValueError):
+            fts5.create_index()
+        self.assertTrue(fts5.create_index({'content': 'doc', 'content_rowid': 'id'}))
+        self.assertEqual('external', SQLiteFTS5(self.connection, self.index_name, self.index_columns).index_mode)
+
+        fts5.rebuild()
+        self.assertListEqual(
+            [(1, 'text', 'some'), (1, 'text', 'text'), (1, 'title', 'first'), (1, 'title', 'title'),
+             (2, 'title', 'second')],
+            self.get_terms()
+        )
+        self.assertDictEqual({'title': 'Second'}, fts5._get_terms_for(2))
+
+        # index is synchronized with content table by the caller, old data are taken from token table
+        self.connection.execute('UPDATE doc SET title = \'Third\' WHERE id = 2')
+        fts5.update(2, {'title': 'Third'})
+        self.assertListEqual([(2, 'title', 'third')], self.get_terms()[4:])
+        self.assertListEqual(
+            [(2, 'Third')], [tuple(r) for r in self.connection.execute(
+                f'SELECT rowid, title FROM {self.index_name} WHERE {self.index_name} MATCH \'third\''
+            )]
+        )
+
+        with self.assertRaises(ValueError):
+            SQLiteFTS5(self.connection, 'other', self.index_columns).rebuild()
+
+    @skipUnless(has_contentless_delete, 'contentless_delete requires SQLite 3.43.0')
+    def test_contentless_delete(self):
+        fts5 = SQLiteFTS5(self.connection, self.index_name, self.index_columns, index_mode='contentless_delete')
+        fts5.create_index()
+        self.assertEqual('contentless_delete', SQLiteFTS5(self.connection, self.index_name).index_mode)
+
+        fts5.insert_many([(1, {'title': 'one', 'text': 'first text'}), (2, {'title': 'two'}), (3, {'text': 'three'})])
+        fts5.delete_for(1, ['text'])
+        fts5.delete(2, {'title': 'anything'})
+        fts5.delete_for(10)
+        self.assertListEqual([(1, 'title', 'one'), (3, 'text', 'three')], self.get_terms())
+
+        fts5.update(1, {'text': 'new'})
+        fts5.update_many([(3, {'title': 'title'}), (3, {'text': 'text'})])
+        self.assertListEqual(
+            [(1, 'text', 'new'), (1, 'title', 'one'), (3, 'text', 'text'), (3, 'title', 'title')], self.get_terms()
+        )
+
+        self.assertEqual(3, fts5.replace_many([(1, None), (3, {'text': 'last'}), (4, {'title': 'four'})]))
+        self.assertListEqual([(3, 'text', 'last'), (4, 'title', 'four')], self.get_terms())
+        self.assertEqual(2, fts5.delete_for_many([(3, None), (4, ['title'])]))
+        self.assertEqual(0, fts5.count())
+
+    @skipUnless(has_contentless_delete, 'contentless_delete requires SQLite 3.43.0')
+    def test_contentless_delete_token_table(self):
+        fts5 = SQLiteFTS5(self.connection, self.index_name, self.index_columns, index_mode='contentless_delete',
+                          token_table=True)
+        fts5.create_index()
+        fts5.insert(1, {'title': 'Some Title', 'text': 'Some, text!'})
+        fts5.update(1, {'text': 'new text'})
+        fts5.replace_many([(2, {'text': 'two'}), (2, {'title': 'Two'})])
+        self.assertListEqual(
+            [(1, 'text', 'new text'), (1, 'title', 'Some Title'), (2, 'title', 'Two')],
+            [tuple(r) for r in self.connection.execute(
+                f'SELECT doc, col, text FROM {fts5.token_table_name} ORDER BY doc, col'
+            )]
+        )
+
+        shadow = fts5.create_shadow()
+        self.assertEqual('contentless_delete', shadow.get_index_mode())
+        shadow.insert(1, {'title': 'new'})
+        fts5.swap(shadow)
+        self.assertEqual('contentless_delete', fts5.index_mode)
+        fts5.delete_many([(1, {'title': 'new'})])
+        self.assertEqual(0, fts5.count())
+
+
+class TestSQLiteFTS5Integrity(TestCase):
+
+    def setUp(self) -> None:
+        self.connection: sqlite.Connection = sqlite.connect(':memory:')
+        self.fts5 = SQLiteFTS5(self.connection, 'test_fts', ('title', 'text'))
+        self.fts5.create_index()
+        self.fts5.insert_many([(i, {'title': f'title {i}', 'text': f'text of {i}'}) for i in range(1, 11)])
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+    def break_rows(self, *rowids):
+        with self.connection as con:
+            for rowid in rowids:
+                con.execute('INSERT INTO test_fts (rowid, title) VALUES (?, \'other title\')', (rowid, ))
+
+    def test_iter_broken(self):
+        self.assertListEqual([], [*self.fts5.iter_broken(chunk_size=3)])
+        self.break_rows(2, 7, 10)
+
+        checkpoints = []
+        rows = [*self.fts5.iter_broken(chunk_size=3, checkpoint=checkpoints.append)]
+        self.assertListEqual([2, 7, 10], [r['rowid'] for r in rows])
+        self.assertListEqual([r['rowid'] for r in self.fts5.check_index_is_broken()], [r['rowid'] for r in rows])
+        # found rows are checked again by 3, checkpoint is not passed while they are not yielded
+        self.assertListEqual([], checkpoints)
+
+        checkpoints = []
+        rows = [*self.fts5.iter_broken(chunk_size=1, checkpoint=checkpoints.append)]
+        self.assertListEqual([2, 7, 10], [r['rowid'] for r in rows])
+        self.assertListEqual([*range(1, 11)], checkpoints)
+
+        # resume
+        self.assertListEqual([7, 10], [r['rowid'] for r in self.fts5.iter_broken(start_after=3, chunk_size=3)])
+        self.assertListEqual([10], [r['rowid'] for r in self.fts5.iter_broken(start_after=9, chunk_size=100)])
+
+        rows = [*self.fts5.iter_broken(start_after=9, chunk_size=1, return_details=True)]
+        self.assertTrue(rows)
+        self.assertSetEqual({(10, 'title')}, {(r['rowid'], r['col']) for r in rows})
+
+        with self.assertRaises(ValueError):
+            [*self.fts5.iter_broken(chunk_size=0)]
+        self.assertListEqual([], self.connection.execute('PRAGMA database_list').fetchall()[1:])
+
+    def test_iter_broken_live(self):
+        self.break_rows(2, 7)
+        copy_instances = self.fts5._copy_instances
+
+        def copy(*args):
+            copy_instances(*args)
+            # row is repaired after the copy, it must not be reported
+            self.fts5.purge_many([7])
+            self.fts5.insert(7, {'title': 'title 7'})
+
+        with mock.patch.object(self.fts5, '_copy_instances', side_effect=copy):
+            self.assertListEqual([2], [r['rowid'] for r in self.fts5.iter_broken(chunk_size=2)])
+
+    def test_iter_broken_scratch(self):
+        self.break_rows(2, 7)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            scratch = os.path.join(tmp_dir, 'scratch.sqlite3')
+            checkpoints = []
+            it = self.fts5.iter_broken(chunk_size=1, checkpoint=checkpoints.append, scratch=scratch)
+            self.assertEqual(2, next(it)['rowid'])
+            it.close()
+            self.assertTrue(os.path.isfile(scratch))
+            self.assertListEqual([1], checkpoints)
+
+            # the copy of the first run is used, the rows broken after it are found in the next full check only
+            self.break_rows(9)
+            rows = [*self.fts5.iter_broken(checkpoints[-1], chunk_size=1, scratch=scratch)]
+            self.assertListEqual([2, 7], [r['rowid'] for r in rows])
+            self.assertFalse(os.path.isfile(scratch))
+
+            self.assertListEqual([7, 9], [r['rowid'] for r in self.fts5.iter_broken(2, scratch=scratch)])
+
+    def test_integrity_check(self):
+        self.fts5.integrity_check()
+        self.fts5.integrity_check(rank=0)
+
+        with self.connection as con:
+            con.execute(f'DELETE FROM test_fts_data WHERE id > {self.fts5.structure_rowid}')
+        with self.assertRaises(SQLiteFTS5VerificationError):
+            self.fts5.integrity_check()
+
+    def test_purge_many(self):
+        self.break_rows(2, 7)
+        with mock.patch.object(self.fts5, '_get_vocab_terms', wraps=self.fts5._get_vocab_terms) as get_terms:
+            self.assertEqual(2, self.fts5.purge_many([2, 7, 99], commit_every=1))
+            # one scan for all chunks, the database was not changed by other connection
+            get_terms.assert_called_once_with([2, 7, 99])
+        self.assertListEqual([], [*self.fts5.iter_broken()])
+        self.assertEqual(8, self.fts5.count())
+        self.assertListEqual(
+            [], self.connection.execute('SELECT doc FROM test_fts_v WHERE doc IN (2, 7)').fetchall()
+        )
+        self.fts5.insert(2, {'title': 'title 2'})
+        self.assertListEqual([], self.fts5.check_index_is_broken())
+
+    def test_purge_many_other_connection(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'fts.sqlite3')
+            con, other_con = sqlite.connect(path), sqlite.connect(path)
+            try:
+                fts5 = SQLiteFTS5(con, 'test_fts', ('title', 'text'))
+                fts5.create_index()
+                fts5.insert_many([(i, {'title': f'title {i}'}) for i in range(1, 4)])
+                get_vocab_terms = fts5._get_vocab_terms
+
+                def get_terms(rowids):
+                    res = get_vocab_terms(rowids)
+                    if len(rowids) == 3:
+                        # the terms of row 3 read before are not valid anymore
+                        with other_con:
+                            other_con.execute('INSERT INTO test_fts (rowid, title) VALUES (3, \'other\')').close()
+                    return res
+
+                with mock.patch.object(fts5, '_get_vocab_terms', side_effect=get_terms) as get_terms_mock:
+                    self.assertEqual(3, fts5.purge_many([1, 2, 3], commit_every=2))
+                self.assertListEqual([mock.call([1, 2, 3]), mock.call([3])], get_terms_mock.call_args_list)
+                self.assertListEqual([], con.execute('SELECT * FROM test_fts_v').fetchall())
+            finally:
+                other_con.close()
+                con.close()
+
+
+class TestSQLiteFTS5StorageProfile(TestCase):
+
+    def setUp(self) -> None:
+        self.connection: sqlite.Connection = sqlite.connect(':memory:')
+        self.index_columns = ('title', 'text')
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+    def test_create_index(self):
+        fts5 = SQLiteFTS5(self.connection, 'test_fts', self.index_columns)
+        with self.assertRaises(ValueError):
+            fts5.create_index(profile='unknown')
+        with self.assertRaises(ValueError):
+            fts5.create_index(profile='minimal')
+        self.assertFalse(fts5.check_index())
+
+        fts5.create_index({'prefix': '2'}, profile='column_prefix')
+        self.assertDictEqual({'content': '', 'detail': 'column', 'prefix': '2'}, fts5.get_index_options())
+        self.assertDictEqual({}, SQLiteFTS5(self.connection, 'other', self.index_columns).get_index_options())
+
+        shadow = fts5.create_shadow()
+        self.assertDictEqual(fts5.get_index_options(), shadow.get_index_options())
+
+    def test_detail_column(self):
+        fts5 = SQLiteFTS5(self.connection, 'test_fts', self.index_columns)
+        fts5.create_index(profile='column')
+        fts5.insert(1, {'title': 'first title', 'text': 'some text and some more text'})
+        fts5.insert(2, {'title': 'other title'})
+        # offsets are not stored, so duplicated offsets can't be found
+        self.assertListEqual([], fts5.check_index_is_broken())
+        self.assertListEqual([], [*fts5.iter_broken()])
+
+        fts5.delete_for(1, ['text'])
+        fts5.update(2, {'title': 'new'})
+        sql = 'SELECT rowid FROM test_fts WHERE test_fts MATCH ? ORDER BY rowid'
+        self.assertListEqual([(1, )], [tuple(r) for r in self.connection.execute(sql, ('title:first', ))])
+        self.assertListEqual([], self.connection.execute(sql, ('some', )).fetchall())
+        self.assertListEqual([(2, )], [tuple(r) for r in self.connection.execute(sql, ('new', ))])
+        self.assertListEqual([], self.connection.execute(sql, ('other', )).fetchall())
+
+    def test_detail_none(self):
+        fts5 = SQLiteFTS5(self.connection, 'test_fts', self.index_columns, token_table=True)
+        fts5.create_index(profile='minimal')
+        fts5.insert_many([(1, {'title': 'some title', 'text': 'some text'}), (2, {'title': 'other title'})])
+        fts5.update(1, {'text': 'new'})
+        fts5.purge_many([2])
+
+        sql = 'SELECT rowid FROM test_fts WHERE test_fts MATCH ? ORDER BY rowid'
+        self.assertListEqual([(1, )], [tuple(r) for r in self.connection.execute(sql, ('title', ))])
+        self.assertListEqual([(1, )], [tuple(r) for r in self.connection.execute(sql, ('new', ))])
+        self.assertListEqual([], self.connection.execute(sql, ('text', )).fetchall())
+        with self.assertRaises(sqlite.OperationalError):
+            self.connection.execute(sql, ('title:some', ))
+
+    def test_shadow_swap_columnsize(self):
+        for profile in ('nosize', 'minimal'):
+            with self.subTest(profile=profile):
+                fts5 = SQLiteFTS5(self.connection, f'test_{profile}', self.index_columns, token_table=True)
+                fts5.create_index(profile=profile)
+                fts5.insert(1, {'title': 'old title'})
+
+                shadow = fts5.create_shadow()
+                self.assertEqual('0', shadow.get_index_options()['columnsize'])
+                shadow.insert_many([(i, {'title': f'title {i}'}) for i in range(1, 4)])
+                with self.assertRaises(SQLiteFTS5VerificationError):
+                    fts5.swap(shadow, expected_count=4)
+                fts5.swap(shadow, expected_count=3)
+                self.assertEqual(3, fts5.count())
+
+    def test_columnsize(self):
+        for profile in ('nosize', 'minimal'):
+            with self.subTest(profile=profile):
+                fts5 = SQLiteFTS5(self.connection, f'test_{profile}', self.index_columns, token_table=True)
+                fts5.create_index(profile=profile)
+                with self.assertRaisesRegex(sqlite.OperationalError, 'does not support scanning'):
+                    self.connection.execute(f'SELECT count(*) FROM test_{profile}').fetchone()
+
+                self.assertEqual(0, fts5.count())
+                fts5.insert_many([(i, {'title': f'title {i}', 'text': 'some text'}) for i in range(1, 6)])
+                fts5.insert(6, {'title': ''})
+                fts5.delete_for(2)
+                self.assertEqual(5, fts5.count())
+                fts5.verify(5)
+                with self.assertRaises(SQLiteFTS5VerificationError):
+                    fts5.verify(6)
+
+                fts5.insert(3, {'title': 'other'})
+                broken = [r['rowid'] for r in fts5.iter_broken(chunk_size=2)]
+                # detail=none index has no offsets
+                self.assertListEqual([] if profile == 'minimal' else [3], broken)
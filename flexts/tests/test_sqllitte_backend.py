@@ -8,7 +8,8 @@ from unittest import TestCase
 
 import sqlite3 as sqlite
 
-from flexts.sqllitte_backend import InsertTrigger, TriggerBase, UpdateTrigger, DeleteTrigger, Trigger
+from flexts.sqllitte_backend import InsertTrigger, TriggerBase, UpdateTrigger, DeleteTrigger, Trigger, \
+    ChangelogInsertTrigger, ChangelogUpdateTrigger, ChangelogDeleteTrigger, ChangelogConsumer, TriggerIntegrityError
 from flexts.tests.test_sqlite_fts5 import SQLiteFTS5Util
 
 
@@ -457,3 +458,97 @@ class TestDeleteTrigger(TriggerUpdateDeleteSetupMixin, TestCase):
 
 
 
+
+
+class TestChangelogTrigger(TriggerSetupMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.triggers = [self.trigger]
+        for trg_cls in (ChangelogUpdateTrigger, ChangelogDeleteTrigger):
+            trg = trg_cls(self.con, self.tbl_name, self.col_map, self.fts_con, self.trigger.fts_driver)
+            trg.pk_name = 'id'
+            self.triggers.append(trg)
+
+        for trg in self.triggers:
+            trg.create()
+
+    def get_trigger(self) -> Trigger:
+        trg = ChangelogInsertTrigger(self.con, self.tbl_name, self.col_map, self.fts_con)
+        trg.pk_name = 'id'  # content table should have "id INTEGER PRIMARY KEY"
+        return trg
+
+    def get_log(self) -> list[tuple]:
+        sql = f'SELECT op, row_id FROM {self.trigger.get_changelog_table_name()} ORDER BY id'
+        return [tuple(r) for r in self.con.execute(sql).fetchall()]
+
+    def test_is_integrated(self):
+        for trg in self.triggers:
+            with self.subTest(trigger=trg.get_trigger_name()):
+                self.assertIsNone(trg.is_integrated(True))
+                # no sql function is needed
+                self.assertIsNone(
+                    self.con.execute(
+                        'SELECT * FROM pragma_function_list WHERE name = ?', (trg.get_sql_func_name(),)
+                    ).fetchone()
+                )
+
+        self.con.execute(f'DROP TABLE {self.trigger.get_changelog_table_name()}').close()
+        with self.assertRaises(TriggerIntegrityError):
+            self.trigger.is_integrated()
+
+    def test_changelog(self):
+        with self.con:
+            self.con.execute(f'INSERT INTO {self.tbl_name} (id, title, body) VALUES (111, \'t\', \'b\')').close()
+            self.con.execute(f'UPDATE {self.tbl_name} SET title = \'t1\' WHERE id = 111').close()
+            self.con.execute(f'UPDATE {self.tbl_name} SET id = 112 WHERE id = 111').close()
+            self.con.execute(f'DELETE FROM {self.tbl_name} WHERE id = 112').close()
+
+        exp = [('insert', 111), ('update', 111), ('update', 112), ('delete', 111), ('delete', 112)]
+        self.assertListEqual(exp, self.get_log())
+        # index was not touched
+        self.assertListEqual([], self.utl.res_from_index(111))
+
+    def test_consumer(self):
+        sql = f'INSERT INTO {self.tbl_name} (id, title, body) VALUES (?, ?, ?)'
+        with self.con:
+            for v in self.test_values[:2]:
+                self.con.execute(sql, v).close()
+
+        consumer = ChangelogConsumer(self.trigger, batch_size=1)
+        self.assertEqual(0, consumer.get_high_water())
+        self.assertEqual(2, consumer.lag())
+
+        self.assertEqual(1, consumer.consume(max_batches=1))
+        self.assertEqual(1, consumer.lag())
+        self.assertEqual(1, consumer.consume())
+        self.assertEqual(0, consumer.lag())
+        self.assertEqual(consumer.get_latest_id(), consumer.get_high_water())
+
+        tv_res, res = [], []
+        for tv in self.utl.test_values[:2]:
+            rowid = tv.pop('rowid')
+            res.extend(self.utl.res_from_index(rowid))
+            for k, v in tv.items():
+                tv_res.extend(self.utl.pretend_v(v, rowid, k))
+        self.assertListEqual(self.utl.dicts2hashes(tv_res), self.utl.dicts2hashes(res))
+
+        with self.con:
+            self.con.execute(f'UPDATE {self.tbl_name} SET body = \'new body\' WHERE id = 115').close()
+            self.con.execute(f'DELETE FROM {self.tbl_name} WHERE id = 111').close()
+        consumer.batch_size = 10
+        self.assertEqual(2, consumer.consume())
+
+        self.assertListEqual([], self.utl.res_from_index(111))
+        tv_res = self.utl.pretend_v('first second third', 115, 'title')
+        tv_res.extend(self.utl.pretend_v('new body', 115, 'content'))
+        self.assertListEqual(self.utl.dicts2hashes(tv_res), self.utl.dicts2hashes(self.utl.res_from_index(115)))
+
+        # replay from the beginning changes nothing
+        consumer.set_high_water(0)
+        self.assertEqual(4, consumer.consume())
+        self.assertListEqual(self.utl.dicts2hashes(tv_res), self.utl.dicts2hashes(self.utl.res_from_index(115)))
+        self.assertEqual(0, len(self.trigger.fts_driver.check_index_is_broken()))
+
+        self.assertEqual(4, consumer.purge())
+        self.assertListEqual([], self.get_log())
@@ -0,0 +1,65 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts/tests
+# File: test_stem_store.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 3:05 PM
+
+import os
+import tempfile
+from unittest import TestCase
+
+from flexts.stem_store import SQLiteStemStore
+
+
+class TestSQLiteStemStore(TestCase):
+
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp_dir.name, 'stems.sqlite3')
+        self.store = SQLiteStemStore(self.path)
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self._tmp_dir.cleanup()
+
+    def test_put_lookup(self):
+        self.assertDictEqual({}, self.store.lookup(['слова']))
+
+        self.store.put('слова', ('слово', ))
+        self.store.put('деякі', ('деякий', 'дея'))
+        self.store.put('english', ())
+        self.store.put('слова', ('other', ))  # first one wins
+        self.store.flush()
+
+        self.assertDictEqual(
+            {'слова': ('слово', ), 'деякі': ('деякий', 'дея'), 'english': ()},
+            self.store.lookup(['слова', 'деякі', 'english', 'unknown'])
+        )
+
+        stats = self.store.stats()
+        self.assertEqual(4, stats['queued'])
+        self.assertEqual(4, stats['written'])
+        self.assertEqual(2, stats['lookups'])
+        self.assertEqual(3, stats['found'])
+        self.assertEqual(0, stats['depth'])
+
+    def test_batched_lookup(self):
+        self.store.max_variables = 2
+        for i in range(5):
+            self.store.put(f'token{i}', (f'stem{i}', ))
+        self.store.flush()
+
+        res = self.store.lookup(f'token{i}' for i in range(5))
+        self.assertEqual(5, len(res))
+        self.assertEqual(3, self.store.stats()['lookups'])
+
+    def test_shared(self):
+        self.store.put('слова', ('слово', ))
+        self.store.close()
+
+        other = SQLiteStemStore(self.path)
+        try:
+            self.assertDictEqual({'слова': ('слово', )}, other.lookup(['слова']))
+        finally:
+            other.close()
@@ -4,9 +4,16 @@
 # File: ${FILE_NAME}
 # Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
 # Created by ox23 at 2022-11-19 (y-m-d) 6:30 AM
-from unittest import TestCase
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, mock
 
-from flexts.stemmer import HunspellStemmer
+from flexts.lexicon import compile_lexicon, Lexicon
+from flexts.stem_store import SQLiteStemStore
+from flexts import stemmer
+from flexts.stemmer import HunspellStemmer, StemCache, PyStemmerStemmer, StemmingTokenizer, ScriptRoutingStemmer
 from flexts.tests.test_parser import DOC_TEST_CONTENT, DOC_TEST_CONTENT_EXPECTED
 
 
@@ -21,3 +28,196 @@ class TestHunspellStemmer(TestCase):
         ukr_test = 'деякий Українский текст з english словами'
         ukr_test_exp = ['деякий', 'українский', 'текст', 'english', 'слово']
         self.assertListEqual(ukr_test_exp, list(self.stemmer.stems(ukr_test)))
+
+    def test_stems_cache(self):
+        HunspellStemmer.cache.clear()
+        list(self.stemmer.stems('словами словами'))
+        stats = HunspellStemmer.cache.stats()
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(1, stats['hits'])
+
+        # shared by instances
+        self.assertEqual(self.stemmer.stem('словами'), HunspellStemmer().stem('Словами'))
+        self.assertEqual(3, HunspellStemmer.cache.stats()['hits'])
+
+
+class TestStemCache(TestCase):
+
+    def test_lru(self):
+        with self.assertRaises(ValueError):
+            StemCache(0)
+
+        cache = StemCache(2)
+        cache.put('a', ('a',))
+        cache.put('b', ())
+        self.assertEqual(('a',), cache.get('a'))
+        cache.put('c', ('c',))  # 'b' is least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertDictEqual(
+            {'size': 2, 'capacity': 2, 'hits': 1, 'misses': 1, 'evictions': 1}, cache.stats()
+        )
+        cache.clear()
+        self.assertEqual(0, len(cache))
+
+
+class TestHunspellStemmerStore(TestCase):
+
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.store = SQLiteStemStore(os.path.join(self._tmp_dir.name, 'stems.sqlite3'))
+        HunspellStemmer.cache.clear()
+        HunspellStemmer.store = self.store
+        self.stemmer = HunspellStemmer()
+
+    def tearDown(self) -> None:
+        HunspellStemmer.store = None
+        HunspellStemmer.cache.clear()
+        self.store.close()
+        self._tmp_dir.cleanup()
+
+    def test_stems(self):
+        exp = list(self.stemmer.stems('деякий текст з english словами'))
+        self.store.flush()
+        self.assertEqual(4, self.store.stats()['written'])
+
+        # cold cache, warm store
+        HunspellStemmer.cache.clear()
+        with mock.patch.object(HunspellStemmer, 'stemmer') as hs:
+            self.assertListEqual(exp, list(self.stemmer.stems('деякий текст з english словами')))
+            hs.stem.assert_not_called()
+        self.assertEqual(2, self.store.stats()['lookups'])
+
+
+class TestHunspellStemmerLexicon(TestCase):
+
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self._tmp_dir.name, 'uk.lex')
+        compile_lexicon([('словами', ['слово'])], path)
+        HunspellStemmer.cache.clear()
+        HunspellStemmer.lexicon = Lexicon(path)
+        self.stemmer = HunspellStemmer()
+
+    def tearDown(self) -> None:
+        HunspellStemmer.lexicon.close()
+        HunspellStemmer.lexicon = None
+        HunspellStemmer.cache.clear()
+        self._tmp_dir.cleanup()
+
+    def test_stems(self):
+        with mock.patch.object(HunspellStemmer, 'stemmer') as hs:
+            hs.stem.return_value = ['текст'.encode('utf-8')]
+            self.assertListEqual(['текст', 'слово'], list(self.stemmer.stems('тексти словами')))
+            # Hunspell is the fallback for words that are not in lexicon
+            hs.stem.assert_called_once_with('тексти')
+            self.assertListEqual(['слово', 'з', 'текст'], self.stemmer.stem_words(['Словами', 'з', 'тексти']))
+            hs.stem.assert_called_once_with('тексти')  # cached
+
+    def test_prefetch_without_store(self):
+        self.assertIsNone(HunspellStemmer.store)
+        self.stemmer.prefetch(['словами', 'тексти'])
+        self.assertEqual(('слово', ), HunspellStemmer.cache.get('словами'))
+        self.assertIsNone(HunspellStemmer.cache.get('тексти'))
+
+
+class TestBackendRegistry(TestCase):
+
+    name = 'test_backend'
+
+    def setUp(self) -> None:
+        self.created = []
+        stemmer.register_backend(self.name, lambda: self.created.append(object()) or self.created[-1])
+
+    def tearDown(self) -> None:
+        stemmer.backend_factories.pop(self.name)
+        stemmer._backends.pop(self.name, None)
+
+    def test_lazy(self):
+        class Holder:
+            backend = stemmer.LazyBackend(self.name)
+
+        self.assertFalse(stemmer.is_loaded(self.name))
+        self.assertListEqual([], self.created)
+        self.assertIs(Holder.backend, Holder().backend)
+        self.assertEqual(1, len(self.created))
+        self.assertTrue(stemmer.is_loaded(self.name))
+
+        with self.assertRaises(ValueError):
+            stemmer.get_backend('not_registered')
+
+    def test_warmup(self):
+        self.assertListEqual([self.name], stemmer.warmup([self.name]))
+        self.assertTrue(stemmer.is_loaded(self.name))
+        self.assertIs(self.created[0], stemmer.get_backend(self.name))
+        self.assertEqual(1, len(self.created))
+
+    def test_import_does_not_load(self):
+        for name in ('hunspell_uk_UA', 'snowball_english', 'pystemmer_english', 'pystemmer_russian'):
+            with self.subTest(backend=name):
+                self.assertIn(name, stemmer.backend_factories)
+        # clean interpreter, other tests could load the backends already
+        code = 'import sys, flexts.stemmer as s; s.HunspellStemmer(); ' \
+               'print(sorted(m for m in ("hunspell", "Stemmer", "snowballstemmer") if m in sys.modules))'
+        res = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual('[]', res.stdout.strip())
+
+
+class TestPyStemmerStemmer(TestCase):
+
+    def test_stem_words(self):
+        stemmer = PyStemmerStemmer('english')
+        self.assertListEqual(['rat', 'run', 'word'], stemmer.stem_words(['Rats', 'running', 'words']))
+        self.assertEqual('rat', stemmer.stem('rats'))
+        self.assertListEqual(['кошк'], PyStemmerStemmer('russian').stem_words(['кошками']))
+
+
+class TestStemmingTokenizer(TestCase):
+
+    def test_iter(self):
+        class Stemmer:
+            calls = []
+
+            def stem_words(self, tokens):
+                self.calls.append(tokens)
+                return [t.rstrip('s') for t in tokens]
+
+        tokenizer = StemmingTokenizer('Rats, cats and 11', str.lower, Stemmer())
+        self.assertListEqual(['rat', 'cat', 'and', '11'], [*tokenizer])
+        self.assertListEqual([['rats', 'cats', 'and', '11']], Stemmer.calls)
+
+        tokenizer.stemmer = None
+        self.assertListEqual(['rats', 'cats', 'and', '11'], [*tokenizer])
+
+
+class TestScriptRoutingStemmer(TestCase):
+
+    def setUp(self) -> None:
+        self.cyrillic = mock.Mock()
+        self.cyrillic.stem_words.side_effect = lambda tokens: [t[:-1] for t in tokens]
+        self.stemmer = ScriptRoutingStemmer(cyrillic=self.cyrillic)
+
+    def test_classify(self):
+        for token, cls in (('11111', 'digit'), ('entryid', 'latin'), ('entry_id111', 'latin'),
+                           ('для', 'cyrillic'), ('ґанок', 'cyrillic'), ('café', 'other')):
+            with self.subTest(token=token):
+                self.assertEqual(cls, self.stemmer.classify(token))
+
+    def test_stem_words(self):
+        tokens = ['11111', 'Some', 'body', 'texts', 'для', 'entryid', '111', 'словами', 'Café', 'University']
+        res = self.stemmer.stem_words(tokens)
+        self.assertListEqual(
+            ['11111', 'some', 'bodi', 'text', 'дл', 'entryid', '111', 'словам', 'café', 'universiti'], res
+        )
+        # one call per class, only cyrillic tokens reach cyrillic stemmer
+        self.cyrillic.stem_words.assert_called_once_with(['для', 'словами'])
+        self.assertDictEqual({'digit': 2, 'latin': 5, 'cyrillic': 2, 'other': 1}, self.stemmer.stats())
+
+    def test_other_pass_through(self):
+        tokens = ['café', 'Αθήνα', 'naïve']
+        self.assertListEqual(['café', 'αθήνα', 'naïve'], self.stemmer.stem_words(tokens))
+        self.cyrillic.stem_words.assert_not_called()
+        self.assertEqual(3, self.stemmer.stats()['other'])
+
+    def test_latin_fixed_point(self):
+        res = self.stemmer.stem_words(['university', 'universities'])
+        self.assertListEqual(res, self.stemmer.stem_words(res))
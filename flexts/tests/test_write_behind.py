@@ -0,0 +1,174 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts/tests
+# File: test_write_behind.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 9:48 AM
+
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+import sqlite3 as sqlite
+
+from flexts.sqllitte_backend import InsertTrigger, UpdateTrigger, DeleteTrigger
+from flexts.tests.test_sqlite_fts5 import SQLiteFTS5Util
+from flexts.write_behind import WriteBehindIndexer, IndexQueueFullError, IndexerError
+
+
+class BlockingDriver:
+
+    def __init__(self) -> None:
+        self.release = threading.Event()
+        self.items = []
+
+    def insert(self, rowid, data):
+        pass
+
+    def insert_many(self, items, commit_every=None):
+        self.release.wait(5)
+        self.items.extend(items)
+        return len(items)
+
+    def update(self, rowid, data):
+        pass
+
+    def update_many(self, items, commit_every=None):
+        raise ValueError('update failed')
+
+
+class TestWriteBehindIndexer(TestCase):
+
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.con: sqlite.Connection = sqlite.connect(':memory:')
+        # background thread opens own connection to index file
+        self.fts_con: sqlite.Connection = sqlite.connect(os.path.join(self._tmp_dir.name, 'fts.sqlite3'))
+        self.tbl_name = 'test_tbl'
+        self.col_map = {'id': 'rowid', 'title': 'title', 'body': 'content'}
+        self.indexer = WriteBehindIndexer(maxsize=100, batch_size=10)
+
+        self.con.execute(f'CREATE TABLE {self.tbl_name} (id INTEGER PRIMARY KEY, title TEXT, body TEXT)').close()
+
+        self.triggers = []
+        driver = None
+        for trg_cls in (InsertTrigger, UpdateTrigger, DeleteTrigger):
+            trg = trg_cls(self.con, self.tbl_name, self.col_map, self.fts_con, driver)
+            trg.pk_name = 'id'
+            trg.indexer = self.indexer
+            driver = trg.fts_driver
+            self.triggers.append(trg)
+
+        driver.create_index()
+        for trg in self.triggers:
+            trg.create()
+
+        self.utl = SQLiteFTS5Util(self.fts_con, driver.index_name, self.col_map.values(), [])
+
+    def tearDown(self) -> None:
+        self.indexer.stop()
+        self.con.close()
+        self.fts_con.close()
+        self._tmp_dir.cleanup()
+
+    def test_insert_update_delete(self):
+        sql = f'INSERT INTO {self.tbl_name} (id, title, body) VALUES (?, ?, ?)'
+        with self.con:
+            for i in range(1, 31):
+                self.con.execute(sql, (i, f'title {i}', f'body of row {i}')).close()
+        with self.con:
+            self.con.execute(f'UPDATE {self.tbl_name} SET body = ? WHERE id = 2', ('new body',)).close()
+            self.con.execute(f'DELETE FROM {self.tbl_name} WHERE id = 3').close()
+
+        self.assertTrue(self.indexer.flush(5))
+
+        exp = self.utl.pretend_v('title 2', 2, 'title')
+        exp.extend(self.utl.pretend_v('new body', 2, 'content'))
+        self.assertListEqual(self.utl.dicts2hashes(exp), self.utl.dicts2hashes(self.utl.res_from_index(2)))
+        self.assertListEqual([], self.utl.res_from_index(3))
+
+        stats = self.indexer.stats()
+        self.assertEqual(32, stats['enqueued'])
+        self.assertEqual(32, stats['applied'])
+        self.assertEqual(0, stats['failed'])
+        self.assertEqual(0, stats['depth'])
+        self.assertGreaterEqual(stats['batches'], 4)  # batch_size is 10
+
+    def test_own_connection(self):
+        driver = self.triggers[0].fts_driver
+        sql = f'INSERT INTO {self.tbl_name} (id, title, body) VALUES (?, \'title\', \'body\')'
+        with self.con:
+            self.con.execute(sql, (1, )).close()
+        self.assertTrue(self.indexer.flush(5))
+
+        # transaction of caller on index connection is not committed by background thread, it waits for lock
+        self.fts_con.execute(f'INSERT INTO {driver.index_name} (rowid, title) VALUES (100, \'pending\')').close()
+        with self.con:
+            self.con.execute(sql, (2, )).close()
+        self.assertFalse(self.indexer.flush(.2))
+        self.assertTrue(self.fts_con.in_transaction)
+        self.fts_con.rollback()
+        self.assertTrue(self.indexer.flush(5))
+
+        self.assertTrue(self.utl.res_from_index(1))
+        self.assertTrue(self.utl.res_from_index(2))
+        self.assertListEqual([], self.utl.res_from_index(100))
+        self.assertEqual(0, driver.generation)
+
+        self.indexer.stop()
+        # connections of background thread are closed
+        self.assertListEqual([], self.indexer._connections)
+
+    def test_in_memory_database(self):
+        fts_con = sqlite.connect(':memory:')
+        try:
+            driver = self.triggers[0].fts_driver.with_connection(lambda con: fts_con)
+            driver.create_index()
+            with self.assertRaises(IndexerError):
+                self.indexer.put(driver.insert, 1, {'title': 'title'})
+        finally:
+            fts_con.close()
+
+    def test_backpressure_raise(self):
+        driver = BlockingDriver()
+        indexer = WriteBehindIndexer(maxsize=1, batch_size=1, backpressure='raise')
+        try:
+            indexer.put(driver.insert, 1, {})  # it is taken by the thread that is blocked
+            for i in range(2, 10):
+                try:
+                    indexer.put(driver.insert, i, {})
+                except IndexQueueFullError:
+                    break
+            else:
+                self.fail('IndexQueueFullError was not raised')
+            self.assertEqual(1, indexer.stats()['rejected'])
+        finally:
+            driver.release.set()
+            indexer.stop()
+        self.assertEqual(i - 1, len(driver.items))
+
+    def test_backpressure_block_timeout(self):
+        driver = BlockingDriver()
+        indexer = WriteBehindIndexer(maxsize=1, batch_size=1, put_timeout=.05)
+        try:
+            with self.assertRaises(IndexQueueFullError):
+                for i in range(10):
+                    indexer.put(driver.insert, i, {})
+            self.assertGreaterEqual(indexer.stats()['blocked'], 1)
+        finally:
+            driver.release.set()
+            indexer.stop()
+
+    def test_flush_raises_error(self):
+        driver = BlockingDriver()
+        driver.release.set()
+        indexer = WriteBehindIndexer()
+        try:
+            indexer.put(driver.update, 1, {})
+            with self.assertRaises(IndexerError):
+                indexer.flush(5)
+            self.assertTrue(indexer.flush(5))  # error is reported only once
+            self.assertEqual(1, indexer.stats()['failed'])
+        finally:
+            indexer.stop()
@@ -0,0 +1,252 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: flexts
+# File: write_behind.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 9:12 AM
+
+import queue
+import threading
+import time
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Union
+
+import sqlite3 as sqlite
+
+from flexts.connection_factory import SQLiteConnectionFactory
+
+
+class IndexQueueFullError(Exception):
+    pass
+
+
+class IndexerError(Exception):
+    pass
+
+
+class WriteBehindIndexer:
+    """
+        Asynchronous (write-behind) replication into the fts index.
+
+        Trigger's sql function only puts (handler, rowid, data) into the bounded queue and returns.
+        Background thread drains the queue and applies the items in batches.
+        Each consecutive run of the same handler inside batch is applied via corresponding bulk method
+        of the driver in one transaction, for example SQLiteFTS5.insert -> SQLiteFTS5.insert_many.
+
+        Background thread writes via own connections, so it never commits or rolls back transactions of
+        the connections that the drivers are used by. Driver of handler is copied on first put
+        (see SQLiteFTS5.with_connection), its connection is opened to the same database file by
+        connection_factory ('write' profile) and it is used by background thread only. The connections are
+        closed by stop. Database that is not a file (in-memory) can't be indexed this way.
+        Handler of object that has no with_connection (it has no connection) is called as is.
+
+        backpressure - what to do if queue is full
+            'block' - wait for a free slot (not longer than put_timeout if it is defined) then raise IndexQueueFullError
+            'raise' - raise IndexQueueFullError immediately
+
+        If put is called inside of sql function then IndexQueueFullError fails the content's statement.
+    """
+
+    backpressure_policies = ('block', 'raise')
+
+    def __init__(self, maxsize: int = 10000, batch_size: int = 500, backpressure: str = 'block',
+                 put_timeout: float = None, poll_interval: float = .05,
+                 connection_factory: SQLiteConnectionFactory = None) -> None:
+        if backpressure not in self.backpressure_policies:
+            raise ValueError(f'unknown backpressure policy "{backpressure}"')
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.backpressure = backpressure
+        self.put_timeout = put_timeout
+        self.poll_interval = poll_interval
+        self.connection_factory = connection_factory or SQLiteConnectionFactory()
+
+        self._queue = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+        self._lock = threading.Lock()
+        self._error: Union[Exception, None] = None
+        # drivers of background thread: {id(driver): (driver, driver of thread)} and their connections
+        self._drivers = {}
+        self._connections: list[sqlite.Connection] = []
+        self._stats = {
+            'enqueued': 0,
+            'applied': 0,
+            'failed': 0,
+            'batches': 0,
+            'blocked': 0,
+            'rejected': 0,
+            'max_depth': 0,
+            'last_batch_size': 0,
+            'last_batch_seconds': 0.0,
+        }
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self) -> dict:
+        with self._lock:
+            res = dict(self._stats)
+        res['depth'] = self.depth
+        return res
+
+    def _inc(self, **counters):
+        with self._lock:
+            for k, v in counters.items():
+                self._stats[k] += v
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f'{self.__class__.__name__}', daemon=True)
+            self._thread.start()
+
+    def stop(self, drain=True, timeout: float = None):
+        """
+            Stops background thread. If drain is True then all queued items will be applied before.
+        """
+        if drain and self.is_alive():
+            self.flush(timeout, raise_error=False)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._lock:
+            self._drivers = {}
+            connections, self._connections = self._connections, []
+        for con in connections:
+            con.close()
+
+    def put(self, handler: Callable, rowid, data: dict):
+        """
+            handler - bound method of driver (SQLiteFTS5.insert, SQLiteFTS5.update, SQLiteFTS5.delete_for ...)
+            Driver must have the bulk method with same name and suffix '_many'.
+        """
+        if not self.is_alive():
+            self.start()
+
+        item = (getattr(self.get_driver(handler.__self__), handler.__name__), rowid, data)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.backpressure == 'raise':
+                self._inc(rejected=1)
+                raise IndexQueueFullError(f'indexing queue is full ({self.maxsize} items)')
+
+            self._inc(blocked=1)
+            try:
+                self._queue.put(item, timeout=self.put_timeout)
+            except queue.Full:
+                self._inc(rejected=1)
+                raise IndexQueueFullError(f'indexing queue is full ({self.maxsize} items) during {self.put_timeout}s')
+
+        depth = self.depth
+        with self._lock:
+            self._stats['enqueued'] += 1
+            if depth > self._stats['max_depth']:
+                self._stats['max_depth'] = depth
+
+    def flush(self, timeout: float = None, raise_error=True) -> bool:
+        """
+            Waits until all queued items will be applied.
+            Returns False if timeout expired.
+            If any batch failed since last flush then IndexerError will raised (if raise_error)
+        """
+        q = self._queue
+        end = None if timeout is None else time.monotonic() + timeout
+        with q.all_tasks_done:
+            while q.unfinished_tasks:
+                if end is None:
+                    q.all_tasks_done.wait()
+                    continue
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                q.all_tasks_done.wait(remaining)
+
+        with self._lock:
+            error, self._error = self._error, None
+        if error is not None and raise_error:
+            raise IndexerError(f'indexing batch failed: {error}') from error
+        return True
+
+    def _get_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=self.poll_interval)]
+        except queue.Empty:
+            return []
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def connect(self, con: sqlite.Connection) -> sqlite.Connection:
+        """
+            Opens connection of background thread to the main database of con (it is called by the thread of con)
+        """
+        cursor = con.execute('PRAGMA database_list')
+        try:
+            path = next((r[2] for r in cursor.fetchall() if r[1] == 'main'), None)
+        finally:
+            cursor.close()
+        if not path:
+            raise IndexerError('database that is not a file can not be opened by background thread')
+        res = self.connection_factory.connect(path, 'write', check_same_thread=False)
+        self._connections.append(res)
+        return res
+
+    def get_driver(self, driver):
+        """
+            Returns copy of driver that uses own connection of background thread
+        """
+        with self._lock:
+            res = self._drivers.get(id(driver))
+            if res is None:
+                with_connection = getattr(driver, 'with_connection', None)
+                res = (driver, driver if with_connection is None else with_connection(self.connect))
+                # original driver is kept, so its id is not reused
+                self._drivers[id(driver)] = res
+        return res[1]
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._get_batch()
+            if not batch:
+                continue
+            try:
+                self.apply(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def apply(self, batch: list):
+        start = time.perf_counter()
+        for handler, group in groupby(batch, key=itemgetter(0)):
+            items = [(rowid, data) for _, rowid, data in group]
+            try:
+                bulk_handler = getattr(handler.__self__, f'{handler.__name__}_many')
+                bulk_handler(items, commit_every=len(items))
+            except Exception as exc:
+                with self._lock:
+                    self._error = exc
+                self._inc(failed=len(items))
+            else:
+                self._inc(applied=len(items))
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['last_batch_size'] = len(batch)
+            self._stats['last_batch_seconds'] = time.perf_counter() - start
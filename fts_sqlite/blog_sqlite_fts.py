@@ -6,14 +6,28 @@
 # Created by ox23 at 2022-12-05 (y-m-d) 7:09 AM
 
 
+import asyncio
+import heapq
+import json
 import sqlite3 as sqlite
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from functools import partial
-from typing import Callable, Union, Optional
+from pathlib import Path
+from typing import AsyncGenerator, Callable, Generator, Iterable, Union, Optional, Sequence
 from urllib import parse
 
+from flexts.connection_factory import SQLiteConnectionFactory
+from flexts.connection_pool import SQLiteConnectionPool, QueryInterrupter
+from flexts.fts5_tokenizer import get_tokenizer, register_tokenizer
+from flexts.result_cache import ResultCache
+from flexts.sharded_fts5 import ShardedSQLiteFTS5
 from flexts.sqlite_fts5 import SQLiteFTS5
-from flexts.sqllitte_backend import InsertTrigger, UpdateTrigger, DeleteTrigger, Trigger, TriggerIntegrityError
-from flexts.stemmer import SimpleTokenizer
+from flexts.sqllitte_backend import InsertTrigger, UpdateTrigger, DeleteTrigger, Trigger, TriggerIntegrityError, \
+    ChangelogInsertTrigger, ChangelogUpdateTrigger, ChangelogDeleteTrigger, ChangelogConsumer
+from flexts.stemmer import SimpleTokenizer, StemmingTokenizer, BatchStemmer
+from flexts.write_behind import WriteBehindIndexer
 
 
 def get_db_info(con: sqlite.Connection, schema_name: str):
@@ -78,17 +92,34 @@ class BlogDeleteTrigger(DeleteTrigger):
     pk_name = 'id'
 
 
+class BlogChangelogInsertTrigger(ChangelogInsertTrigger):
+    pk_name = 'id'
+
+
+class BlogChangelogUpdateTrigger(ChangelogUpdateTrigger):
+    pk_name = 'id'
+
+
+class BlogChangelogDeleteTrigger(ChangelogDeleteTrigger):
+    pk_name = 'id'
+
+
 class BlogTriggersBase:
     table_name: str = None
     column_map: dict = None
 
     trigger_classes = (BlogInsertTrigger, BlogUpdateTrigger, BlogDeleteTrigger)
+    changelog_trigger_classes = (BlogChangelogInsertTrigger, BlogChangelogUpdateTrigger, BlogChangelogDeleteTrigger)
 
-    def __init__(self, con: sqlite.Connection, fts_con: sqlite.Connection, fts_driver: SQLiteFTS5 = None) -> None:
+    def __init__(self, con: sqlite.Connection, fts_con: sqlite.Connection, fts_driver: SQLiteFTS5 = None,
+                 indexer: WriteBehindIndexer = None, changelog: bool = False) -> None:
         self._triggers = []
+        self.changelog = changelog
         fts_drv = fts_driver
-        for i, trg_cls in enumerate(self.trigger_classes):
+        trigger_classes = self.changelog_trigger_classes if changelog else self.trigger_classes
+        for i, trg_cls in enumerate(trigger_classes):
             trg = trg_cls(con, self.table_name, self.column_map, fts_con, fts_drv)
+            trg.indexer = indexer
             self._triggers.append(trg)
             # one driver for all index triggers
             if i == 0:
@@ -98,6 +129,23 @@ class BlogTriggersBase:
     def triggers(self) -> list[Trigger]:
         return self._triggers
 
+    @property
+    def fts_driver(self) -> SQLiteFTS5:
+        return self.triggers[0].fts_driver
+
+    def get_changelog_consumer(self, batch_size: int = 500, state_name: str = None) -> ChangelogConsumer:
+        if not self.changelog:
+            raise ValueError(f'{self.__class__.__name__} was not created in changelog mode')
+        return ChangelogConsumer(self.triggers[0], batch_size, state_name=state_name)
+
+    def drop_replication_triggers(self):
+        """
+            Drops triggers that call python sql function (default flavour) if they exist
+        """
+        trg = self.triggers[0]
+        for trg_cls in self.trigger_classes:
+            trg_cls(trg.con, self.table_name, self.column_map, trg.fts_con, trg.fts_driver).drop()
+
     @property
     def fts_table_name(self) -> str:
         res = {t.get_fts_table_name() for t in self.triggers}
@@ -142,7 +190,8 @@ class IndexedDatabase:
     attach_as = 'blog'  # it is as (schema name) con will attached to fts_con
 
     def __init__(self, con: sqlite.Connection, fts_con: sqlite.Connection,
-                 con_url: str = None, attach_as: str = None) -> None:
+                 con_url: str = None, attach_as: str = None, shards: Sequence[sqlite.Connection] = None,
+                 connection_factory: SQLiteConnectionFactory = None) -> None:
         # for each trigger execute is_integrated() with catching TriggerIntegrityError ()
         # 1. Each trigger need to create only once
         # 2. make ensure - trigger - exists -> (will exists after first creation. it persisted in db.sqlite file)
@@ -151,18 +200,27 @@ class IndexedDatabase:
         self.con = con
         self.con_url = con_url
         self.fts_con = fts_con
+        # connections of index databases besides fts_con, each of them has the content attached too
+        self.shards = [*(shards or ())]
         self.attach_as = attach_as or self.attach_as
+        # opens connections of index databases with pragma profiles (see open_read_pools)
+        self.connection_factory = connection_factory or SQLiteConnectionFactory()
 
         self.attach_to_content()
         if not self.is_attached():
             raise AssertionError(f'Index has no attached cto content as "{self.attach_as}"')
 
+    @property
+    def fts_cons(self) -> list[sqlite.Connection]:
+        return [self.fts_con, *self.shards]
+
     def is_attached(self):
-        return is_attached(self.fts_con, self.attach_as)
+        return all(is_attached(fts_con, self.attach_as) for fts_con in self.fts_cons)
 
     def attach_to_content(self):
-        if not self.is_attached():
-            attach(self.fts_con, self.con_url or self.con, self.attach_as)
+        for fts_con in self.fts_cons:
+            if not is_attached(fts_con, self.attach_as):
+                attach(fts_con, self.con_url or self.con, self.attach_as)
 
 
 class BlogFTSIndex(IndexedDatabase):
@@ -185,16 +243,261 @@ class BlogFTSIndex(IndexedDatabase):
     """
     tokenizer_class = SimpleTokenizer
     tokenizer_filter: Optional[Callable] = str.lower.__call__
+    # max number of queries that async methods (amatch ...) run at once
+    async_workers = 4
+    # default page size if only page is defined (see limit_sql)
+    per_page = 20
 
     def __init__(self, con: sqlite.Connection, fts_con: sqlite.Connection, con_url: str = None,
-                 attach_as: str = None) -> None:
-        super().__init__(con, fts_con, con_url, attach_as)
+                 attach_as: str = None, indexer: WriteBehindIndexer = None, changelog: bool = False,
+                 tokenize: str = None, token_table: bool = False, index_mode: str = None,
+                 profile: str = None, shards: Sequence[sqlite.Connection] = None, partition: str = 'hash',
+                 bounds: Sequence[int] = None, connection_factory: SQLiteConnectionFactory = None) -> None:
+        """
+            indexer - if it is defined then index is updated asynchronously (write-behind) by indexer's thread
+            via its own connections to the index database files (see WriteBehindIndexer).
+
+            changelog - if True then content tables get the triggers that only log changes into changelog tables
+            (see ChangelogTrigger), and index is updated by consume_changelog().
+            Triggers of default flavour (python sql function) are dropped in this case.
+
+            tokenize - value of fts5 tokenize option for indexes that will be created, for example 'hunspell_ua'
+            (see flexts.fts5_tokenizer). Existing indexes keep their tokenizer.
+
+            token_table - indexes that will be created keep written text for each (rowid, column) in side table,
+            so deletes and updates do not scan fts5vocab (see SQLiteFTS5 token_table).
+
+            index_mode - mode of indexes that will be created, 'contentless', 'contentless_delete' or 'auto'
+            (see SQLiteFTS5 index_modes). 'external' is not supported because content tables are in attached
+            database and FTS5 can't use external content table of other database.
+
+            profile - storage profile of indexes that will be created (see SQLiteFTS5.storage_profiles).
+            Profiles with detail=none are not supported because match queries use column filters.
+
+            shards - connections of additional index databases. If they are defined then each index is
+            partitioned by rowid across fts_con and shards (see ShardedSQLiteFTS5, partition and bounds),
+            writes go to the shard that owns rowid and match queries all shards concurrently.
+            fts_con is queried by calling thread, shards by thread pool, so they should be created
+            with check_same_thread=False.
+
+            connection_factory - opens connections that index creates itself (see open_read_pools),
+            SQLiteConnectionFactory with default pragma profiles if it is not defined.
+        """
+        if changelog and indexer is not None:
+            raise ValueError('indexer has no sense in changelog mode')
+        if index_mode == 'external':
+            raise ValueError('external content index mode is not supported for attached content database')
+
+        super().__init__(con, fts_con, con_url, attach_as, shards, connection_factory)
+
+        self.indexer = indexer
+        self.changelog = changelog
+        fts_extra = SQLiteFTS5.get_profile_options(profile) if profile else {}
+        if str(fts_extra.get('detail', 'full')).lower() == 'none':
+            raise ValueError(f'storage profile "{profile}" (detail=none) does not support column filters')
+        if tokenize:
+            fts_extra['tokenize'] = tokenize
+        self.fts_extra = fts_extra or None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._async_executor: Optional[ThreadPoolExecutor] = None
+        # cache of match results (see open_result_cache)
+        self.result_cache: Optional[ResultCache] = None
+        self._version_cons: list[sqlite.Connection] = []
+        self._version_lock = threading.Lock()
+        # pools of read connections for each of fts_cons (see open_read_pools)
+        self.read_pools: list[SQLiteConnectionPool] = []
+        self._lock = threading.Lock()
+        self.entry_triggers = EntryTriggers(
+            con, fts_con, self._get_sharded_driver(EntryTriggers, partition, bounds),
+            indexer=indexer, changelog=changelog
+        )
+        self.entry_text_triggers = EntryTextTriggers(
+            con, fts_con, self._get_sharded_driver(EntryTextTriggers, partition, bounds),
+            indexer=indexer, changelog=changelog
+        )
+
+        for trg_group in (self.entry_triggers, self.entry_text_triggers):
+            if not trg_group.fts_driver.check_index():
+                if token_table:
+                    trg_group.fts_driver.token_table = True
+                trg_group.fts_driver.set_index_mode(index_mode)
+            if changelog:
+                trg_group.drop_replication_triggers()
+            for trg in trg_group.triggers:
+                self.resolve_trigger_integrity(trg)
+
+    def _get_sharded_driver(self, trg_group_class: type[BlogTriggersBase], partition: str,
+                            bounds: Sequence[int] = None) -> Optional[ShardedSQLiteFTS5]:
+        if not self.shards:
+            return None
+        return ShardedSQLiteFTS5(
+            self.fts_cons, f'{trg_group_class.table_name}{Trigger.fts_table_name_suffix}',
+            trg_group_class.column_map.values(), partition=partition, bounds=bounds
+        )
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        """
+            Thread pool that runs match queries of shards, one thread per shard
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(len(self.shards), thread_name_prefix=self.__class__.__name__)
+        return self._executor
+
+    def get_async_executor(self) -> ThreadPoolExecutor:
+        """
+            Bounded thread pool of async methods, event loop is never blocked by query
+        """
+        with self._lock:
+            if self._async_executor is None:
+                self._async_executor = ThreadPoolExecutor(
+                    self.async_workers, thread_name_prefix=f'{self.__class__.__name__}Async'
+                )
+        return self._async_executor
+
+    def get_tokenizer_names(self) -> list[str]:
+        """
+            Returns names of custom tokenizers of indexes, builtin tokenizers are skipped
+        """
+        names = []
+        for trg_group in (self.entry_triggers, self.entry_text_triggers):
+            name = trg_group.fts_driver.get_tokenizer_name()
+            if name and name not in SQLiteFTS5.builtin_tokenizers and name not in names:
+                names.append(name)
+        return names
+
+    def prepare_read_connection(self, con: sqlite.Connection, tokenizer_names: Iterable[str] = None):
+        """
+            Prepares connection to index database for match queries: content is attached,
+            custom tokenizers of indexes are registered and writes are forbidden (query_only)
 
-        self.entry_triggers = EntryTriggers(con, fts_con)
-        self.entry_text_triggers = EntryTextTriggers(con, fts_con)
+            tokenizer_names - get_tokenizer_names() by default, it reads index definitions via fts_con,
+                so it must be passed if connection is prepared by other thread
+        """
+        attach(con, self.con_url or self.con, self.attach_as)
+        con.row_factory = self.fts_con.row_factory
+        for name in self.get_tokenizer_names() if tokenizer_names is None else tokenizer_names:
+            register_tokenizer(con, name)
+        con.execute('PRAGMA query_only(1)').close()
+
+    def open_read_pools(self, prepare: Callable[[sqlite.Connection], None] = None, profile: str = 'read',
+                        **pool_kwargs) -> list[SQLiteConnectionPool]:
+        """
+            Opens pool of read-only connections for each index database (fts_con and shards),
+            so match can be called by several threads at once. Index databases must be files.
 
-        for trg in (*self.entry_triggers.triggers, *self.entry_text_triggers.triggers):
-            self.resolve_trigger_integrity(trg)
+            prepare - additional preparation of new connection (called after prepare_read_connection)
+            profile - pragma profile of connections (see connection_factory)
+            pool_kwargs - see SQLiteConnectionPool (min_size, max_size, health_check_interval, max_uses ...)
+        """
+        # index definitions are read via fts_con, so by this thread instead of threads of pools
+        tokenizer_names = self.get_tokenizer_names()
+        self.load_tokenizer()
+
+        def _prepare(con: sqlite.Connection):
+            self.prepare_read_connection(con, tokenizer_names)
+            if prepare is not None:
+                prepare(con)
+
+        self.close_read_pools()
+        self.read_pools = [
+            SQLiteConnectionPool(
+                partial(self.connection_factory.connect, f'{Path(get_con_uri(fts_con)).as_uri()}?mode=ro', profile,
+                        check_same_thread=False, uri=True),
+                _prepare, **pool_kwargs
+            )
+            for fts_con in self.fts_cons
+        ]
+        return self.read_pools
+
+    def close_read_pools(self):
+        pools, self.read_pools = self.read_pools, []
+        for pool in pools:
+            pool.close()
+
+    def open_result_cache(self, max_size: int = 1024, ttl: float = None) -> ResultCache:
+        """
+            Enables LRU cache of match/amatch results (see ResultCache). Key is match expression (the result of
+            handler) and pagination arguments. Cached result is valid while index generation is the same
+            (see get_generation).
+        """
+        self.close_result_cache()
+        self._version_cons = [self._open_version_con(fts_con) for fts_con in self.fts_cons]
+        self.result_cache = ResultCache(max_size, ttl)
+        return self.result_cache
+
+    def _open_version_con(self, fts_con: sqlite.Connection) -> sqlite.Connection:
+        """
+            data_version of connection is changed by commits of other connections only,
+            so it is own connection that is shared by threads (under lock)
+        """
+        try:
+            uri = get_con_uri(fts_con)
+        except ValueError:
+            # database is not a file, it can be changed by fts_con only, its writes are counted by drivers
+            return fts_con
+        return self.connection_factory.connect(
+            f'{Path(uri).as_uri()}?mode=ro', 'read', check_same_thread=False, uri=True
+        )
+
+    def close_result_cache(self):
+        for con in self._version_cons:
+            if all(con is not fts_con for fts_con in self.fts_cons):
+                con.close()
+        self._version_cons = []
+        self.result_cache = None
+
+    def get_generation(self) -> tuple:
+        """
+            Returns generations of index drivers (writes of this process) and data_version of each index
+            database (commits of other connections and processes, see open_result_cache)
+        """
+        versions = []
+        with self._version_lock:
+            for con in self._version_cons:
+                cursor = con.execute('PRAGMA data_version')
+                try:
+                    versions.append(cursor.fetchone()[0])
+                finally:
+                    cursor.close()
+        return self.entry_triggers.fts_driver.generation, self.entry_text_triggers.fts_driver.generation, \
+            tuple(versions)
+
+    def _cached(self, s: str, h: Callable, page: int = None, per_page: int = None,
+                after: tuple[float, int] = None) -> tuple:
+        """
+            Returns (result or ResultCache.miss, h, put), where h is the handler that returns the already
+            computed match expression (handler is called once) and put(result) stores result into cache.
+        """
+        expr = h(s)
+        key = (expr, page, per_page, None if after is None else tuple(after))
+        generation = self.get_generation()
+        res = self.result_cache.get(key, generation)
+        if res is not ResultCache.miss:
+            res = list(res)
+        return res, lambda _: expr, partial(self.result_cache.put, key, generation)
+
+    def close(self):
+        """
+            Shuts down thread pool of shard queries, closes read pools and result cache,
+            fts_con and shards are not closed
+        """
+        for executor in (self._executor, self._async_executor):
+            if executor is not None:
+                executor.shutdown()
+        self._executor = self._async_executor = None
+        self.close_read_pools()
+        self.close_result_cache()
+
+    def consume_changelog(self, batch_size: int = 500, max_batches: int = None) -> int:
+        """
+            Applies changelogs of both content tables to the indexes.
+            Returns number of consumed changelog records.
+        """
+        total = 0
+        for trg_group in (self.entry_triggers, self.entry_text_triggers):
+            total += trg_group.get_changelog_consumer(batch_size).consume(max_batches)
+        return total
 
     def resolve_trigger_integrity(self, trigger: Trigger):
 
@@ -202,7 +505,7 @@ class BlogFTSIndex(IndexedDatabase):
             'content_table': None,
             'trigger': [0, trigger._create_trigger],
             'sql_function': [0, trigger.register_sql_func],
-            'fts_table': [0, trigger.fts_driver.create_index]
+            'fts_table': [0, partial(trigger.fts_driver.create_index, self.fts_extra)]
         }
 
         res = False
@@ -223,11 +526,10 @@ class BlogFTSIndex(IndexedDatabase):
             else:
                 res = True
 
-    def limit_sql(self) -> str:
+    def limit_sql(self, page: int = None, per_page: int = None) -> str:
         """
-            TODO: Need to be implemented
             page = [1..n]
-            per_page = 20
+            per_page = 20 (self.per_page by default)
             LIMIT per_page OFFSET (page-1) * per_page - https://www.sqlite.org/lang_select.html#limitoffset
 
             page = 1
@@ -236,24 +538,54 @@ class BlogFTSIndex(IndexedDatabase):
             page = 2
             LIMIT 20 OFFSET 20 -> [21..40] rows
 
-        :return:
+        :return: '' if page and per_page are not defined
         """
+        if page is None and per_page is None:
+            return ''
+
+        page, per_page = self._get_page(page, per_page)
+        return f'LIMIT {per_page} OFFSET {(page - 1) * per_page}'
 
-        return ''
+    def _get_page(self, page: int = None, per_page: int = None) -> tuple[int, int]:
+        page = 1 if page is None else int(page)
+        per_page = self.per_page if per_page is None else int(per_page)
+        if page < 1 or per_page < 1:
+            raise ValueError(f'page ({page}) and per_page ({per_page}) must be positive')
+        return page, per_page
 
     @property
     def tokenizer(self):
         if getattr(self, '_tokenizer', None) is None:
-            self._tokenizer = self.tokenizer_class()
-            func = self.tokenizer_filter
-            if hasattr(self.tokenizer_filter, '__self__'):
-                # is bound method
-                func = type(self).tokenizer_filter
-
-            self._tokenizer.token_filter = func
-
+            self.load_tokenizer()
         return self._tokenizer
 
+    def load_tokenizer(self):
+        """
+            Creates tokenizer of queries. It depends on the tokenizer of indexes that is read via fts_con.
+        """
+        stemmer = self.get_index_stemmer()
+        if stemmer is None:
+            tokenizer = self.tokenizer_class()
+        else:
+            # index keeps the stems, so query terms must be stemmed the same way
+            tokenizer = StemmingTokenizer(stemmer=stemmer)
+
+        func = self.tokenizer_filter
+        if hasattr(self.tokenizer_filter, '__self__'):
+            # is bound method
+            func = type(self).tokenizer_filter
+
+        tokenizer.token_filter = func
+        self._tokenizer = tokenizer
+
+    def get_index_stemmer(self) -> Optional[BatchStemmer]:
+        """
+            Returns stemmer of custom tokenizer of the indexes or None for builtin tokenizers
+        """
+        name = self.entry_text_triggers.fts_driver.get_tokenizer_name()
+        tk = get_tokenizer(name) if name else None
+        return getattr(tk, 'stemmer', None)
+
     def s_as_match_expr(self, s: str) -> str:
         return s
 
@@ -273,11 +605,16 @@ class BlogFTSIndex(IndexedDatabase):
                 websearch2_match_expr('"fat rat" or cat dog') → "fat" <-> "rat" OR "cat" AND "dog" ???????
 
         :param s: Plain string
+        If indexes use stemming tokenizer (for example 'hunspell_ua') then terms are stemmed as in the index,
+        so exact term lookups can be used instead of prefix ones.
+
         :param to_prefix: bool
         :return: "fat" AND "rat" if to_prefix is False, otherwise "fat"* AND "rat"*
         """
-        self.tokenizer.document = s
-        return ' AND '.join((f'"{t}"{"*" if to_prefix else ""}' for t in self.tokenizer))
+        # tokenizer keeps the document, match can be called by several threads
+        with self._lock:
+            self.tokenizer.document = s
+            return ' AND '.join((f'"{t}"{"*" if to_prefix else ""}' for t in self.tokenizer))
 
     def entrytext_match_sql(self, s: str, handler: Callable) -> str:
         """
@@ -330,7 +667,8 @@ class BlogFTSIndex(IndexedDatabase):
 
         return sql
 
-    def match_sql(self, s: str, handler: Callable) -> str:
+    def match_sql(self, s: str, handler: Callable, page: int = None, per_page: int = None,
+                  after: tuple[float, int] = None) -> str:
         """
         SELECT r.id, group_concat(distinct r.entry_id), sum(r.rank)
         FROM
@@ -349,15 +687,202 @@ class BlogFTSIndex(IndexedDatabase):
 
         :param s: input search string (document)
         :param handler: is callable of one parameter for s that should return match expression like 'ful* tex* sear*'
+        :param page, per_page: see limit_sql
+        :param after: (rank, id) of the last seen row (keyset pagination), rows after it are returned.
+            Values are bound as :after_rank and :after_id parameters (see match_params)
         :return: str is sql
         """
         sql = 'SELECT r.id, group_concat(distinct r.entry_id) as entry_id, sum(r.rank) '\
               f'FROM ( {self.entry_match_sql(s, handler)} UNION ALL {self.entrytext_match_sql(s, handler)} ) as r '\
-              f'GROUP BY r.id ORDER BY sum(r.rank) {self.limit_sql()}'
-        return sql
+              'GROUP BY r.id '
+        if page is None and per_page is None and after is None:
+            return f'{sql}ORDER BY sum(r.rank) {self.limit_sql()}'
+
+        # pages must have stable order, id breaks ties of rank
+        if after is not None:
+            sql = f'{sql}HAVING sum(r.rank) > :after_rank OR sum(r.rank) = :after_rank AND r.id > :after_id '
+        return f'{sql}ORDER BY sum(r.rank), r.id {self.limit_sql(page, per_page)}'
+
+    @staticmethod
+    def match_params(after: tuple[float, int] = None) -> dict:
+        if after is None:
+            return {}
+        rank, id_ = after
+        return {'after_rank': rank, 'after_id': id_}
+
+    def paginate(self, rows: list, page: int = None, per_page: int = None, after: tuple[float, int] = None) -> list:
+        """
+            Does the same as match_sql does for rows ordered by (rank, id), for example merged rows of shards
+        """
+        if after is not None:
+            rows = [r for r in rows if (r[2], r[0]) > tuple(after)]
+        if page is None and per_page is None:
+            return rows
+        page, per_page = self._get_page(page, per_page)
+        return rows[(page - 1) * per_page:page * per_page]
+
+    def match(self, s: str, handler: Union[Callable, str] = 'plain2_match_expr', page: int = None,
+              per_page: int = None, after: tuple[float, int] = None, **handler_args):
+        """
+            Returns rows (id, entry_id, rank) ordered by rank.
+            page, per_page, after - see match_sql. Pages of sharded index are cut after merging.
+            Result is taken from result cache if it is open (see open_result_cache).
+        """
+        h = partial(self._get_handler(handler), **handler_args)
+        if self.result_cache is None:
+            return self._match(s, h, page, per_page, after)
+
+        res, h, put = self._cached(s, h, page, per_page, after)
+        if res is ResultCache.miss:
+            res = self._match(s, h, page, per_page, after)
+            put(tuple(res))
+        return res
 
-    def match(self, s: str, handler: Union[Callable, str] = 'plain2_match_expr', **handler_args):
+    def _match(self, s: str, h: Callable, page: int = None, per_page: int = None,
+               after: tuple[float, int] = None) -> list:
+        if not self.shards:
+            return self._query(0, self.match_sql(s, h, page, per_page, after), self.match_params(after))
 
+        sql = self.match_sql(s, h)
+        # sqlite3 releases the GIL while a statement is stepping, so shards are queried in parallel
+        futures = [self.get_executor().submit(self._query, i, sql) for i in range(1, len(self.fts_cons))]
+        rows = self.merge_shard_results([self._query(0, sql), *(f.result() for f in futures)])
+        return self.paginate(rows, page, per_page, after)
+
+    def iter_match(self, s: str, handler: Union[Callable, str] = 'plain2_match_expr', batch_size: int = 100,
+                   page: int = None, per_page: int = None, after: tuple[float, int] = None,
+                   **handler_args) -> Generator[sqlite.Row, None, None]:
+        """
+            Generator version of match, rows are fetched by batch_size rows (fetchmany).
+            Statement (and pooled connection) is kept until generator is exhausted or closed.
+            Sharded index is merged before (see match).
+        """
+        if self.shards:
+            yield from self.match(s, handler, page, per_page, after, **handler_args)
+            return
+
+        sql = self.match_sql(s, partial(self._get_handler(handler), **handler_args), page, per_page, after)
+        with self.read_pools[0].connection() if self.read_pools else nullcontext(self.fts_con) as con:
+            cursor = con.execute(sql, self.match_params(after))
+            try:
+                while rows := cursor.fetchmany(batch_size):
+                    yield from rows
+            finally:
+                cursor.close()
+
+    def match_top_k(self, s: str, handler: Union[Callable, str] = 'plain2_match_expr', k: int = None,
+                    batch_size: int = None, **handler_args) -> list[tuple]:
+        """
+            Returns the same rows as match(s, handler, 1, k) does (rank, id breaks ties) as tuples, but hits are not
+            joined, grouped and sorted all together. Headline and body text indexes are read as two streams
+            ordered by their own rank (see rank_sql), by batches of growing LIMIT (batch_size rows, k by default,
+            and twice more each next time). Only the rows read are joined with content tables as entry_match_sql
+            and entrytext_match_sql do it, and rank of the other index is looked up by rowid for each new id,
+            so the sum of id is exact. The best k sums are kept in heap. Reading stops when k-th sum is less than
+            the least sum that unseen id can have - sum of the last ranks read from streams (threshold algorithm).
+
+            It relies on rank <= 0 as bm25 is, so absent hit (0) is not better than any hit.
+            Sharded index is merged as match does it.
+        """
+        h = partial(self._get_handler(handler), **handler_args)
+        k = self._get_page(1, k)[1]
+        if self.shards:
+            return [tuple(r) for r in self.match(s, h, 1, k)]
+
+        expr = h(s)
+        with self.read_pools[0].connection() if self.read_pools else nullcontext(self.fts_con) as con:
+            return self._top_k(con, expr, k, batch_size or k)
+
+    @staticmethod
+    def rank_sql(trgs: BlogTriggersBase, match_expr: str) -> str:
+        """
+            SELECT rowid, rank FROM blog_entrytext_fts5 WHERE blog_entrytext_fts5 MATCH '{body_text} : ful* tex*'
+
+            It can be continued by 'AND rowid ...' or 'ORDER BY rank ...' (FTS5 sorts by rank itself)
+        """
+        return f'SELECT rowid, rank FROM {trgs.fts_table_name} '\
+               f'WHERE {trgs.fts_table_name} MATCH \'{{{" ".join(trgs.fts_columns)}}} : {match_expr}\' '
+
+    def _top_k(self, con: sqlite.Connection, match_expr: str, k: int, batch_size: int) -> list[tuple]:
+        be = f'{self.attach_as}.{self.entry_triggers.table_name}'
+        bet = f'{self.attach_as}.{self.entry_text_triggers.table_name}'
+        rank_sqls = [self.rank_sql(trgs, match_expr) for trgs in (self.entry_triggers, self.entry_text_triggers)]
+        # (id, entry_id, entry is in content) of rowids of each index, headline hit is a hit of all texts of entry
+        content_sqls = [
+            f'SELECT bet.id, bet.entry_id, 1 FROM {be} as be INNER JOIN {bet} as bet ON bet.entry_id = be.id '
+            f'WHERE be.id IN (SELECT value FROM json_each(?))',
+            f'SELECT bet.id, bet.entry_id, be.id IS NOT NULL FROM {bet} as bet LEFT JOIN {be} as be '
+            f'ON be.id = bet.entry_id WHERE bet.id IN (SELECT value FROM json_each(?))'
+        ]
+
+        ranks = [{}, {}]  # rowid: rank for each index, 0.0 - rowid has no hit
+        keys = {}  # id: (rowid of entry index or None if entry is not in content, rowid of entrytext index)
+        entry_ids = {}
+        offsets = [0, 0]
+        bounds = [0.0, 0.0]  # the least rank that is not read yet, 0 - stream is exhausted
+        exhausted = [False, False]
+        size = batch_size
+        top = []  # heap of (-sum, -id), top[0] is k-th
+        while True:
+            new_ids = []
+            for i, sql in enumerate(rank_sqls):
+                if exhausted[i]:
+                    continue
+                rows = self._fetch(con, f'{sql}ORDER BY rank LIMIT ? OFFSET ?', (size, offsets[i]))
+                offsets[i] += len(rows)
+                ranks[i].update(rows)
+                if len(rows) < size:
+                    exhausted[i], bounds[i] = True, 0.0
+                else:
+                    bounds[i] = min(rows[-1][1], 0.0)
+                if not rows:
+                    continue
+
+                for id_, entry_id, has_entry in self._fetch(con, content_sqls[i], (json.dumps([r[0] for r in rows]), )):
+                    if id_ not in keys:
+                        keys[id_] = (entry_id if has_entry else None, id_)
+                        entry_ids[id_] = entry_id
+                        new_ids.append(id_)
+
+            for i, sql in enumerate(rank_sqls):
+                # rowid that is absent in exhausted stream has no hit in this index
+                if exhausted[i]:
+                    continue
+                missed = [*{keys[id_][i] for id_ in new_ids} - ranks[i].keys() - {None}]
+                if missed:
+                    ranks[i].update(self._fetch(
+                        con, f'{sql}AND rowid IN (SELECT value FROM json_each(?))', (json.dumps(missed), )
+                    ))
+                    ranks[i].update((rowid, 0.0) for rowid in missed if rowid not in ranks[i])
+
+            for id_ in new_ids:
+                # at most two addends, so the sum is equal to sum(r.rank) of match_sql regardless of order
+                rank = sum(ranks[i].get(key, 0.0) for i, key in enumerate(keys[id_]))
+                item = (-rank, -id_)
+                if len(top) < k:
+                    heapq.heappush(top, item)
+                elif item > top[0]:
+                    heapq.heapreplace(top, item)
+
+            if all(exhausted) or len(top) == k and -top[0][0] < sum(bounds):
+                break
+            size *= 2
+
+        return [(-id_, str(entry_ids[-id_]), -rank) for rank, id_ in sorted(top, reverse=True)]
+
+    def _query(self, i: int, sql: str, params: dict = None, interrupter: QueryInterrupter = None) -> list:
+        """
+            Runs sql on i-th index database (0 - fts_con), via read pool if it is open
+        """
+        if not self.read_pools:
+            return self._fetch(self.fts_cons[i], sql, params)
+        with self.read_pools[i].connection() as con:
+            if interrupter is None:
+                return self._fetch(con, sql, params)
+            with interrupter.running(con):
+                return self._fetch(con, sql, params)
+
+    def _get_handler(self, handler: Union[Callable, str]) -> Callable:
         h = handler
         if isinstance(handler, str):
             h = getattr(self, handler, None)
@@ -365,18 +890,129 @@ class BlogFTSIndex(IndexedDatabase):
                 raise ValueError(f'self object has no "{handler}" attribute')
         if not isinstance(h, Callable):
             raise ValueError(f'handler "{h}" is not callable')
+        return h
+
+    def _check_read_pools(self):
+        if not self.read_pools:
+            raise ValueError('read pools are not open (see open_read_pools)')
+
+    async def _run(self, interrupter: QueryInterrupter, func: Callable, *args, discard: Callable = None):
+        """
+            Runs func in async executor. If awaiting task is cancelled then running statements are interrupted,
+            and it waits for func, so connection is returned to pool before CancelledError is raised further.
+            discard - is called for result of func that was finished after cancelling (for example pool.release)
+        """
+        fut = asyncio.get_running_loop().run_in_executor(self.get_async_executor(), func, *args)
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            interrupter.interrupt()
+            try:
+                res = await fut
+            except sqlite.OperationalError:
+                # interrupted
+                pass
+            else:
+                if discard is not None:
+                    discard(res)
+            raise
+
+    async def amatch(self, s: str, handler: Union[Callable, str] = 'plain2_match_expr', timeout: float = None,
+                     page: int = None, per_page: int = None, after: tuple[float, int] = None,
+                     **handler_args) -> list:
+        """
+            Async version of match. Queries run in async executor via read pools (see open_read_pools).
+            If task is cancelled or timeout (seconds) expires then running SQLite statements are interrupted.
+        """
+        self._check_read_pools()
+        h = partial(self._get_handler(handler), **handler_args)
+        if self.result_cache is None:
+            return await self._amatch(s, h, timeout, page, per_page, after)
+
+        res, h, put = self._cached(s, h, page, per_page, after)
+        if res is ResultCache.miss:
+            res = await self._amatch(s, h, timeout, page, per_page, after)
+            put(tuple(res))
+        return res
 
-        sql = self.match_sql(s, partial(h, **handler_args))
+    async def _amatch(self, s: str, h: Callable, timeout: float = None, page: int = None, per_page: int = None,
+                      after: tuple[float, int] = None) -> list:
+        interrupter = QueryInterrupter()
+        if not self.shards:
+            sql = self.match_sql(s, h, page, per_page, after)
+            aws = self._run(interrupter, self._query, 0, sql, self.match_params(after), interrupter)
+            return await asyncio.wait_for(aws, timeout)
+
+        sql = self.match_sql(s, h)
+        aws = asyncio.gather(*(self._run(interrupter, self._query, i, sql, None, interrupter)
+                               for i in range(len(self.fts_cons))))
+        return self.paginate(self.merge_shard_results(await asyncio.wait_for(aws, timeout)), page, per_page, after)
+
+    async def amatch_many(self, queries: Iterable[str], handler: Union[Callable, str] = 'plain2_match_expr',
+                          timeout: float = None, **handler_args) -> list[list]:
+        """
+            Runs amatch for each query concurrently (number of running queries is limited by async_workers).
+            Returns list of results in order of queries.
+        """
+        return list(await asyncio.gather(*(self.amatch(s, handler, timeout, **handler_args) for s in queries)))
 
+    async def aiter_match(self, s: str, handler: Union[Callable, str] = 'plain2_match_expr', batch_size: int = 100,
+                          page: int = None, per_page: int = None, after: tuple[float, int] = None,
+                          **handler_args) -> AsyncGenerator[sqlite.Row, None]:
+        """
+            Async iterator over rows of match. Rows are fetched by batch_size rows on the same pooled connection,
+            it is kept until iteration is finished or closed. Sharded index is merged before (see amatch).
+        """
+        if self.shards:
+            for r in await self.amatch(s, handler, None, page, per_page, after, **handler_args):
+                yield r
+            return
+
+        self._check_read_pools()
+        sql = self.match_sql(s, partial(self._get_handler(handler), **handler_args), page, per_page, after)
+        interrupter = QueryInterrupter()
+        pool = self.read_pools[0]
+        con = await self._run(interrupter, pool.acquire, discard=pool.release)
+        try:
+            with interrupter.running(con):
+                cursor = await self._run(interrupter, con.execute, sql, self.match_params(after))
+                try:
+                    while rows := await self._run(interrupter, cursor.fetchmany, batch_size):
+                        for r in rows:
+                            yield r
+                finally:
+                    cursor.close()
+        finally:
+            pool.release(con)
+
+    @staticmethod
+    def _fetch(fts_con: sqlite.Connection, sql: str, params: dict = None) -> list:
         res = []
-        cursor = self.fts_con.cursor()
+        cursor = fts_con.cursor()
         try:
-            cursor.execute(sql)
+            cursor.execute(sql, params or {})
             for r in cursor.fetchall():
                 res.append(r)
-        except Exception as exc:
-            raise
         finally:
             cursor.close()
 
         return res
+
+    @staticmethod
+    def merge_shard_results(results: Sequence[list]) -> list[tuple]:
+        """
+            Merges (id, entry_id, rank) rows of match_sql from each shard into one list ordered by rank (id for ties).
+            Headline and body text of the same id can be found in different shards (each index is partitioned
+            by own rowid), so ranks of the same id are summed as match_sql does it for one database.
+            It is the reason why shards return all rows instead of their top-k.
+
+            Note: bm25 of each shard is calculated by statistics (number of documents, average length)
+            of this shard only.
+        """
+        ranks, entry_ids = {}, {}
+        for rows in results:
+            for id_, entry_id, rank in rows:
+                ranks[id_] = ranks.get(id_, 0) + rank
+                # entrytext belongs to one entry, so entry_id is the same in each shard
+                entry_ids.setdefault(id_, entry_id)
+        return sorted(((id_, entry_ids[id_], rank) for id_, rank in ranks.items()), key=lambda r: (r[2], r[0]))
@@ -0,0 +1,320 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: fts_sqlite
+# File: rebuild.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 11:05 AM
+
+import importlib
+import sqlite3 as sqlite
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Callable, Iterable, Optional, Generator
+
+from flexts.fts5_tokenizer import FTS5_TOKENIZE_DOCUMENT, get_tokenizer, tokenizers
+from flexts.lexicon import Lexicon
+from flexts.sharded_fts5 import ShardedSQLiteFTS5
+from flexts.stem_store import SQLiteStemStore
+from flexts.stemmer import HunspellStemmer
+from fts_sqlite.blog_sqlite_fts import BlogTriggersBase
+
+_prepare_funcs = {}
+
+
+def get_prepare_func(path: Optional[str]) -> Optional[Callable]:
+    """
+        path - dotted path like 'package.module.func' to callable of one parameter (fts data dict)
+        that returns fts data dict. Callable is imported once per process.
+    """
+    if not path:
+        return None
+
+    func = _prepare_funcs.get(path)
+    if func is None:
+        module_name, _, func_name = path.rpartition('.')
+        if not module_name:
+            raise ValueError(f'"{path}" is not dotted path to callable')
+        func = getattr(importlib.import_module(module_name), func_name)
+        if not callable(func):
+            raise ValueError(f'"{path}" is not callable')
+        _prepare_funcs[path] = func
+    return func
+
+
+def prepare_chunk(prepare: Optional[str], items: list[tuple]) -> list[tuple]:
+    """
+        It runs inside of worker process. items - [(fts_rowid, fts_data), ...]
+    """
+    func = get_prepare_func(prepare)
+    if func is None:
+        return items
+    return [(rowid, func(data)) for rowid, data in items]
+
+
+def init_worker(stem_store: tuple[str, str] = None, stem_lexicon: str = None):
+    """
+        Initializer of worker process. Stem store ((path, table_name)) and lexicon of the writer are opened again,
+        so the worker does not use connections and threads of the parent process.
+    """
+    HunspellStemmer.store = None if stem_store is None else SQLiteStemStore(*stem_store)
+    HunspellStemmer.lexicon = None if stem_lexicon is None else Lexicon(stem_lexicon)
+
+
+def prestem_chunk(prepare: Optional[str], tokenizer: Optional[str], items: list[tuple]) -> Optional[list[tuple]]:
+    """
+        It runs inside of worker process. Documents are prepared and tokenized by the tokenizer of index,
+        so their stems are derived by the worker and are written into the stem store. The writer gets them
+        by one store lookup per document instead of stemming (see HunspellStemmer.prefetch).
+        Returns prepared items or None if there is no prepare hook (the writer keeps own items).
+    """
+    prepared = prepare_chunk(prepare, items)
+    tk = get_tokenizer(tokenizer) if tokenizer else None
+    if tk is not None:
+        for rowid, data in prepared:
+            for text in data.values():
+                if text:
+                    deque(tk.tokenize(str(text), FTS5_TOKENIZE_DOCUMENT), maxlen=0)
+        if HunspellStemmer.store is not None:
+            # the writer reads the stems right after this chunk is returned
+            HunspellStemmer.store.flush()
+    return None if prepare is None else prepared
+
+
+class FTSRebuilder:
+    """
+        Full rebuild of index for one content table (group of triggers) without replaying the triggers.
+
+        Content rows are streamed in rowid (primary key) ordered chunks (keyset, without loading whole table),
+        each chunk is prepared by the pool of 'workers' processes and single writer (this process) bulk-loads
+        the results into the index in order. Workers run the 'prepare' hook (dotted path) and pre-stem the documents
+        by the tokenizer of index into the stem store (HunspellStemmer.store), so the tokenizer of the writer
+        takes the stems from the store. Without the hook and the store (or stemming tokenizer) the pool is not used,
+        workers would only copy the rows there and back.
+
+        After each written chunk the checkpoint callback gets the last content primary key, so rebuild can be
+        resumed via start_after. The first chunk after resume is written via replace_many because it may be
+        written before the checkpoint was saved.
+    """
+
+    def __init__(self, triggers: BlogTriggersBase, con: sqlite.Connection = None, chunk_size: int = 1000,
+                 workers: int = 0, prepare: str = None,
+                 checkpoint: Callable[[str, int], None] = None) -> None:
+        """
+            con - content connection (connection of triggers by default)
+            workers - number of processes, 0 - prepare in this process
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+
+        self.triggers = triggers
+        self.trigger = triggers.triggers[0]
+        self.con = con or self.trigger.con
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.prepare = prepare
+        self.checkpoint = checkpoint
+
+        self.stats = {}
+
+    @property
+    def fts_driver(self):
+        return self.triggers.fts_driver
+
+    def get_prestem_tokenizer(self) -> Optional[str]:
+        """
+            Returns name of custom tokenizer of index if workers can pre-stem documents for it.
+            Stems are passed to the writer via stem store, so it must be defined.
+        """
+        if HunspellStemmer.store is None:
+            return None
+        name = self.fts_driver.get_tokenizer_name()
+        return name if name in tokenizers else None
+
+    def get_workers(self) -> int:
+        """
+            Returns number of worker processes that will be used, 0 if workers have nothing to do
+        """
+        if self.prepare is None and self.get_prestem_tokenizer() is None:
+            return 0
+        return max(self.workers, 0)
+
+    def iter_chunks(self, start_after: int = None) -> Generator[tuple[int, list[tuple]], None, None]:
+        """
+            Yields (last content primary key, [(fts_rowid, fts_data), ...]) for each chunk
+        """
+        trg = self.trigger
+        cols = trg.get_trigger_columns()
+        sql = f'SELECT {", ".join(cols)} FROM {trg.table_name} '\
+              f'WHERE {trg.pk_name} > ? ORDER BY {trg.pk_name} LIMIT ?'
+
+        last = start_after
+        while True:
+            prms = (last if last is not None else -(1 << 63), self.chunk_size)
+            cursor = self.con.execute(sql, prms)
+            try:
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+
+            if not rows:
+                break
+
+            last = rows[-1][0]
+            yield last, [trg.get_fts_item(dict(zip(cols, r))) for r in rows]
+
+            if len(rows) < self.chunk_size:
+                break
+
+    def _iter_prepared(self, start_after: int = None) -> Generator[tuple[int, list[tuple]], None, None]:
+        workers = self.get_workers()
+        if workers < 1:
+            for last, items in self.iter_chunks(start_after):
+                yield last, prepare_chunk(self.prepare, items)
+            return
+
+        store, lexicon = HunspellStemmer.store, HunspellStemmer.lexicon
+        initargs = (None if store is None else (store.path, store.table_name),
+                    None if lexicon is None else str(lexicon.path))
+        tokenizer = self.get_prestem_tokenizer()
+        # bounded number of chunks in flight keeps memory usage independent of table size
+        in_flight: deque[tuple[int, list[tuple], Future]] = deque()
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=initargs) as executor:
+            for last, items in self.iter_chunks(start_after):
+                in_flight.append((last, items, executor.submit(prestem_chunk, self.prepare, tokenizer, items)))
+                if len(in_flight) >= workers * 2:
+                    last, items, fut = in_flight.popleft()
+                    yield last, fut.result() or items
+            while in_flight:
+                last, items, fut = in_flight.popleft()
+                yield last, fut.result() or items
+
+    def run(self, start_after: int = None, clear: bool = None, progress: Callable[[dict], None] = None,
+            shadow: bool = False) -> dict:
+        """
+            clear - remove all data from index before rebuild. By default, it is True if start_after is None.
+            progress - callable that gets the stats after each written chunk
+            shadow - build into shadow index alongside the live one, verify it and swap it in (see SQLiteFTS5.swap).
+                Live index is fully searchable during rebuild. Resume (start_after) continues to fill the shadow.
+
+            Shadow rebuild requires triggers in changelog mode. High-water mark of changelog consumer
+            is moved back to the moment when rebuild was started, so the consumer re-applies the changes of content
+            that were done during rebuild. Direct triggers (of any process) write into the live index only,
+            their changes would be lost by swap, so ValueError is raised. Sharded index has no shadow swap.
+        """
+        live_driver = self.fts_driver
+        if shadow:
+            if isinstance(live_driver, ShardedSQLiteFTS5):
+                raise ValueError('shadow rebuild of sharded index is not supported')
+            if not self.triggers.changelog:
+                raise ValueError(
+                    'shadow rebuild requires triggers in changelog mode, '
+                    'changes of content that are done during rebuild would be lost by swap'
+                )
+
+        driver = live_driver
+        resumed = start_after is not None
+        if shadow:
+            driver = live_driver.create_shadow(recreate=not resumed)
+            consumer = self.triggers.get_changelog_consumer()
+            mark_consumer = self.triggers.get_changelog_consumer(
+                state_name=f'{consumer.state_name}{live_driver.shadow_suffix}'
+            )
+            if not resumed:
+                mark_consumer.set_high_water(consumer.get_latest_id())
+        else:
+            if clear is None:
+                clear = not resumed
+            if clear:
+                driver.delete_all()
+                resumed = False
+
+        start = time.perf_counter()
+        self.stats = {'table': self.trigger.table_name, 'docs': 0, 'chunks': 0, 'last_rowid': start_after,
+                      'workers': self.get_workers(), 'seconds': 0.0, 'docs_per_sec': 0.0}
+        for last, items in self._iter_prepared(start_after):
+            if resumed:
+                driver.replace_many(items, commit_every=len(items))
+                resumed = False
+            else:
+                driver.insert_many(items, commit_every=len(items))
+
+            if self.checkpoint is not None:
+                self.checkpoint(self.trigger.table_name, last)
+
+            seconds = time.perf_counter() - start
+            self.stats.update(
+                docs=self.stats['docs'] + len(items), chunks=self.stats['chunks'] + 1, last_rowid=last,
+                seconds=seconds
+            )
+            self.stats['docs_per_sec'] = self.stats['docs'] / seconds if seconds else 0.0
+            if progress is not None:
+                progress(self.stats)
+
+        if shadow:
+            live_driver.swap(driver, None if start_after is not None else self.stats['docs'])
+            consumer = self.triggers.get_changelog_consumer()
+            consumer.set_high_water(min(mark_consumer.get_high_water(), consumer.get_high_water()))
+
+        return self.stats
+
+
+class FTSRepairer:
+    """
+        Repairs broken rows of index for one content table (group of triggers) without full rebuild.
+
+        All index entries of broken rowids (see SQLiteFTS5.iter_broken / check_index_is_broken) are removed first
+        (SQLiteFTS5.purge_many reads their terms by one scan of index), then the rows are indexed again from
+        the content table by batches.
+        Rows that are absent in the content table are only removed. Apart from the scan, recovery time depends
+        on number of broken rows only. Index rowid is expected to be primary key of content table
+        (default get_fts_rowid).
+
+        con, schema - connection and schema name to read content rows (see TriggerBase.fetch_content_rows),
+        for example index connection and name of attached content database.
+    """
+
+    def __init__(self, triggers: BlogTriggersBase, con: sqlite.Connection = None, schema: str = None,
+                 batch_size: int = 500, prepare: str = None) -> None:
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+
+        self.triggers = triggers
+        self.trigger = triggers.triggers[0]
+        self.con = con or self.trigger.con
+        self.schema = schema
+        self.batch_size = batch_size
+        self.prepare = prepare
+
+        self.stats = {}
+
+    @property
+    def fts_driver(self):
+        return self.triggers.fts_driver
+
+    def run(self, rowids: Iterable[int], progress: Callable[[dict], None] = None) -> dict:
+        driver = self.fts_driver
+        trg = self.trigger
+        rowids = sorted(set(rowids))
+
+        start = time.perf_counter()
+        self.stats = {'table': trg.table_name, 'rowids': 0, 'purged': 0, 'reindexed': 0, 'missing': 0,
+                      'batches': 0, 'seconds': 0.0}
+        self.stats['purged'] = driver.purge_many(rowids, commit_every=self.batch_size)
+        for i in range(0, len(rowids), self.batch_size):
+            batch = rowids[i:i + self.batch_size]
+            content_rows = trg.fetch_content_rows(batch, self.con, self.schema)
+            items = prepare_chunk(self.prepare, [trg.get_fts_item(content_rows[r]) for r in batch if r in content_rows])
+            if items:
+                driver.insert_many(items, commit_every=len(items))
+
+            self.stats.update(
+                rowids=self.stats['rowids'] + len(batch),
+                reindexed=self.stats['reindexed'] + len(items),
+                missing=self.stats['missing'] + len(batch) - len(items), batches=self.stats['batches'] + 1,
+                seconds=time.perf_counter() - start
+            )
+            if progress is not None:
+                progress(self.stats)
+
+        return self.stats
@@ -5,19 +5,28 @@
 # Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
 # Created by ox23 at 2022-12-06 (y-m-d) 1:14 PM
 
+import asyncio
 import os
 import sqlite3 as sqlite
-
+import tempfile
+import threading
+from unittest import mock
+from typing import Callable
+
+from flexts import fts5_tokenizer
+from flexts.fts5_tokenizer import StemmingFTS5Tokenizer
+from flexts.sqlite_fts5 import SQLiteFTS5
 from flexts.tests.test_sqlite_fts5 import SQLiteFTS5Util
-from fts_sqlite.blog_sqlite_fts import BlogFTSIndex, attach
+from fts_sqlite.blog_sqlite_fts import BlogFTSIndex, attach, get_con_uri
 import fts_sqlite.tests.con_util as conutil
 
 
 class BlogFTSIndexInFileSetup(conutil.ConUtil):
 
+    work_dir = '/home/ox23/PycharmProjects/fts_ua/.work/'
+
     def setUp(self) -> None:
 
-        self.work_dir = '/home/ox23/PycharmProjects/fts_ua/.work/'
         self.con_db_file = f'{self.work_dir}blog_content.sqlite3'
 
         self.reset_db(self.con_db_file)
@@ -33,10 +42,13 @@ class BlogFTSIndexInFileSetup(conutil.ConUtil):
 
         self.attach_as = 'blog'
 
-        self.blog_index = BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as)
+        self.blog_index = self.get_blog_index()
 
         self.are_content_tables_reachable(self.fts_con, self.attach_as)
 
+    def get_blog_index(self) -> BlogFTSIndex:
+        return BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as)
+
     @staticmethod
     def reset_db(file):
         if os.path.isfile(file):
@@ -48,6 +60,18 @@ class BlogFTSIndexInFileSetup(conutil.ConUtil):
             # self.reset_db(db_file)
 
 
+class BlogFTSIndexInTempFileSetup(BlogFTSIndexInFileSetup):
+
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.work_dir = self._tmp_dir.name + os.sep
+        super().setUp()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        self._tmp_dir.cleanup()
+
+
 class BlogFTSIndexInMemorySetup(conutil.ConUtil):
     '''
         ATTENTION: If use it as TestBlogFTSIndex(BlogFTSIndexInMemorySetup) then test will hangs up
@@ -261,3 +285,493 @@ class TestBlogFTSIndex(BlogFTSIndexInFileSetup):
         res = self.blog_index.match('different')
         self.assertFalse(res)
         self.assertIsInstance(res, list)
+
+
+class TestBlogFTSIndexChangelog(BlogFTSIndexInTempFileSetup):
+
+    def get_blog_index(self) -> BlogFTSIndex:
+        # default flavour of triggers will be replaced by changelog flavour
+        BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as)
+        return BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, changelog=True)
+
+    def test_consume_changelog(self):
+        self.insert_data(self.con)
+
+        # writes without registered sql function are logged only
+        self.assertFalse(self.blog_index.match('цікаве'))
+
+        cnt = sum(len(rows) for rows in self.get_data().values())
+        self.assertEqual(cnt, self.blog_index.consume_changelog(batch_size=2))
+
+        res = self.blog_index.match('цікаве')
+        self.assertEqual(1, len(res))
+        self.assertSequenceEqual([21111, '211'], res[0][:-1])
+
+        with self.con as con:
+            con.execute(f'DELETE FROM {self.con_tbl_names[1]} WHERE id = 21111').close()
+        self.assertEqual(1, self.blog_index.consume_changelog())
+        self.assertFalse(self.blog_index.match('цікаве'))
+        self.assertEqual(0, self.blog_index.consume_changelog())
+
+
+class DictStemmer:
+    stems = {'мовою': 'мова', 'цікаве': 'цікавий'}
+
+    def stem_words(self, tokens: list[str]) -> list[str]:
+        return [self.stems.get(t.lower(), t.lower()) for t in tokens]
+
+
+class TestBlogFTSIndexStemming(BlogFTSIndexInTempFileSetup):
+
+    tokenizer_name = 'test_blog_stem'
+
+    def setUp(self) -> None:
+        fts5_tokenizer.tokenizers[self.tokenizer_name] = lambda: StemmingFTS5Tokenizer(DictStemmer())
+        super().setUp()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        fts5_tokenizer.tokenizers.pop(self.tokenizer_name)
+
+    def get_blog_index(self) -> BlogFTSIndex:
+        return BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, tokenize=self.tokenizer_name)
+
+    def test_plain2_match_expr(self):
+        self.assertEqual('"мова" AND "цікавий"', self.blog_index.plain2_match_expr('Мовою, цікаве'))
+        self.assertEqual('"мова"*', self.blog_index.plain2_match_expr('мовою', True))
+
+    def test_match(self):
+        self.insert_data(self.con)
+
+        res = self.blog_index.match('мовою')
+        self.assertListEqual([11111, 11112, 21111], sorted(r[0] for r in res))
+
+        res = self.blog_index.match('цікавий')
+        self.assertListEqual([21111], [r[0] for r in res])
+
+        with self.con as con:
+            con.execute(f'UPDATE {self.con_tbl_names[1]} SET body_text = \'нове цікаве\' WHERE id = 11111').close()
+            con.execute(f'DELETE FROM {self.con_tbl_names[1]} WHERE id = 21111').close()
+        res = self.blog_index.match('цікаве')
+        self.assertListEqual([11111], [r[0] for r in res])
+        for trg_group in (self.blog_index.entry_triggers, self.blog_index.entry_text_triggers):
+            self.assertListEqual([], trg_group.fts_driver.check_index_is_broken())
+
+    def test_read_pools(self):
+        self.insert_data(self.con)
+        self.assertListEqual([self.tokenizer_name], self.blog_index.get_tokenizer_names())
+        exp = [tuple(r) for r in self.blog_index.match('мовою')]
+
+        self.blog_index.open_read_pools()
+        res = {}
+        thread = threading.Thread(target=lambda: res.setdefault(0, self.blog_index.match('мовою')))
+        thread.start()
+        thread.join()
+        self.assertListEqual(exp, [tuple(r) for r in res[0]])
+        self.blog_index.close()
+
+
+class TestBlogFTSIndexTokenTable(BlogFTSIndexInTempFileSetup):
+
+    def get_blog_index(self) -> BlogFTSIndex:
+        return BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, token_table=True)
+
+    def test_update_delete(self):
+        self.insert_data(self.con)
+        driver = self.blog_index.entry_text_triggers.fts_driver
+        self.assertTrue(driver.token_table)
+        self.assertDictEqual({'body_text': '21111 щось дуже цікаве with ascii words'}, driver._get_terms_for(21111))
+
+        with self.con as con:
+            con.execute(f'UPDATE {self.con_tbl_names[1]} SET body_text = \'нове цікаве\' WHERE id = 11111').close()
+            con.execute(f'DELETE FROM {self.con_tbl_names[1]} WHERE id = 21111').close()
+
+        self.assertDictEqual({'body_text': 'нове цікаве'}, driver._get_terms_for(11111))
+        self.assertDictEqual({}, driver._get_terms_for(21111))
+        res = self.blog_index.match('цікаве')
+        self.assertListEqual([11111], [r[0] for r in res])
+        self.assertListEqual([], driver.check_index_is_broken())
+
+
+class TestBlogFTSIndexMode(BlogFTSIndexInTempFileSetup):
+
+    def get_blog_index(self) -> BlogFTSIndex:
+        return BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, index_mode='auto')
+
+    def test_index_mode(self):
+        exp = 'contentless_delete' \
+            if sqlite.sqlite_version_info >= SQLiteFTS5.contentless_delete_min_version else 'contentless'
+        for trg_group in (self.blog_index.entry_triggers, self.blog_index.entry_text_triggers):
+            self.assertEqual(exp, trg_group.fts_driver.get_index_mode())
+
+        self.insert_data(self.con)
+        with self.con as con:
+            con.execute(f'UPDATE {self.con_tbl_names[1]} SET body_text = \'нове цікаве\' WHERE id = 11111').close()
+            con.execute(f'DELETE FROM {self.con_tbl_names[1]} WHERE id = 21111').close()
+        self.assertListEqual([11111], [r[0] for r in self.blog_index.match('цікаве')])
+
+        with self.assertRaises(ValueError):
+            BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, index_mode='external')
+
+
+class TestBlogFTSIndexProfile(BlogFTSIndexInTempFileSetup):
+
+    def get_blog_index(self) -> BlogFTSIndex:
+        return BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, profile='column_prefix')
+
+    def test_profile(self):
+        for trg_group in (self.blog_index.entry_triggers, self.blog_index.entry_text_triggers):
+            options = trg_group.fts_driver.get_index_options()
+            self.assertEqual('column', options['detail'])
+            self.assertEqual('2 3', options['prefix'])
+
+        self.insert_data(self.con)
+        self.assertListEqual([21111], [r[0] for r in self.blog_index.match('цікаве')])
+        self.assertListEqual([21111], [r[0] for r in self.blog_index.match('ціка', to_prefix=True)])
+
+        with self.assertRaises(ValueError):
+            BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, profile='minimal')
+
+
+
+class TestBlogFTSIndexSharded(BlogFTSIndexInTempFileSetup):
+
+    def get_blog_index(self) -> BlogFTSIndex:
+        self.shards = [
+            sqlite.connect(f'file:{self.work_dir}blog_fts_shard_{i}.sqlite3', timeout=.1, check_same_thread=False)
+            for i in (1, 2)
+        ]
+        return BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, shards=self.shards)
+
+    def tearDown(self) -> None:
+        self.blog_index.close()
+        for con in self.shards:
+            con.close()
+        super().tearDown()
+
+    def rowids(self, con: sqlite.Connection, driver: SQLiteFTS5) -> list:
+        return [r[0] for r in con.execute(f'SELECT rowid FROM {driver.index_name} ORDER BY rowid').fetchall()]
+
+    def test_sharded(self):
+        self.insert_data(self.con)
+        for con in self.blog_index.fts_cons:
+            self.are_content_tables_reachable(con, self.attach_as)
+
+        driver = self.blog_index.entry_text_triggers.fts_driver
+        self.assertListEqual(
+            [[11112, 21111], [31111], [11111]], [self.rowids(con, driver) for con in self.blog_index.fts_cons]
+        )
+        driver = self.blog_index.entry_triggers.fts_driver
+        self.assertListEqual([[111], [211], [311]], [self.rowids(con, driver) for con in self.blog_index.fts_cons])
+
+        res = self.blog_index.match('цікаве')
+        self.assertEqual(1, len(res))
+        self.assertSequenceEqual([21111, '211'], res[0][:-1])
+
+        # headline of 111 is in shard 0, its texts are in shards 0 and 2
+        res = self.blog_index.match('some')
+        self.assertListEqual([11111, 11112], sorted(r[0] for r in res))
+        self.assertListEqual(sorted(r[2] for r in res), [r[2] for r in res])
+
+        with self.con as con:
+            con.execute(f'UPDATE {self.con_tbl_names[1]} SET body_text = \'нове цікаве\' WHERE id = 11111').close()
+            con.execute(f'DELETE FROM {self.con_tbl_names[1]} WHERE id = 21111').close()
+        self.assertListEqual([11111], [r[0] for r in self.blog_index.match('цікаве')])
+        self.assertListEqual([], self.blog_index.entry_text_triggers.fts_driver.check_index_is_broken())
+
+        exp = [tuple(r) for r in self.blog_index.match('some')]
+        self.assertEqual(3, len(self.blog_index.open_read_pools()))
+        self.assertListEqual(exp, [tuple(r) for r in self.blog_index.match('some')])
+
+    def test_merge_shard_results(self):
+        res = BlogFTSIndex.merge_shard_results([
+            [(2, '1', -3.0), (1, '1', -1.0)],
+            [(1, '1', -2.0), (3, '2', -3.0)],
+            [],
+        ])
+        self.assertListEqual([(1, '1', -3.0), (2, '1', -3.0), (3, '2', -3.0)], res)
+
+
+class TestBlogFTSIndexReadPool(BlogFTSIndexInTempFileSetup):
+
+    def tearDown(self) -> None:
+        self.blog_index.close()
+        super().tearDown()
+
+    def test_read_pools(self):
+        self.insert_data(self.con)
+        exp = [tuple(r) for r in self.blog_index.match('w*', 's_as_match_expr')]
+
+        pools = self.blog_index.open_read_pools(min_size=1, max_size=2)
+        self.assertEqual(1, len(pools))
+        with pools[0].connection() as con:
+            self.are_content_tables_reachable(con, self.attach_as)
+            self.assertDictEqual({}, self.blog_index.connection_factory.verify(con, 'read'))
+            with self.assertRaises(sqlite.OperationalError):
+                con.execute(f'DELETE FROM {self.blog_index.entry_triggers.fts_table_name}')
+
+        res = {}
+
+        def search(i):
+            res[i] = [tuple(r) for r in self.blog_index.match('w*', 's_as_match_expr')]
+
+        threads = [threading.Thread(target=search, args=(i, )) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertDictEqual({i: exp for i in range(8)}, res)
+        self.assertLessEqual(pools[0].size, 2)
+
+        # writes via triggers are seen by pooled connections
+        with self.con as con:
+            con.execute(f'DELETE FROM {self.con_tbl_names[1]} WHERE id = 21111').close()
+        self.assertListEqual([31111], [r[0] for r in self.blog_index.match('w*', 's_as_match_expr')])
+
+        self.blog_index.close()
+        self.assertListEqual([], self.blog_index.read_pools)
+        self.assertListEqual([31111], [r[0] for r in self.blog_index.match('w*', 's_as_match_expr')])
+
+
+class SlowBlogFTSIndex(BlogFTSIndex):
+
+    def match_sql(self, s: str, handler: Callable, *args) -> str:
+        if s != 'slow':
+            return super().match_sql(s, handler, *args)
+        # endless query that can be stopped by interrupt only
+        return 'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT max(x), \'1\', 0.0 FROM c'
+
+
+class TestBlogFTSIndexAsync(BlogFTSIndexInTempFileSetup):
+
+    def get_blog_index(self) -> BlogFTSIndex:
+        return SlowBlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as)
+
+    def tearDown(self) -> None:
+        self.blog_index.close()
+        super().tearDown()
+
+    def test_amatch(self):
+        self.insert_data(self.con)
+        with self.assertRaises(ValueError):
+            asyncio.run(self.blog_index.amatch('цікаве'))
+
+        exp = [tuple(r) for r in self.blog_index.match('w*', 's_as_match_expr')]
+        self.blog_index.open_read_pools(max_size=2)
+        res = asyncio.run(self.blog_index.amatch('w*', 's_as_match_expr'))
+        self.assertListEqual(exp, [tuple(r) for r in res])
+
+        res = asyncio.run(self.blog_index.amatch_many(['цікаве', 'nothing', 'w*'], 's_as_match_expr'))
+        self.assertListEqual([[21111], [], [21111, 31111]], [[r[0] for r in rows] for rows in res])
+
+        async def collect():
+            return [tuple(r) async for r in self.blog_index.aiter_match('w*', 's_as_match_expr', batch_size=1)]
+        self.assertListEqual(exp, asyncio.run(collect()))
+        self.assertEqual(0, self.blog_index.read_pools[0].stats()['in_use'])
+
+    def test_cancel(self):
+        pool = self.blog_index.open_read_pools(max_size=1)[0]
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(self.blog_index.amatch('slow', timeout=.2))
+        # statement was interrupted and connection was returned to pool
+        self.assertEqual(0, pool.stats()['in_use'])
+        self.assertEqual(1, pool.size)
+
+        async def cancel_iteration():
+            async def iterate():
+                return [r async for r in self.blog_index.aiter_match('slow')]
+            task = asyncio.create_task(iterate())
+            await asyncio.sleep(.2)
+            task.cancel()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(cancel_iteration())
+        self.assertEqual(0, pool.stats()['in_use'])
+        self.insert_data(self.con)
+        self.assertListEqual([21111], [r[0] for r in asyncio.run(self.blog_index.amatch('цікаве'))])
+
+
+class TestBlogFTSIndexPagination(BlogFTSIndexInTempFileSetup):
+
+    def test_limit_sql(self):
+        self.assertEqual('', self.blog_index.limit_sql())
+        self.assertEqual('LIMIT 20 OFFSET 0', self.blog_index.limit_sql(1))
+        self.assertEqual('LIMIT 20 OFFSET 20', self.blog_index.limit_sql(2))
+        self.assertEqual('LIMIT 5 OFFSET 10', self.blog_index.limit_sql(3, 5))
+        self.assertEqual('LIMIT 5 OFFSET 0', self.blog_index.limit_sql(per_page=5))
+        for page, per_page in ((0, 5), (1, 0), (-1, None)):
+            with self.assertRaises(ValueError):
+                self.blog_index.limit_sql(page, per_page)
+
+    def test_match_sql(self):
+        h = self.blog_index.s_as_match_expr
+        self.assertTrue(self.blog_index.match_sql('w*', h).endswith('GROUP BY r.id ORDER BY sum(r.rank) '))
+        self.assertTrue(self.blog_index.match_sql('w*', h, 2, 5).endswith(
+            'GROUP BY r.id ORDER BY sum(r.rank), r.id LIMIT 5 OFFSET 5'
+        ))
+        self.assertTrue(self.blog_index.match_sql('w*', h, per_page=5, after=(-1.0, 10)).endswith(
+            'GROUP BY r.id HAVING sum(r.rank) > :after_rank OR sum(r.rank) = :after_rank AND r.id > :after_id '
+            'ORDER BY sum(r.rank), r.id LIMIT 5 OFFSET 0'
+        ))
+
+    def check_pages(self, blog_index: BlogFTSIndex):
+        # 11111, 11112 (some) and 21111 (second)
+        rows = [tuple(r) for r in blog_index.match('s*', 's_as_match_expr')]
+        exp = sorted(rows, key=lambda r: (r[2], r[0]))
+        self.assertEqual(3, len(exp))
+
+        pages = [[tuple(r) for r in blog_index.match('s*', 's_as_match_expr', page, 2)] for page in (1, 2, 3)]
+        self.assertListEqual([exp[:2], exp[2:], []], pages)
+
+        # keyset pagination continues after the last (rank, id) seen
+        seen, after = [], None
+        while page := [tuple(r) for r in blog_index.match('s*', 's_as_match_expr', per_page=2, after=after)]:
+            seen.extend(page)
+            after = (page[-1][2], page[-1][0])
+        self.assertListEqual(exp, seen)
+
+        it = blog_index.iter_match('s*', 's_as_match_expr', batch_size=1)
+        self.assertEqual(exp[0], tuple(next(it)))
+        it.close()
+        self.assertListEqual(exp, [tuple(r) for r in blog_index.iter_match('s*', 's_as_match_expr', batch_size=3)])
+        after = (exp[0][2], exp[0][0])
+        self.assertListEqual(
+            exp[1:], [tuple(r) for r in blog_index.iter_match('s*', 's_as_match_expr', per_page=2, after=after)]
+        )
+
+    def test_pages(self):
+        self.insert_data(self.con)
+        self.check_pages(self.blog_index)
+        self.blog_index.open_read_pools()
+        self.check_pages(self.blog_index)
+        self.assertEqual(0, self.blog_index.read_pools[0].stats()['in_use'])
+        self.blog_index.close()
+
+    def test_sharded_pages(self):
+        shards = [
+            sqlite.connect(f'file:{self.work_dir}blog_fts_shard_{i}.sqlite3', timeout=.1, check_same_thread=False)
+            for i in (1, 2)
+        ]
+        try:
+            self.blog_index.entry_triggers.fts_driver.drop_index()
+            self.blog_index.entry_text_triggers.fts_driver.drop_index()
+            blog_index = BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, shards=shards)
+            self.insert_data(self.con)
+            self.check_pages(blog_index)
+            blog_index.close()
+        finally:
+            for con in shards:
+                con.close()
+
+
+class TestBlogFTSIndexResultCache(BlogFTSIndexInTempFileSetup):
+
+    def tearDown(self) -> None:
+        self.blog_index.close()
+        super().tearDown()
+
+    def test_result_cache(self):
+        self.insert_data(self.con)
+        cache = self.blog_index.open_result_cache(max_size=8)
+        exp = [tuple(r) for r in self.blog_index.match('w*', 's_as_match_expr')]
+        self.assertListEqual(exp, [tuple(r) for r in self.blog_index.match('w*', 's_as_match_expr')])
+        self.assertListEqual([], self.blog_index.match('nothing', 's_as_match_expr'))
+        self.assertListEqual([], self.blog_index.match('nothing', 's_as_match_expr'))
+        self.assertListEqual(exp[:1], [tuple(r) for r in self.blog_index.match('w*', 's_as_match_expr', 1, 1)])
+        stats = cache.stats()
+        self.assertEqual((2, 1, 3), (stats['hits'], stats['negative_hits'], stats['misses']))
+
+        # write via triggers bumps generation of index driver
+        generation = self.blog_index.get_generation()
+        with self.con as con:
+            con.execute(f'DELETE FROM {self.con_tbl_names[1]} WHERE id = 21111').close()
+        self.assertNotEqual(generation, self.blog_index.get_generation())
+        self.assertListEqual([31111], [r[0] for r in self.blog_index.match('w*', 's_as_match_expr')])
+
+        # write of other connection changes data_version of index database
+        generation = self.blog_index.get_generation()
+        other = sqlite.connect(get_con_uri(self.fts_con))
+        try:
+            with other:
+                for trg_group in (self.blog_index.entry_triggers, self.blog_index.entry_text_triggers):
+                    name = trg_group.fts_table_name
+                    other.execute(f"INSERT INTO {name}({name}) VALUES('delete-all')").close()
+        finally:
+            other.close()
+        self.assertNotEqual(generation, self.blog_index.get_generation())
+        self.assertListEqual([], self.blog_index.match('w*', 's_as_match_expr'))
+
+        self.assertEqual(2, cache.stats()['invalidations'])
+        self.blog_index.open_read_pools()
+        self.assertListEqual([], asyncio.run(self.blog_index.amatch('w*', 's_as_match_expr')))
+        self.assertEqual(3, cache.stats()['hits'])
+
+        self.blog_index.close()
+        self.assertIsNone(self.blog_index.result_cache)
+
+
+class TestBlogFTSIndexTopK(BlogFTSIndexInTempFileSetup):
+
+    def insert_generated_data(self, con: sqlite.Connection):
+        words = ['alpha', 'beta', 'gamma', 'delta']
+        with con:
+            for entry_id in range(1, 31):
+                con.execute(
+                    f'INSERT INTO {self.con_tbl_names[0]} (id, headline) VALUES (?, ?)',
+                    (entry_id, ' '.join(words[:entry_id % 4 + 1]) + f' headline {entry_id}')
+                ).close()
+                # equal texts give equal ranks, id breaks ties
+                for i in range(entry_id % 3 + 1):
+                    con.execute(
+                        f'INSERT INTO {self.con_tbl_names[1]} (id, entry_id, body_text) VALUES (?, ?, ?)',
+                        (entry_id * 10 + i, entry_id, ' '.join(words[i:]) + ' body')
+                    ).close()
+
+    def check_top_k(self, blog_index: BlogFTSIndex, queries: list[str]):
+        for s in queries:
+            for k in (1, 2, 3, 5, 10, 100):
+                for batch_size in (None, 1, 4):
+                    with self.subTest(s=s, k=k, batch_size=batch_size):
+                        self.assertListEqual(
+                            [tuple(r) for r in blog_index.match(s, 's_as_match_expr', 1, k)],
+                            blog_index.match_top_k(s, 's_as_match_expr', k, batch_size)
+                        )
+
+    def test_match_top_k(self):
+        self.insert_data(self.con)
+        self.check_top_k(self.blog_index, ['s*', 'w*', 'nothing', 'цікаве'])
+        with self.assertRaises(ValueError):
+            self.blog_index.match_top_k('s*', 's_as_match_expr', 0)
+
+        self.insert_generated_data(self.con)
+        self.check_top_k(self.blog_index, ['alpha', 'beta', 'gamma OR delta', 'delta', 'headline', 'body', 'b*'])
+        self.blog_index.open_read_pools()
+        self.check_top_k(self.blog_index, ['gamma OR delta'])
+        self.blog_index.close()
+
+    def test_match_top_k_content(self):
+        self.insert_generated_data(self.con)
+        # hits that are not in content and the text of entry that is not in content
+        self.blog_index.entry_triggers.fts_driver.insert(99, {'headline': 'alpha headline'})
+        self.blog_index.entry_text_triggers.fts_driver.insert(99999, {'body_text': 'alpha body'})
+        with self.con as con:
+            con.execute(
+                f'INSERT INTO {self.con_tbl_names[1]} (id, entry_id, body_text) VALUES (77777, 77, \'alpha body\')'
+            ).close()
+        self.check_top_k(self.blog_index, ['alpha', 'body', 'headline OR body'])
+
+    def test_match_top_k_streams(self):
+        self.insert_generated_data(self.con)
+        fetch = BlogFTSIndex._fetch
+        with mock.patch.object(BlogFTSIndex, '_fetch', side_effect=fetch) as fetch_mock:
+            self.blog_index.match_top_k('body', 's_as_match_expr', 2, 1)
+        streams = [c.args[1:] for c in fetch_mock.call_args_list if 'ORDER BY rank LIMIT' in c.args[1]]
+        # each index is sorted by own rank before the join, LIMIT grows for each next batch
+        self.assertTrue(streams)
+        self.assertTrue(all(' JOIN ' not in sql for sql, params in streams))
+        fts_table_name = self.blog_index.entry_text_triggers.fts_table_name
+        self.assertListEqual(
+            [(1, 0), (2, 1), (4, 3)], [params for sql, params in streams if f'FROM {fts_table_name} ' in sql][:3]
+        )
@@ -0,0 +1,236 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: fts_sqlite/tests
+# File: test_rebuild.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 12:10 PM
+
+import sqlite3 as sqlite
+
+from flexts import fts5_tokenizer, stemmer
+from flexts.fts5_tokenizer import StemmingFTS5Tokenizer
+from flexts.stem_store import SQLiteStemStore
+from flexts.stemmer import HunspellStemmer, StemCache
+from fts_sqlite.blog_sqlite_fts import BlogFTSIndex
+from fts_sqlite.rebuild import FTSRebuilder, FTSRepairer, prepare_chunk
+from fts_sqlite.tests.test_blog_sqlite_fts import BlogFTSIndexInTempFileSetup
+import fts_sqlite.tests.test_blog_sqlite_fts as blog_tests
+
+
+def upper_headline(data: dict) -> dict:
+    return {k: v.upper() for k, v in data.items()}
+
+
+class TestFTSRebuilder(BlogFTSIndexInTempFileSetup):
+
+    def get_index_rows(self, triggers) -> list[tuple]:
+        sql = f'SELECT term, doc, col, offset FROM {triggers.fts_table_name}_v ORDER BY doc, col, offset'
+        return [tuple(r) for r in self.fts_con.execute(sql).fetchall()]
+
+    def test_prepare_chunk(self):
+        items = [(1, {'headline': 'some headline'})]
+        self.assertIs(items, prepare_chunk(None, items))
+        self.assertListEqual(
+            [(1, {'headline': 'SOME HEADLINE'})], prepare_chunk(f'{__name__}.upper_headline', items)
+        )
+        with self.assertRaises(ValueError):
+            prepare_chunk('upper_headline', items)
+
+    def test_iter_chunks(self):
+        self.insert_data(self.con)
+        rebuilder = FTSRebuilder(self.blog_index.entry_text_triggers, chunk_size=3)
+
+        chunks = [*rebuilder.iter_chunks()]
+        self.assertListEqual([21111, 31111], [last for last, items in chunks])
+        self.assertListEqual([11111, 11112, 21111], [rowid for rowid, data in chunks[0][1]])
+        self.assertDictEqual({'body_text': '31111 helpful data and translation корисні дані'}, chunks[1][1][0][1])
+
+        chunks = [*rebuilder.iter_chunks(start_after=11112)]
+        self.assertListEqual([21111, 31111], [rowid for rowid, data in chunks[0][1]])
+
+    def test_run(self):
+        self.insert_data(self.con)
+
+        for trg_group in (self.blog_index.entry_triggers, self.blog_index.entry_text_triggers):
+            expected = self.get_index_rows(trg_group)
+            self.assertTrue(expected)
+
+            for workers in (0, 2):
+                checkpoints = []
+                rebuilder = FTSRebuilder(
+                    trg_group, chunk_size=2, workers=workers, checkpoint=lambda t, r: checkpoints.append((t, r))
+                )
+                with self.subTest(table=trg_group.table_name, workers=workers):
+                    stats = rebuilder.run()
+                    self.assertEqual(len(self.get_data()[trg_group.table_name]), stats['docs'])
+                    self.assertListEqual(expected, self.get_index_rows(trg_group))
+                    self.assertEqual(stats['last_rowid'], checkpoints[-1][1])
+                    self.assertEqual(0, len(trg_group.fts_driver.check_index_is_broken()))
+
+            with self.subTest(table=trg_group.table_name, resume=True):
+                rows = self.get_data()[trg_group.table_name]
+                # the chunk after checkpoint can be already written, it must not break the index
+                stats = FTSRebuilder(trg_group, chunk_size=2).run(start_after=rows[0]['id'])
+                self.assertEqual(len(rows) - 1, stats['docs'])
+                self.assertListEqual(expected, self.get_index_rows(trg_group))
+                self.assertEqual(0, len(trg_group.fts_driver.check_index_is_broken()))
+
+        res = self.blog_index.match('цікаве')
+        self.assertEqual(1, len(res))
+        self.assertSequenceEqual([21111, '211'], res[0][:-1])
+
+    def test_run_shadow(self):
+        self.insert_data(self.con)
+        trg_group = self.blog_index.entry_text_triggers
+        expected = self.get_index_rows(trg_group)
+
+        # direct triggers write into the live index only, their changes would be lost by swap
+        with self.assertRaises(ValueError):
+            FTSRebuilder(trg_group, chunk_size=1).run(shadow=True)
+        self.assertListEqual(expected, self.get_index_rows(trg_group))
+        shadow_name = f'{trg_group.fts_table_name}{trg_group.fts_driver.shadow_suffix}'
+        sql = 'SELECT count(*) FROM sqlite_schema WHERE name = ?'
+        self.assertEqual(0, self.fts_con.execute(sql, (shadow_name, )).fetchone()[0])
+
+    def test_run_shadow_sharded(self):
+        shards = [sqlite.connect(f'file:{self.work_dir}blog_fts_shard_1.sqlite3', timeout=.1)]
+        try:
+            self.blog_index.entry_triggers.fts_driver.drop_index()
+            self.blog_index.entry_text_triggers.fts_driver.drop_index()
+            blog_index = BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, shards=shards)
+            with self.assertRaisesRegex(ValueError, 'sharded'):
+                FTSRebuilder(blog_index.entry_text_triggers).run(shadow=True)
+            blog_index.close()
+        finally:
+            for con in shards:
+                con.close()
+
+
+class FakeHunspell:
+
+    def __init__(self) -> None:
+        self.calls = []
+
+    def stem(self, token: str) -> list[bytes]:
+        self.calls.append(token)
+        return [token[:-1].encode('utf-8')] if len(token) > 4 else []
+
+
+class TestFTSRebuilderPrestem(BlogFTSIndexInTempFileSetup):
+
+    tokenizer_name = 'test_rebuild_hunspell'
+
+    def setUp(self) -> None:
+        self.backend = FakeHunspell()
+        stemmer.register_backend('hunspell_uk_UA', lambda: self.backend)
+        self.cache = HunspellStemmer.cache
+        HunspellStemmer.cache = StemCache()
+        fts5_tokenizer.tokenizers[self.tokenizer_name] = lambda: StemmingFTS5Tokenizer(HunspellStemmer())
+        super().setUp()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        fts5_tokenizer.tokenizers.pop(self.tokenizer_name)
+        HunspellStemmer.cache = self.cache
+        HunspellStemmer.store = None
+        stemmer.register_backend('hunspell_uk_UA', stemmer.hunspell_uk_ua)
+
+    def get_blog_index(self) -> BlogFTSIndex:
+        return BlogFTSIndex(self.con, self.fts_con, self.con_url, self.attach_as, tokenize=self.tokenizer_name)
+
+    def test_run(self):
+        self.insert_data(self.con)
+        trg_group = self.blog_index.entry_text_triggers
+        expected = TestFTSRebuilder.get_index_rows(self, trg_group)
+        self.assertTrue(self.backend.calls)
+
+        # without the store workers have nothing to do
+        self.assertEqual(0, FTSRebuilder(trg_group, workers=2).get_workers())
+
+        HunspellStemmer.store = SQLiteStemStore(f'{self.work_dir}stems.sqlite3')
+        HunspellStemmer.cache = StemCache()
+        self.backend.calls.clear()
+        try:
+            rebuilder = FTSRebuilder(trg_group, chunk_size=2, workers=2)
+            self.assertEqual(self.tokenizer_name, rebuilder.get_prestem_tokenizer())
+            stats = rebuilder.run()
+            self.assertEqual(2, stats['workers'])
+            # the writer took all stems from the store, they were derived by the workers
+            self.assertListEqual([], self.backend.calls)
+            self.assertTrue(dict(HunspellStemmer.store.items()))
+            self.assertListEqual(expected, TestFTSRebuilder.get_index_rows(self, trg_group))
+            self.assertEqual(0, len(trg_group.fts_driver.check_index_is_broken()))
+        finally:
+            HunspellStemmer.store.close()
+
+
+class TestFTSRebuilderChangelog(BlogFTSIndexInTempFileSetup):
+
+    get_blog_index = blog_tests.TestBlogFTSIndexChangelog.get_blog_index
+    get_index_rows = TestFTSRebuilder.get_index_rows
+
+    def test_run_shadow_live(self):
+        self.insert_data(self.con)
+        self.blog_index.consume_changelog()
+        trg_group = self.blog_index.entry_text_triggers
+        expected = self.get_index_rows(trg_group)
+        exp_match = [tuple(r) for r in self.blog_index.match('some')]
+        self.assertEqual(2, len(exp_match))
+
+        def progress(stats):
+            # live index keeps full results during rebuild
+            with self.subTest(rebuilt_docs=stats['docs']):
+                self.assertListEqual(exp_match, [tuple(r) for r in self.blog_index.match('some')])
+
+        stats = FTSRebuilder(trg_group, chunk_size=1).run(progress=progress, shadow=True)
+        self.assertEqual(4, stats['docs'])
+        self.assertListEqual(expected, self.get_index_rows(trg_group))
+        self.assertListEqual(exp_match, [tuple(r) for r in self.blog_index.match('some')])
+        self.assertFalse(trg_group.fts_driver.create_shadow(recreate=False).count())
+
+    def test_run_shadow(self):
+        self.insert_data(self.con)
+        self.blog_index.consume_changelog()
+        trg_group = self.blog_index.entry_text_triggers
+
+        def progress(stats):
+            if stats['docs'] == 1:
+                # the row was already read by the rebuilder
+                with self.con as con:
+                    con.execute(f'UPDATE {self.con_tbl_names[1]} SET body_text = \'new body\' WHERE id = 11111')
+
+        FTSRebuilder(trg_group, chunk_size=1).run(progress=progress, shadow=True)
+        self.assertEqual(0, len(self.blog_index.match('new')))
+
+        self.assertEqual(1, self.blog_index.consume_changelog())
+        res = self.blog_index.match('new')
+        self.assertEqual(1, len(res))
+        self.assertSequenceEqual([11111, '111'], res[0][:-1])
+
+
+class TestFTSRepairer(BlogFTSIndexInTempFileSetup):
+
+    get_index_rows = TestFTSRebuilder.get_index_rows
+
+    def test_run(self):
+        self.insert_data(self.con)
+        trg_group = self.blog_index.entry_text_triggers
+        driver = trg_group.fts_driver
+        expected = self.get_index_rows(trg_group)
+
+        driver.insert_many([(11111, {'body_text': 'broken words'}), (21111, {'body_text': 'other broken words'})])
+        driver.insert(99999, {'body_text': 'no content'})
+        self.assertListEqual([11111, 21111], [r['rowid'] for r in driver.iter_broken()])
+
+        for con, schema in ((None, None), (self.fts_con, self.attach_as)):
+            with self.subTest(schema=schema):
+                stats = FTSRepairer(trg_group, con, schema, batch_size=2).run([21111, 11111, 99999])
+                self.assertEqual(3, stats['rowids'])
+                self.assertEqual(2, stats['reindexed'])
+                self.assertEqual(1, stats['missing'])
+                self.assertEqual(2, stats['batches'])
+                self.assertListEqual(expected, self.get_index_rows(trg_group))
+                self.assertListEqual([], driver.check_index_is_broken())
+
+        res = self.blog_index.match('цікаве')
+        self.assertListEqual([21111], [r[0] for r in res])
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fts_ua.settings')
 
 application = get_asgi_application()
+
+from fts_ua.stemming import setup_stemming  # noqa: E402
+
+# with preloaded application the workers share the dictionaries that are loaded here
+setup_stemming(warmup_backends=True)
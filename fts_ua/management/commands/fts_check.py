@@ -0,0 +1,129 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: fts_ua/management/commands
+# File: fts_check.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 6:20 PM
+
+import json
+import os
+import sqlite3 as sqlite
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from flexts.connection_factory import SQLiteConnectionFactory
+from flexts.sqlite_fts5 import SQLiteFTS5VerificationError
+from fts_sqlite.blog_sqlite_fts import BlogFTSIndex
+from fts_sqlite.rebuild import FTSRepairer
+from fts_ua.stemming import setup_stemming
+
+
+class Command(BaseCommand):
+    help = 'Checks the full text search indexes of blog tables for broken rows by chunks of rowids'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table', action='append', choices=('blog_entry', 'blog_entrytext'),
+            help='content table to check index for (can be repeated), all tables by default'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='number of index rows in one chunk')
+        parser.add_argument('--start-after', type=int, help='resume after this rowid (only with single --table)')
+        parser.add_argument('--checkpoint-file',
+                            help='JSON file {table: last rowid}. It is updated after each chunk and used to resume, '
+                                 'copy of index is kept in FILE.{table}.scratch until the table is checked')
+        parser.add_argument('--details', action='store_true', help='print broken (rowid, column, offset) items')
+        parser.add_argument('--repair', action='store_true',
+                            help='re-index broken rows from the content database (attached to index connection)')
+        parser.add_argument('--integrity-check', action='store_true',
+                            help='run native fts5 \'integrity-check\' command before')
+        parser.add_argument('--database', default='blog_sqlite', help='alias of content database in DATABASES')
+        parser.add_argument('--index-db', default=getattr(settings, 'FTS_INDEX_DB', None),
+                            help='path to index database file (settings.FTS_INDEX_DB by default)')
+
+    def handle(self, *args, **options):
+        tables = options['table'] or ['blog_entry', 'blog_entrytext']
+        if options['start_after'] is not None and len(tables) != 1:
+            raise CommandError('--start-after requires exactly one --table')
+        if not options['index_db']:
+            raise CommandError('--index-db is not defined')
+
+        try:
+            con_path = settings.DATABASES[options['database']]['NAME']
+        except KeyError:
+            raise CommandError(f'database "{options["database"]}" is not defined in settings.DATABASES')
+
+        checkpoints = {}
+        cp_file = options['checkpoint_file']
+        if cp_file and os.path.isfile(cp_file):
+            with open(cp_file) as f:
+                checkpoints = json.load(f)
+
+        def save_checkpoints():
+            if cp_file:
+                with open(cp_file, 'w') as f:
+                    json.dump(checkpoints, f)
+
+        broken = 0
+        # repair re-tokenizes content
+        setup_stemming()
+        con_factory = SQLiteConnectionFactory(getattr(settings, 'FTS_PRAGMA_PROFILES', None))
+        con = sqlite.connect(con_path)
+        fts_con = con_factory.connect(f'file:{options["index_db"]}', 'write', uri=True)
+        try:
+            blog_index = BlogFTSIndex(
+                con, fts_con, f'file:{con_path}?mode=ro', changelog=getattr(settings, 'FTS_CHANGELOG', False),
+                connection_factory=con_factory
+            )
+            trg_groups = {
+                blog_index.entry_triggers.table_name: blog_index.entry_triggers,
+                blog_index.entry_text_triggers.table_name: blog_index.entry_text_triggers,
+            }
+            for table in tables:
+                driver = trg_groups[table].fts_driver
+                if options['integrity_check']:
+                    try:
+                        driver.integrity_check()
+                    except SQLiteFTS5VerificationError as exc:
+                        broken += 1
+                        self.stderr.write(f'{table}: {exc}')
+
+                start_after = options['start_after']
+                if start_after is None:
+                    start_after = checkpoints.get(table)
+
+                def checkpoint(rowid):
+                    checkpoints[table] = rowid
+                    save_checkpoints()
+
+                table_broken = set()
+                # copy of index instances is kept next to checkpoint file until the table is checked
+                scratch = f'{cp_file}.{table}.scratch' if cp_file else None
+                for r in driver.iter_broken(start_after, options['chunk_size'], options['details'], checkpoint,
+                                            scratch):
+                    table_broken.add(r['rowid'])
+                    if options['details']:
+                        self.stdout.write(f'{table}: rowid {r["rowid"]} {r["col"]}[{r["offset"]}] {r["terms"]}')
+                    else:
+                        self.stdout.write(f'{table}: rowid {r["rowid"]} has {r["error_cnt"]} broken offsets')
+
+                self.stdout.write(f'{table}: {len(table_broken)} broken rows')
+                if options['repair'] and table_broken:
+                    stats = FTSRepairer(
+                        trg_groups[table], fts_con, blog_index.attach_as, batch_size=options['chunk_size']
+                    ).run(table_broken)
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{table}: {stats["reindexed"]} rows were re-indexed, {stats["missing"]} rows are not '
+                        f'in content, {stats["seconds"]:.2f}s'
+                    ))
+                    table_broken = set()
+                broken += len(table_broken)
+                checkpoints.pop(table, None)
+                save_checkpoints()
+        finally:
+            fts_con.close()
+            con.close()
+
+        if broken:
+            raise CommandError(f'{broken} problems were found')
+        self.stdout.write(self.style.SUCCESS('indexes are consistent'))
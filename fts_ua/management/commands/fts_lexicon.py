@@ -0,0 +1,57 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: fts_ua/management/commands
+# File: fts_lexicon.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 4:00 PM
+
+import time
+from itertools import chain
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from flexts.lexicon import compile_lexicon
+from flexts.stem_store import SQLiteStemStore
+
+
+class Command(BaseCommand):
+    help = 'Compiles memory-mapped stem lexicon (form -> stems) for HunspellStemmer.lexicon'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='path to lexicon file')
+        parser.add_argument('--words', action='append', default=[],
+                            help='file with one word form per line (for instance, output of hunspell "unmunch" '
+                                 'for uk_UA.dic uk_UA.aff), forms are stemmed by Hunspell. Can be repeated')
+        parser.add_argument('--store', nargs='?', const=getattr(settings, 'FTS_STEM_STORE', None),
+                            help='add forms from persistent stem dictionary (settings.FTS_STEM_STORE by default)')
+
+    def iter_words(self, path):
+        from flexts.stemmer import HunspellStemmer
+
+        hs = HunspellStemmer.stemmer
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                word = line.split('/', 1)[0].strip().lower()
+                if word:
+                    yield word, [s.decode('utf-8') for s in hs.stem(word)]
+
+    def handle(self, *args, **options):
+        if not options['words'] and not options['store']:
+            raise CommandError('at least one of --words or --store is required')
+
+        sources = [self.iter_words(path) for path in options['words']]
+        store = None
+        if options['store']:
+            store = SQLiteStemStore(options['store'])
+            sources.append(store.items())
+
+        start = time.perf_counter()
+        try:
+            cnt = compile_lexicon(chain(*sources), options['output'])
+        finally:
+            if store is not None:
+                store.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'{cnt} forms were compiled into {options["output"]} in {time.perf_counter() - start:.2f}s'
+        ))
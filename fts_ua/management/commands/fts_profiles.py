@@ -0,0 +1,96 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: fts_ua/management/commands
+# File: fts_profiles.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 7:30 PM
+
+import sqlite3 as sqlite
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from flexts.fts5_tokenizer import get_tokenizer
+from flexts.profile_report import profile_report
+from flexts.sqlite_fts5 import SQLiteFTS5
+from flexts.stemmer import SimpleTokenizer, StemmingTokenizer
+from fts_sqlite.blog_sqlite_fts import EntryTriggers, EntryTextTriggers
+from fts_sqlite.rebuild import FTSRebuilder
+
+
+class Command(BaseCommand):
+    help = 'Builds index of blog table under each storage profile and reports file size, build time ' \
+           'and query latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', default='blog_entrytext', choices=('blog_entry', 'blog_entrytext'),
+                            help='content table that is used as corpus')
+        parser.add_argument('--profile', action='append', choices=tuple(SQLiteFTS5.storage_profiles),
+                            help='storage profile (can be repeated), all profiles by default')
+        parser.add_argument('--query', action='append', default=[],
+                            help='plain query as user types it (can be repeated)')
+        parser.add_argument('--queries-file', help='file with plain queries, one per line')
+        parser.add_argument('--repeat', type=int, default=5, help='number of runs of each query')
+        parser.add_argument('--work-dir', help='directory for index files, temporary directory by default')
+        parser.add_argument('--database', default='blog_sqlite', help='alias of content database in DATABASES')
+
+    def handle(self, *args, **options):
+        queries = [*options['query']]
+        if options['queries_file']:
+            with open(options['queries_file']) as f:
+                queries.extend(line.strip() for line in f if line.strip())
+        if not queries:
+            raise CommandError('no queries, use --query or --queries-file')
+
+        try:
+            con_path = settings.DATABASES[options['database']]['NAME']
+        except KeyError:
+            raise CommandError(f'database "{options["database"]}" is not defined in settings.DATABASES')
+
+        # query terms are tokenized (stemmed) as BlogFTSIndex.plain2_match_expr does it
+        tokenize = getattr(settings, 'FTS_TOKENIZE', None)
+        stemmer = getattr(get_tokenizer(tokenize), 'stemmer', None) if tokenize else None
+        tokenizer = SimpleTokenizer() if stemmer is None else StemmingTokenizer(stemmer=stemmer)
+        tokenizer.token_filter = str.lower
+
+        def match_expr(q: str, to_prefix: bool) -> str:
+            tokenizer.document = q
+            return ' AND '.join(f'"{t}"{"*" if to_prefix else ""}' for t in tokenizer)
+
+        # content database is only read, triggers are not created
+        con = sqlite.connect(f'file:{con_path}?mode=ro', uri=True)
+        fts_con = sqlite.connect(':memory:')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            try:
+                trg_group = {'blog_entry': EntryTriggers, 'blog_entrytext': EntryTextTriggers}[options['table']](
+                    con, fts_con
+                )
+
+                def items():
+                    for _, chunk in FTSRebuilder(trg_group, con).iter_chunks():
+                        yield from chunk
+
+                # query mix as BlogFTSIndex.match builds it: exact terms and prefix terms with column filter
+                cols = ' '.join(trg_group.fts_columns)
+                match_exprs = [
+                    f'{{{cols}}} : {match_expr(q, to_prefix)}' for q in queries for to_prefix in (False, True)
+                ]
+
+                report = profile_report(
+                    items, trg_group.fts_columns, match_exprs, options['work_dir'] or tmp_dir,
+                    options['profile'], {'tokenize': tokenize} if tokenize else None, repeat=options['repeat']
+                )
+            finally:
+                fts_con.close()
+                con.close()
+
+        self.stdout.write(f'{"profile":<15}{"docs":>8}{"size, KiB":>12}{"build, s":>10}'
+                          f'{"query, ms":>11}{"p95, ms":>10}{"errors":>8}')
+        for r in report:
+            query_ms = '-' if r['query_ms'] is None else f'{r["query_ms"]:.3f}'
+            p95_ms = '-' if r['query_p95_ms'] is None else f'{r["query_p95_ms"]:.3f}'
+            self.stdout.write(
+                f'{r["profile"]:<15}{r["docs"]:>8}{r["size"] / 1024:>12.1f}{r["build_seconds"]:>10.2f}'
+                f'{query_ms:>11}{p95_ms:>10}{r["errors"]:>8}'
+            )
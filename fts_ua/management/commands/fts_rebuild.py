@@ -0,0 +1,127 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: fts_ua/management/commands
+# File: fts_rebuild.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 11:40 AM
+
+import json
+import os
+import sqlite3 as sqlite
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from flexts.connection_factory import SQLiteConnectionFactory
+from flexts.stemmer import HunspellStemmer
+from fts_sqlite.blog_sqlite_fts import BlogFTSIndex
+from fts_sqlite.rebuild import FTSRebuilder
+from fts_ua.stemming import setup_stemming
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full text search indexes of blog tables from the content database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table', action='append', choices=('blog_entry', 'blog_entrytext'),
+            help='content table to rebuild index for (can be repeated), all tables by default'
+        )
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='number of worker processes that run --prepare and pre-stem documents into '
+                                 'FTS_STEM_STORE, 0 - prepare documents in the writer process')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='number of rows in one chunk')
+        parser.add_argument('--start-after', type=int,
+                            help='resume after this content rowid (only with single --table)')
+        parser.add_argument('--checkpoint-file',
+                            help='JSON file {table: last rowid}. It is updated after each chunk and used to resume')
+        parser.add_argument('--shadow', action='store_true',
+                            help='build into shadow index and swap it in at the end, live index stays searchable')
+        parser.add_argument('--prepare', help='dotted path to callable(fts_data: dict) -> dict run by workers')
+        parser.add_argument('--database', default='blog_sqlite', help='alias of content database in DATABASES')
+        parser.add_argument('--index-db', default=getattr(settings, 'FTS_INDEX_DB', None),
+                            help='path to index database file (settings.FTS_INDEX_DB by default)')
+
+    def handle(self, *args, **options):
+        tables = options['table'] or ['blog_entry', 'blog_entrytext']
+        if options['start_after'] is not None and len(tables) != 1:
+            raise CommandError('--start-after requires exactly one --table')
+        if not options['index_db']:
+            raise CommandError('--index-db is not defined')
+        changelog = getattr(settings, 'FTS_CHANGELOG', False)
+        if options['shadow'] and not changelog:
+            raise CommandError(
+                '--shadow requires FTS_CHANGELOG = True, otherwise changes of content that are done during rebuild '
+                'are written into the live index only and are lost by swap'
+            )
+
+        try:
+            con_path = settings.DATABASES[options['database']]['NAME']
+        except KeyError:
+            raise CommandError(f'database "{options["database"]}" is not defined in settings.DATABASES')
+
+        checkpoints = {}
+        cp_file = options['checkpoint_file']
+        if cp_file and os.path.isfile(cp_file):
+            with open(cp_file) as f:
+                checkpoints = json.load(f)
+
+        def save_checkpoint(table, rowid):
+            checkpoints[table] = rowid
+            if cp_file:
+                with open(cp_file, 'w') as f:
+                    json.dump(checkpoints, f)
+
+        def report(stats):
+            self.stdout.write(
+                f'{stats["table"]}: {stats["docs"]} docs, last rowid {stats["last_rowid"]}, '
+                f'{stats["docs_per_sec"]:.1f} docs/sec'
+            )
+
+        setup_stemming()
+
+        con_factory = SQLiteConnectionFactory(getattr(settings, 'FTS_PRAGMA_PROFILES', None))
+        con = sqlite.connect(con_path)
+        fts_con = con_factory.connect(f'file:{options["index_db"]}', 'bulk', uri=True)
+        try:
+            if options['verbosity'] > 1:
+                self.stdout.write('index connection: ' + ', '.join(
+                    f'{p}={v}' for p, v in con_factory.get_pragmas(fts_con, con_factory.get_profile('bulk')).items()
+                ))
+            blog_index = BlogFTSIndex(
+                con, fts_con, f'file:{con_path}?mode=ro', tokenize=getattr(settings, 'FTS_TOKENIZE', None),
+                token_table=getattr(settings, 'FTS_TOKEN_TABLE', False),
+                changelog=changelog,
+                index_mode=getattr(settings, 'FTS_INDEX_MODE', None),
+                profile=getattr(settings, 'FTS_STORAGE_PROFILE', None), connection_factory=con_factory
+            )
+            trg_groups = {
+                blog_index.entry_triggers.table_name: blog_index.entry_triggers,
+                blog_index.entry_text_triggers.table_name: blog_index.entry_text_triggers,
+            }
+            for table in tables:
+                start_after = options['start_after']
+                if start_after is None:
+                    start_after = checkpoints.get(table)
+
+                rebuilder = FTSRebuilder(
+                    trg_groups[table], chunk_size=options['chunk_size'], workers=options['workers'],
+                    prepare=options['prepare'], checkpoint=save_checkpoint
+                )
+                try:
+                    stats = rebuilder.run(start_after, progress=report, shadow=options['shadow'])
+                except ValueError as exc:
+                    raise CommandError(f'{table}: {exc}')
+                self.stdout.write(self.style.SUCCESS(
+                    f'{table}: {stats["docs"]} docs were indexed in {stats["seconds"]:.2f}s '
+                    f'({stats["docs_per_sec"]:.1f} docs/sec)'
+                ))
+                checkpoints.pop(table, None)
+                if cp_file:
+                    with open(cp_file, 'w') as f:
+                        json.dump(checkpoints, f)
+        finally:
+            fts_con.close()
+            con.close()
+            if HunspellStemmer.store is not None:
+                HunspellStemmer.store.flush()
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'fts_sqlite',
+    'fts_ua',
 ]
 
 MIDDLEWARE = [
@@ -87,6 +88,29 @@ DATABASES = {
 
 }
 
+# Full text search index database for 'blog_sqlite' content database
+FTS_INDEX_DB = BASE_DIR / 'blog.fts.sqlite3'
+# tokenize option of new fts5 indexes, 'hunspell_ua' - stemming tokenizer (see flexts.fts5_tokenizer)
+FTS_TOKENIZE = None
+# new fts5 indexes keep written text per (rowid, column) in side table, deletes do not scan fts5vocab
+FTS_TOKEN_TABLE = False
+# mode of new fts5 indexes 'contentless', 'contentless_delete' (SQLite >= 3.43) or 'auto' (see flexts.sqlite_fts5)
+FTS_INDEX_MODE = None
+# True - content tables get triggers that log changes into changelog tables, the indexes are updated by
+# BlogFTSIndex.consume_changelog (see flexts.sqllitte_backend.ChangelogConsumer). It is required by fts_rebuild --shadow
+FTS_CHANGELOG = False
+# storage profile of new fts5 indexes, for example 'column_prefix' (see flexts.sqlite_fts5 storage_profiles)
+FTS_STORAGE_PROFILE = None
+# path to persistent token -> stems dictionary shared by processes (see flexts.stem_store), None - is not used
+FTS_STEM_STORE = None
+# path to compiled stem lexicon (see fts_lexicon command), None - is not used
+FTS_STEM_LEXICON = None
+# stemmer backends (see flexts.stemmer.backend_factories) to load in wsgi module, before fork of workers
+FTS_WARMUP_STEMMERS = ()
+# overrides of pragma profiles 'write', 'read', 'bulk' of index connections, for example {'read': {'mmap_size': 0}}
+# (see flexts.connection_factory)
+FTS_PRAGMA_PROFILES = None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -0,0 +1,37 @@
+# IDE: PyCharm
+# Project: fts_ua
+# Path: fts_ua
+# File: stemming.py
+# Contact: Semyon Mamonov <semyon.mamonov@gmail.com>
+# Created by ox23 at 2026-10-17 (y-m-d) 11:55 PM
+
+import atexit
+
+from django.conf import settings
+
+from flexts.lexicon import Lexicon
+from flexts.stem_store import SQLiteStemStore
+from flexts.stemmer import HunspellStemmer, warmup
+
+
+def setup_stemming(warmup_backends: bool = False) -> None:
+    """
+        Applies stemming settings to HunspellStemmer of this process. It is called by wsgi and asgi modules
+        (by master process before fork of workers if application is preloaded) and by commands that index content.
+
+            FTS_STEM_LEXICON - compiled lexicon, it is mapped once and forked workers share its pages
+            FTS_STEM_STORE - persistent stem dictionary, its connections and writer thread are created on first use,
+                so they are not inherited by forked workers. Queued stems are written on exit.
+            FTS_WARMUP_STEMMERS - stemmer backends to load now if warmup_backends is True
+    """
+    stem_lexicon = getattr(settings, 'FTS_STEM_LEXICON', None)
+    if stem_lexicon and HunspellStemmer.lexicon is None:
+        HunspellStemmer.lexicon = Lexicon(stem_lexicon)
+
+    stem_store = getattr(settings, 'FTS_STEM_STORE', None)
+    if stem_store and HunspellStemmer.store is None:
+        HunspellStemmer.store = SQLiteStemStore(stem_store)
+        atexit.register(HunspellStemmer.store.close)
+
+    if warmup_backends:
+        warmup(getattr(settings, 'FTS_WARMUP_STEMMERS', ()))